@@ -0,0 +1,316 @@
+""" Local stand-ins for SentinelHub (token, Catalog, Process), Open-Meteo and MinIO (S3) used by benchmarks.
+
+Servers run in a separate process, so that they do not compete with the measured pipeline for the GIL. Every server
+counts requests and transferred bytes, counters are served as JSON on GET /__stats.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit, parse_qs
+from io import BytesIO
+import multiprocessing
+import threading
+import tarfile
+import json
+import re
+import time
+import uuid
+
+import numpy as np
+import tifffile
+
+from typing import Dict, List, Optional
+
+STATS_PATH = '/__stats'
+# number of output bands declared in setup() of evalscript
+OUTPUT_BANDS = re.compile(r'output:\s*\{[^}]*?bands:\s*(\d+)')
+
+
+class FakeServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # benchmarks open many concurrent connections
+    request_queue_size = 128
+
+    def __init__(self, handler, options: dict):
+        super().__init__(('127.0.0.1', 0), handler)
+        self.options = options
+        self.lock = threading.Lock()
+        self.counters = {'requests': 0, 'bytes_in': 0, 'bytes_out': 0, 'by_path': {}}
+
+    def count(self, path: str, bytes_in: int, bytes_out: int):
+        with self.lock:
+            self.counters['requests'] += 1
+            self.counters['bytes_in'] += bytes_in
+            self.counters['bytes_out'] += bytes_out
+            self.counters['by_path'][path] = self.counters['by_path'].get(path, 0) + 1
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server: FakeServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _send(self, status: int, body: bytes = b'', content_type: str = 'application/json',
+              headers: Optional[Dict[str, str]] = None, bytes_in: int = 0, count: bool = True):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+        if count:
+            self.server.count(urlsplit(self.path).path, bytes_in, len(body))
+
+    def _send_json(self, data, bytes_in: int = 0):
+        self._send(200, json.dumps(data).encode(), bytes_in=bytes_in)
+
+    def _send_stats(self) -> bool:
+        if urlsplit(self.path).path != STATS_PATH:
+            return False
+        with self.server.lock:
+            body = json.dumps(self.server.counters).encode()
+        self._send(200, body, count=False)
+        return True
+
+
+class SentinelHubHandler(FakeHandler):
+    """ POST /token, POST /catalog and POST /process.
+
+    Catalog returns one acquisition per location every revisit_days at 10:00 UTC. Process API sleeps latency seconds
+    and returns random uint8 TIFF with as many bands as evalscript outputs, of image_size x image_size pixels
+    (of requested size when not set). Multi-temporal requests (with output responses) get TAR with band stack of all
+    acquisitions in time range and their dates.
+    """
+    _images: Dict[tuple, bytes] = {}
+    _images_lock = threading.Lock()
+
+    def do_GET(self):
+        if not self._send_stats():
+            self._send(404)
+
+    def do_POST(self):
+        body = self._read_body()
+        path = urlsplit(self.path).path
+        if path == '/token':
+            self._send_json({'access_token': uuid.uuid4().hex, 'token_type': 'Bearer', 'expires_in': 3600},
+                            len(body))
+        elif path == '/catalog':
+            self._send_json(self._catalog(json.loads(body)), len(body))
+        elif path == '/process':
+            request = json.loads(body)
+            time.sleep(self.server.options['latency'])
+            if request['output'].get('responses'):
+                self._send(200, self._multitemporal(request), 'application/x-tar', {'X-ProcessingUnits-Spent': '1'},
+                           len(body))
+            else:
+                width, height, n_bands = self._image_shape(request)
+                self._send(200, self._image(width, height, n_bands), 'image/tiff', {'X-ProcessingUnits-Spent': '1'},
+                           len(body))
+        else:
+            self._send(404, bytes_in=len(body))
+
+    def _acquisitions(self, start: datetime, end: datetime) -> List[datetime]:
+        revisit = timedelta(days=self.server.options['revisit_days'])
+        acquisitions = []
+        day = start.replace(hour=10, minute=0, second=0, microsecond=24000)
+        if day < start:
+            day += timedelta(days=1)
+        while day <= end:
+            acquisitions.append(day)
+            day += revisit
+        return acquisitions
+
+    @staticmethod
+    def _parse_range(start: str, end: str) -> tuple:
+        return tuple(datetime.fromisoformat(value.replace('Z', '+00:00')) for value in (start, end))
+
+    @staticmethod
+    def _format_datetime(acquisition: datetime) -> str:
+        return acquisition.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+    def _catalog(self, request: dict) -> dict:
+        acquisitions = self._acquisitions(*self._parse_range(*request['datetime'].split('/')))
+        offset = int(request.get('next') or 0)
+        limit = request.get('limit', 100)
+        page = acquisitions[offset:offset + limit]
+        features = [
+            {
+                'id': f'S2A_{acquisition:%Y%m%dT%H%M%S}',
+                'properties': {
+                    'datetime': self._format_datetime(acquisition),
+                    'platform': 'sentinel-2a',
+                    'eo:cloud_cover': 10.0,
+                },
+            }
+            for acquisition in page
+        ]
+        next_page = offset + limit if offset + limit < len(acquisitions) else None
+        return {'features': features, 'context': {'next': next_page}}
+
+    def _image_shape(self, request: dict) -> tuple:
+        size = self.server.options['image_size']
+        match = OUTPUT_BANDS.search(request.get('evalscript', ''))
+        return size or request['output']['width'], size or request['output']['height'], \
+            int(match.group(1)) if match else 4
+
+    def _multitemporal(self, request: dict) -> bytes:
+        time_range = request['input']['data'][0]['dataFilter']['timeRange']
+        acquisitions = self._acquisitions(*self._parse_range(time_range['from'], time_range['to']))
+        width, height, n_bands = self._image_shape(request)
+        userdata = json.dumps({'dates': [self._format_datetime(acquisition) for acquisition in acquisitions]})
+
+        output = BytesIO()
+        with tarfile.open(fileobj=output, mode='w') as tar:
+            for name, content in (('default.tif', self._image(width, height, max(len(acquisitions), 1) * n_bands)),
+                                  ('userdata.json', userdata.encode())):
+                info = tarfile.TarInfo(name)
+                info.size = len(content)
+                tar.addfile(info, BytesIO(content))
+        return output.getvalue()
+
+    @classmethod
+    def _image(cls, width: int, height: int, n_bands: int) -> bytes:
+        key = (width, height, n_bands)
+        with cls._images_lock:
+            if key not in cls._images:
+                shape = (height, width, n_bands) if n_bands > 1 else (height, width)
+                data = np.random.default_rng(0).integers(0, 256, shape, dtype=np.uint8)
+                output = BytesIO()
+                tifffile.imwrite(output, data, photometric='minisblack',
+                                 planarconfig='contig' if n_bands > 1 else None)
+                cls._images[key] = output.getvalue()
+            return cls._images[key]
+
+
+class OpenMeteoHandler(FakeHandler):
+    """ GET /v1/forecast with comma-separated latitude / longitude lists, one hourly (or daily) series
+    per point and variable.
+    """
+    def do_GET(self):
+        if self._send_stats():
+            return
+        parts = urlsplit(self.path)
+        if parts.path != '/v1/forecast':
+            self._send(404)
+            return
+
+        time.sleep(self.server.options['latency'])
+        query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        latitudes = query['latitude'].split(',')
+        frequency = 'hourly' if 'hourly' in query else 'daily'
+        variables = query[frequency].split(',')
+
+        start = datetime.fromisoformat(query['start_date'])
+        end = datetime.fromisoformat(query['end_date']) + timedelta(days=1)
+        step = timedelta(hours=1) if frequency == 'hourly' else timedelta(days=1)
+        times = []
+        moment = start
+        while moment < end:
+            times.append(moment.strftime('%Y-%m-%dT%H:%M'))
+            moment += step
+
+        series = {'time': times, **{variable: [round(i * 0.1, 1) for i in range(len(times))]
+                                    for variable in variables}}
+        results = [{'latitude': float(lat), frequency: series} for lat in latitudes]
+        self._send_json(results if len(results) > 1 else results[0])
+
+
+class S3Handler(FakeHandler):
+    """ Subset of S3 API used by MinIO client: bucket location and existence, bucket creation, single PUT and
+    multipart upload. Object data are discarded, only their sizes are kept.
+    """
+    def do_GET(self):
+        if self._send_stats():
+            return
+        if 'location' in parse_qs(urlsplit(self.path).query, keep_blank_values=True):
+            self._send(200, b'<?xml version="1.0" encoding="UTF-8"?>'
+                            b'<LocationConstraint xmlns="http://s3.amazonaws.com/doc/2006-03-01/"/>',
+                       'application/xml')
+        else:
+            self._send(404)
+
+    def do_HEAD(self):
+        self._send(200, content_type='application/xml')
+
+    def do_PUT(self):
+        body = self._read_body()
+        self._send(200, content_type='application/xml', headers={'ETag': f'"{uuid.uuid4().hex}"'},
+                   bytes_in=len(body))
+
+    def do_POST(self):
+        body = self._read_body()
+        parts = urlsplit(self.path)
+        query = parse_qs(parts.query, keep_blank_values=True)
+        bucket, _, key = parts.path.lstrip('/').partition('/')
+        if 'uploads' in query:
+            xml = (f'<InitiateMultipartUploadResult><Bucket>{bucket}</Bucket><Key>{key}</Key>'
+                   f'<UploadId>{uuid.uuid4().hex}</UploadId></InitiateMultipartUploadResult>')
+        else:
+            xml = (f'<CompleteMultipartUploadResult><Location>{parts.path}</Location><Bucket>{bucket}</Bucket>'
+                   f'<Key>{key}</Key><ETag>"{uuid.uuid4().hex}"</ETag></CompleteMultipartUploadResult>')
+        self._send(200, xml.encode(), 'application/xml', bytes_in=len(body))
+
+
+HANDLERS = {
+    'sentinel_hub': SentinelHubHandler,
+    'open_meteo': OpenMeteoHandler,
+    's3': S3Handler,
+}
+
+
+def _serve(options: dict, ports: multiprocessing.Queue, stop: multiprocessing.Event):
+    servers = {name: FakeServer(handler, options) for name, handler in HANDLERS.items()}
+    for server in servers.values():
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    ports.put({name: server.server_address[1] for name, server in servers.items()})
+    stop.wait()
+    for server in servers.values():
+        server.shutdown()
+
+
+class FakeServices:
+    """ Starts fake servers in a child process, returns their base URLs.
+
+    :param latency: delay of Process API and Open-Meteo responses in seconds
+    :param image_size: width and height of images returned by Process API, requested size is used when not set
+    :param revisit_days: days between acquisitions returned by Catalog API
+    """
+    def __init__(self, latency: float = 0.05, image_size: Optional[int] = None, revisit_days: int = 1):
+        self.options = {'latency': latency, 'image_size': image_size, 'revisit_days': revisit_days}
+        self.ports: Dict[str, int] = {}
+        self._context = multiprocessing.get_context('spawn')
+        self._stop = self._context.Event()
+        self._process = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        ports = self._context.Queue()
+        self._process = self._context.Process(target=_serve, args=(self.options, ports, self._stop), daemon=True)
+        self._process.start()
+        self.ports = ports.get(timeout=30)
+
+    def stop(self):
+        self._stop.set()
+        if self._process is not None:
+            self._process.join(timeout=10)
+            self._process = None
+
+    def url(self, name: str) -> str:
+        return f'http://127.0.0.1:{self.ports[name]}'
+
+    def stats(self) -> Dict[str, dict]:
+        import requests
+        return {name: requests.get(self.url(name) + STATS_PATH).json() for name in self.ports}
@@ -0,0 +1,330 @@
+""" Offline throughput benchmark of SentinelDataPipeline.run and OpenMeteoPipeline.run.
+
+Pipelines run against local fake services (see fake_services) and throwaway SQLite database, N locations x M days.
+Every pipeline runs in its own process, so that peak RSS belongs to the pipeline alone. Results are written as JSON
+to benchmarks/results, named by time and git commit, so runs of different commits can be compared.
+
+    python -m benchmarks.run --locations 50 --days 10 --latency-ms 100
+"""
+from pathlib import Path
+from datetime import datetime, timezone
+from tempfile import TemporaryDirectory
+from queue import Empty
+import multiprocessing
+import subprocess
+import traceback
+import argparse
+import resource
+import logging
+import json
+import time
+import sys
+import os
+
+from sqlalchemy import create_engine, event, func, select
+
+from benchmarks.fake_services import FakeServices
+
+from typing import Dict, List, Optional
+
+RESULTS_PATH = Path(__file__).resolve().parent / 'results'
+PIPELINES = ('sentinel', 'open_meteo')
+# services called by each pipeline
+PIPELINE_SERVICES = {
+    'sentinel': ('sentinel_hub', 's3'),
+    'open_meteo': ('open_meteo',),
+}
+WEATHER_VARIABLES = ['temperature_2m', 'precipitation', 'rain', 'soil_temperature_0cm', 'soil_moisture_0_to_1cm']
+
+
+def make_locations(n_locations: int, size: float = 0.05) -> List[dict]:
+    """ Returns n_locations bounding boxes of size degrees on a square grid.
+    """
+    columns = max(int(n_locations ** 0.5), 1)
+    locations = []
+    for i in range(n_locations):
+        min_lat = 48.0 + (i // columns) * size * 2
+        min_lon = 12.0 + (i % columns) * size * 2
+        locations.append({
+            'name': f'bench_{i:05d}',
+            'coordinates': {
+                'min_lat': round(min_lat, 4),
+                'min_lon': round(min_lon, 4),
+                'max_lat': round(min_lat + size, 4),
+                'max_lon': round(min_lon + size, 4),
+            },
+        })
+    return locations
+
+
+def write_secrets(secrets_path: Path, s3_url: str):
+    secrets = {
+        'sentinelhub_credentials.json': {'client_id': 'bench', 'client_secret': 'bench'},
+        'minio_credentials.json': {'endpoint': s3_url.split('://', 1)[1], 'access_key': 'bench',
+                                   'secret_key': 'bench-secret'},
+        'pg_credentials.json': {'username': 'bench', 'password': 'bench', 'hostname': 'localhost'},
+        'open_meteo_credentials.json': {},
+    }
+    secrets_path.mkdir(parents=True, exist_ok=True)
+    for file_name, content in secrets.items():
+        with open(secrets_path / file_name, 'w') as f:
+            json.dump(content, f)
+
+
+def _use_sqlite(db_path: Path):
+    """ Creates all tables in SQLite file and redirects every engine created by pg_database to it.
+    """
+    import src.db.pg_database as pg_database
+    from src.db.pg_data_models import Base
+
+    engine = create_engine(f'sqlite:///{db_path}')
+    Base.metadata.create_all(engine)
+    engine.dispose()
+
+    def sqlite_engine(db_url: str, **kwargs):
+        engine = create_engine(f'sqlite:///{db_path}', connect_args={'check_same_thread': False, 'timeout': 60},
+                               pool_size=kwargs.get('pool_size', 5))
+
+        @event.listens_for(engine, 'connect')
+        def set_pragmas(connection, _):
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+
+        return engine
+
+    pg_database.create_engine = sqlite_engine
+
+
+def _point_to(urls: Dict[str, str]):
+    """ Points API URLs of extractors to fake services.
+    """
+    import src.extractors.sentinel_hub as sentinel_hub
+    import src.extractors.open_meteo as open_meteo
+
+    sentinel_hub.TOKEN_URL = f"{urls['sentinel_hub']}/token"
+    sentinel_hub.CATALOG_URL = f"{urls['sentinel_hub']}/catalog"
+    sentinel_hub.PROCESS_URL = f"{urls['sentinel_hub']}/process"
+    open_meteo.OPEN_METEO_URL = f"{urls['open_meteo']}/v1/forecast"
+    # token endpoint of fake SentinelHub is plain HTTP
+    os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _count_rows(db_path: Path) -> Dict[str, int]:
+    from src.db.pg_data_models import Base
+
+    engine = create_engine(f'sqlite:///{db_path}')
+    with engine.connect() as connection:
+        counts = {name: connection.execute(select(func.count()).select_from(table)).scalar()
+                  for name, table in Base.metadata.tables.items()}
+    engine.dispose()
+    return {name: count for name, count in counts.items() if count}
+
+
+def _run_pipeline(name: str, cfg: dict, n_days: int, max_workers: Optional[int], work_path: Path,
+                  urls: Dict[str, str], results: multiprocessing.Queue):
+    """ Runs one pipeline in child process, puts its measurements (or error) to results.
+    """
+    try:
+        results.put(_measure_pipeline(name, cfg, n_days, max_workers, work_path, urls))
+    except Exception:
+        results.put({'error': traceback.format_exc()})
+
+
+def _measure_pipeline(name: str, cfg: dict, n_days: int, max_workers: Optional[int], work_path: Path,
+                      urls: Dict[str, str]) -> dict:
+    logging.basicConfig(level=logging.WARNING)
+    _point_to(urls)
+    db_path = work_path / f'{name}.sqlite'
+    _use_sqlite(db_path)
+
+    from src.extractors.sentinel_hub import SentinelDataPipeline
+    from src.extractors.open_meteo import OpenMeteoPipeline
+    from src.db.minio_storage import MinioStorage
+    from src.utils.credentials import CredentialManager
+
+    secrets_path = work_path / 'secrets'
+    MinioStorage.reset()
+    extra = {}
+    started = time.perf_counter()
+    if name == 'sentinel':
+        pipeline = SentinelDataPipeline(cfg)
+        pipeline.secrets_path = secrets_path
+        pipeline.token_path = secrets_path / 'sentinelhub_token.json'
+        pipeline.cred_mgr = CredentialManager(secrets_path)
+        pipeline.run(n_days=n_days, max_workers=max_workers, force=True)
+        extra['stages'] = pipeline.stage_stats
+    else:
+        pipeline = OpenMeteoPipeline(cfg)
+        pipeline.secrets_path = secrets_path
+        pipeline.credential_manager = CredentialManager(secrets_path)
+        pipeline.run(n_days=n_days, max_workers=max_workers)
+    wall_seconds = time.perf_counter() - started
+
+    return {
+        'wall_seconds': round(wall_seconds, 3),
+        'peak_rss_mb': _peak_rss_mb(),
+        'db_rows': _count_rows(db_path),
+        **extra,
+    }
+
+
+def _request_totals(stats: Dict[str, dict], services: tuple) -> Dict[str, int]:
+    return {
+        key: sum(stats[service][key] for service in services)
+        for key in ('requests', 'bytes_in', 'bytes_out')
+    }
+
+
+def _wait_for_result(process: multiprocessing.Process, results: multiprocessing.Queue, timeout: float) -> dict:
+    """ Waits for result of child process, returns {'error': ...} when the process dies without result or does not
+    finish within timeout seconds.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            result = results.get(timeout=0.5)
+            break
+        except Empty:
+            pass
+        if not process.is_alive():
+            try:
+                # result may be put right before exit
+                result = results.get(timeout=1)
+            except Empty:
+                result = {'error': f'Benchmark process exited with code {process.exitcode} without result'}
+            break
+        if time.monotonic() > deadline:
+            process.terminate()
+            result = {'error': f'Benchmark did not finish within {timeout} s'}
+            break
+
+    process.join()
+    return result
+
+
+def run_pipeline(name: str, cfg: dict, n_days: int, max_workers: Optional[int], work_path: Path,
+                 services: FakeServices, timeout: float = 3600) -> dict:
+    """ Runs pipeline against fake services, returns wall time, request / byte / row rates and peak RSS,
+    or {'error': ...} when the pipeline failed.
+    """
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    urls = {service: services.url(service) for service in services.ports}
+    before = _request_totals(services.stats(), PIPELINE_SERVICES[name])
+
+    process = context.Process(target=_run_pipeline,
+                              args=(name, cfg, n_days, max_workers, work_path, urls, results))
+    process.start()
+    result = _wait_for_result(process, results, timeout)
+    if 'error' in result:
+        return result
+
+    after = _request_totals(services.stats(), PIPELINE_SERVICES[name])
+    requests = after['requests'] - before['requests']
+    transferred = (after['bytes_in'] - before['bytes_in']) + (after['bytes_out'] - before['bytes_out'])
+    rows = sum(result['db_rows'].values())
+    wall_seconds = max(result['wall_seconds'], 1e-9)
+    return {
+        'wall_seconds': result['wall_seconds'],
+        'requests': requests,
+        'requests_per_s': round(requests / wall_seconds, 2),
+        'bytes': transferred,
+        'bytes_per_s': round(transferred / wall_seconds),
+        'db_rows': result['db_rows'],
+        'db_rows_per_s': round(rows / wall_seconds, 2),
+        'peak_rss_mb': result['peak_rss_mb'],
+        **{key: value for key, value in result.items() if key not in ('wall_seconds', 'peak_rss_mb', 'db_rows')},
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=Path(__file__).resolve().parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Benchmark pipelines against local fake services.')
+    parser.add_argument('--locations', type=int, default=20, help='number of locations')
+    parser.add_argument('--days', type=int, default=5, help='number of days to extract')
+    parser.add_argument('--latency-ms', type=float, default=50, help='latency of Process API and Open-Meteo')
+    parser.add_argument('--image-size', type=int, default=None,
+                        help='width and height of images returned by Process API (requested size by default)')
+    parser.add_argument('--max-workers', type=int, default=None, help='max_workers passed to pipelines')
+    parser.add_argument('--pipelines', nargs='+', choices=PIPELINES, default=list(PIPELINES))
+    parser.add_argument('--set', dest='options', action='append', default=[], metavar='KEY=JSON',
+                        help='extra config option of pipelines, e.g. --set \'outbox={"path": "/tmp/outbox.sqlite"}\'')
+    parser.add_argument('--timeout', type=float, default=3600, help='max run time of one pipeline in seconds')
+    parser.add_argument('--output', type=Path, default=None,
+                        help='result file, benchmarks/results/<time>_<commit>.json by default')
+    return parser.parse_args(argv)
+
+
+def build_config(args) -> dict:
+    cfg = {
+        'locations': make_locations(args.locations),
+        'sentinel_type': 'sentinel-2-l2a',
+        'weather_frequency': 'hourly',
+        'weather_variables': WEATHER_VARIABLES,
+    }
+    for option in args.options:
+        key, _, value = option.partition('=')
+        cfg[key] = json.loads(value)
+    if args.image_size and cfg.get('tiling'):
+        # tiles of fixed size would not fit into mosaic grid
+        raise ValueError('--image-size cannot be used with tiling')
+    return cfg
+
+
+def main(argv: Optional[List[str]] = None) -> dict:
+    args = parse_args(argv)
+    cfg = build_config(args)
+    commit = git_commit()
+    report = {
+        'commit': commit,
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'parameters': {
+            'locations': args.locations,
+            'days': args.days,
+            'latency_ms': args.latency_ms,
+            'image_size': args.image_size,
+            'max_workers': args.max_workers,
+            'options': args.options,
+        },
+        'results': {},
+    }
+
+    with FakeServices(latency=args.latency_ms / 1000, image_size=args.image_size) as services, \
+            TemporaryDirectory() as tmp_dir:
+        work_path = Path(tmp_dir)
+        write_secrets(work_path / 'secrets', services.url('s3'))
+        for name in args.pipelines:
+            report['results'][name] = run_pipeline(name, cfg, args.days, args.max_workers, work_path, services,
+                                                   args.timeout)
+            if 'error' in report['results'][name]:
+                print(f'{name} failed:\n{report["results"][name]["error"]}', file=sys.stderr)
+            else:
+                print(f'{name}: {json.dumps(report["results"][name])}')
+
+    output = args.output
+    if output is None:
+        timestamp = datetime.now().strftime('%Y%m%dT%H%M%S')
+        output = RESULTS_PATH / f'{timestamp}_{commit or "unknown"}.json'
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Results saved to {output}')
+    return report
+
+
+if __name__ == '__main__':
+    report = main()
+    sys.exit(1 if any('error' in result for result in report['results'].values()) else 0)
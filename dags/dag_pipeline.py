@@ -5,15 +5,17 @@ from airflow.sdk import dag, task
 from src.extractors.open_meteo import OpenMeteoPipeline
 
 CONFIG = {
-    'location': {
-        'name': 'Cerhenice',
-        'coordinates': {
-            'min_lon': 15.0492,
-            'min_lat': 50.0566,
-            'max_lon': 15.0949,
-            'max_lat': 50.0859
-        }
-    },
+    'locations': [
+        {
+            'name': 'Cerhenice',
+            'coordinates': {
+                'min_lon': 15.0492,
+                'min_lat': 50.0566,
+                'max_lon': 15.0949,
+                'max_lat': 50.0859
+            }
+        },
+    ],
     'sentinel_type': 'sentinel-2-l2a',
     'weather_frequency': 'hourly',
     'weather_variables': [
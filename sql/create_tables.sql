@@ -8,10 +8,33 @@ CREATE TABLE IF NOT EXISTS satellite_images_metadata (
     max_lat FLOAT NOT NULL,
     max_lon FLOAT NOT NULL,
     image_path VARCHAR NOT NULL,
+    product VARCHAR NOT NULL DEFAULT 'bands',
+    bands VARCHAR,
     extraction_date DATE NOT NULL DEFAULT CURRENT_DATE,
-    UNIQUE (image_date, min_lat, min_lon, max_lat, max_lon)
+    UNIQUE (image_date, min_lat, min_lon, max_lat, max_lon, product)
 );
 
+-- migration of tables created before images were stored per product
+ALTER TABLE satellite_images_metadata ADD COLUMN IF NOT EXISTS product VARCHAR NOT NULL DEFAULT 'bands';
+-- band order of images stored before it was recorded is unknown (NULL)
+ALTER TABLE satellite_images_metadata ADD COLUMN IF NOT EXISTS bands VARCHAR;
+
+DO $$
+DECLARE
+    old_constraint TEXT;
+BEGIN
+    SELECT con.conname INTO old_constraint
+    FROM pg_constraint con
+    WHERE con.conrelid = 'satellite_images_metadata'::regclass
+      AND con.contype = 'u'
+      AND array_length(con.conkey, 1) = 5;
+    IF old_constraint IS NOT NULL THEN
+        EXECUTE format('ALTER TABLE satellite_images_metadata DROP CONSTRAINT %I', old_constraint);
+        ALTER TABLE satellite_images_metadata
+            ADD UNIQUE (image_date, min_lat, min_lon, max_lat, max_lon, product);
+    END IF;
+END $$;
+
 CREATE TABLE IF NOT EXISTS weather_hourly (
    id SERIAL PRIMARY KEY,
    location_name VARCHAR NOT NULL,
@@ -25,4 +48,82 @@ CREATE TABLE IF NOT EXISTS weather_hourly (
    soil_moisture_0_to_1cm FLOAT,
    extraction_date DATE NOT NULL DEFAULT CURRENT_DATE,
    UNIQUE (latitude, longitude, timestamp)
-);
\ No newline at end of file
+);
+
+CREATE TABLE IF NOT EXISTS sentinel_catalog (
+    id SERIAL PRIMARY KEY,
+    collection VARCHAR NOT NULL,
+    feature_id VARCHAR NOT NULL,
+    min_lat FLOAT NOT NULL,
+    min_lon FLOAT NOT NULL,
+    max_lat FLOAT NOT NULL,
+    max_lon FLOAT NOT NULL,
+    acquisition_datetime TIMESTAMP NOT NULL,
+    datetime_iso VARCHAR NOT NULL,
+    cloud_cover FLOAT,
+    platform VARCHAR,
+    relative_orbit INTEGER,
+    UNIQUE (collection, feature_id, min_lat, min_lon, max_lat, max_lon)
+);
+
+-- migration of catalog index created before relative orbits were stored
+ALTER TABLE sentinel_catalog ADD COLUMN IF NOT EXISTS relative_orbit INTEGER;
+
+CREATE INDEX IF NOT EXISTS sentinel_catalog_lookup_idx
+    ON sentinel_catalog (collection, min_lat, min_lon, max_lat, max_lon, acquisition_datetime);
+
+CREATE TABLE IF NOT EXISTS sentinel_catalog_sync (
+    id SERIAL PRIMARY KEY,
+    collection VARCHAR NOT NULL,
+    min_lat FLOAT NOT NULL,
+    min_lon FLOAT NOT NULL,
+    max_lat FLOAT NOT NULL,
+    max_lon FLOAT NOT NULL,
+    synced_from TIMESTAMP NOT NULL,
+    synced_to TIMESTAMP NOT NULL,
+    UNIQUE (collection, min_lat, min_lon, max_lat, max_lon)
+);
+
+CREATE TABLE IF NOT EXISTS satellite_images_ndvi (
+    id SERIAL PRIMARY KEY,
+    image_id INTEGER NOT NULL UNIQUE REFERENCES satellite_images_metadata (id) ON DELETE CASCADE,
+    mean FLOAT,
+    std FLOAT,
+    min FLOAT,
+    max FLOAT,
+    median FLOAT,
+    p10 FLOAT,
+    p25 FLOAT,
+    p75 FLOAT,
+    p90 FLOAT,
+    valid_pixels INTEGER NOT NULL,
+    total_pixels INTEGER NOT NULL,
+    valid_fraction FLOAT NOT NULL,
+    extraction_date DATE NOT NULL DEFAULT CURRENT_DATE
+);
+
+CREATE TABLE IF NOT EXISTS satellite_index_stats (
+    id SERIAL PRIMARY KEY,
+    satellite_type VARCHAR,
+    location_name VARCHAR NOT NULL,
+    min_lat FLOAT NOT NULL,
+    min_lon FLOAT NOT NULL,
+    max_lat FLOAT NOT NULL,
+    max_lon FLOAT NOT NULL,
+    index_name VARCHAR NOT NULL,
+    date TIMESTAMP NOT NULL,
+    mean FLOAT,
+    std FLOAT,
+    min FLOAT,
+    max FLOAT,
+    median FLOAT,
+    p10 FLOAT,
+    p25 FLOAT,
+    p75 FLOAT,
+    p90 FLOAT,
+    valid_pixels INTEGER NOT NULL,
+    total_pixels INTEGER NOT NULL,
+    valid_fraction FLOAT NOT NULL,
+    extraction_date DATE NOT NULL DEFAULT CURRENT_DATE,
+    UNIQUE (min_lat, min_lon, max_lat, max_lon, index_name, date)
+);
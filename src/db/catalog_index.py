@@ -0,0 +1,176 @@
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker, Session
+
+from src.db.pg_data_models import SentinelCatalogItem, SentinelCatalogSync
+from src.extractors.sentinel_catalog import acquisition_orbit, collapse_acquisitions
+from src.utils.common_utils import get_iso_datetime_format, parse_iso_datetime
+
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+import logging
+
+DEFAULT_SETTLE_TIME = timedelta(hours=6)
+
+
+class CatalogIndex:
+    """ Local copy of SentinelHub Catalog API results for one collection and bounding box.
+
+    Synced time range is stored as a single interval (watermark). Only the parts of requested range outside this
+    interval are queried from the API, everything else is a database lookup. The end of the interval is never moved
+    closer to now than settle_time, because recent acquisitions may be published with a delay, so the unsettled
+    tail is queried again by the next run. Range which does not adjoin the interval (with gap longer than
+    settle_time) is queried on its own and, when it is newer, replaces the interval.
+    """
+    def __init__(self, engine: Engine, collection: str, coords: dict, logger=None,
+                 settle_time: timedelta = DEFAULT_SETTLE_TIME):
+        self.Session = sessionmaker(bind=engine)
+        self.collection = collection
+        self.coords = coords
+        self.settle_time = settle_time
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+
+    def _filter(self, model):
+        return (
+            model.collection == self.collection,
+            model.min_lat == self.coords['min_lat'],
+            model.min_lon == self.coords['min_lon'],
+            model.max_lat == self.coords['max_lat'],
+            model.max_lon == self.coords['max_lon'],
+        )
+
+    def _get_sync(self, session: Session) -> Optional[SentinelCatalogSync]:
+        return session.execute(select(SentinelCatalogSync).where(*self._filter(SentinelCatalogSync))).scalar()
+
+    def missing_ranges(self, start: datetime, end: datetime) -> List[Tuple[datetime, datetime]]:
+        """ Returns time ranges which have to be queried from API so that synced interval covers start - end.
+        """
+        with self.Session() as session:
+            sync = self._get_sync(session)
+
+        if sync is None or start - sync.synced_to > self.settle_time or end < sync.synced_from:
+            return [(start, end)]
+
+        ranges = []
+        if start < sync.synced_from:
+            ranges.append((start, sync.synced_from))
+        if end > sync.synced_to:
+            ranges.append((sync.synced_to, end))
+        return ranges
+
+    def add_features(self, features: List[dict]) -> int:
+        """ Stores catalog features which are not in index yet.
+
+        :param features: Catalog API features
+        :return: number of new features
+        """
+        if not features:
+            return 0
+
+        with self.Session() as session:
+            feature_ids = [feat.get('id') or feat['properties']['datetime'] for feat in features]
+            existing = set(session.execute(
+                select(SentinelCatalogItem.feature_id)
+                .where(*self._filter(SentinelCatalogItem), SentinelCatalogItem.feature_id.in_(feature_ids))
+            ).scalars())
+
+            new_items = []
+            for feature_id, feat in zip(feature_ids, features):
+                if feature_id in existing:
+                    continue
+                existing.add(feature_id)
+                properties = feat['properties']
+                new_items.append(SentinelCatalogItem(
+                    collection=self.collection,
+                    feature_id=feature_id,
+                    min_lat=self.coords['min_lat'],
+                    min_lon=self.coords['min_lon'],
+                    max_lat=self.coords['max_lat'],
+                    max_lon=self.coords['max_lon'],
+                    acquisition_datetime=parse_iso_datetime(properties['datetime']),
+                    datetime_iso=properties['datetime'],
+                    cloud_cover=properties.get('eo:cloud_cover'),
+                    platform=properties.get('platform'),
+                    relative_orbit=properties.get('sat:relative_orbit'),
+                ))
+
+            session.add_all(new_items)
+            session.commit()
+        return len(new_items)
+
+    @staticmethod
+    def _now() -> datetime:
+        return datetime.now(timezone.utc).replace(tzinfo=None)
+
+    def mark_synced(self, start: datetime, end: datetime):
+        """ Extends synced interval by start - end (capped at now - settle_time). Newer range which does not overlap
+        the interval replaces it.
+        """
+        end = min(end, self._now() - self.settle_time)
+        if end <= start:
+            return
+
+        with self.Session() as session:
+            sync = self._get_sync(session)
+            if sync is None:
+                session.add(SentinelCatalogSync(
+                    collection=self.collection,
+                    min_lat=self.coords['min_lat'],
+                    min_lon=self.coords['min_lon'],
+                    max_lat=self.coords['max_lat'],
+                    max_lon=self.coords['max_lon'],
+                    synced_from=start,
+                    synced_to=end,
+                ))
+            elif start > sync.synced_to:
+                sync.synced_from, sync.synced_to = start, end
+            elif end >= sync.synced_from:
+                sync.synced_from = min(sync.synced_from, start)
+                sync.synced_to = max(sync.synced_to, end)
+            session.commit()
+
+    def _select_items(self, start: datetime, end: datetime, max_cloud_cover: Optional[float] = None):
+        query = (
+            select(SentinelCatalogItem.datetime_iso, SentinelCatalogItem.platform, SentinelCatalogItem.relative_orbit)
+            .where(*self._filter(SentinelCatalogItem),
+                   SentinelCatalogItem.acquisition_datetime >= start,
+                   SentinelCatalogItem.acquisition_datetime <= end)
+            .order_by(SentinelCatalogItem.acquisition_datetime)
+        )
+        if max_cloud_cover is not None:
+            query = query.where(SentinelCatalogItem.cloud_cover <= max_cloud_cover)
+        with self.Session() as session:
+            return session.execute(query).all()
+
+    def get_dates(self, start: datetime, end: datetime, max_cloud_cover: Optional[float] = None) -> List[str]:
+        """ Returns acquisition datetimes (ISO format) stored in index for start - end.
+
+        :param start: start datetime (UTC)
+        :param end: end datetime (UTC)
+        :param max_cloud_cover: skip scenes with higher (or unknown) cloud cover in percent
+        """
+        return [iso_datetime for iso_datetime, _, _ in self._select_items(start, end, max_cloud_cover)]
+
+    def sync(self, extractor, start: datetime, end: datetime, max_cloud_cover: Optional[float] = None) -> List[str]:
+        """ Queries API only for not yet synced parts of start - end and returns all acquisition datetimes, collapsed
+        per day and orbit as on the API path. Index keeps all scenes, cloud cover is filtered on lookup, so changing
+        the threshold does not need a resync.
+
+        :param extractor: object with search_catalog(iso_start_datetime, iso_end_datetime, cloud_filter) method
+        :param start: start datetime (UTC)
+        :param end: end datetime (UTC)
+        :param max_cloud_cover: skip scenes with higher (or unknown) cloud cover in percent
+        :return: acquisition datetimes in ISO format
+        """
+        for range_start, range_end in self.missing_ranges(start, end):
+            features = extractor.search_catalog(get_iso_datetime_format(range_start),
+                                                get_iso_datetime_format(range_end), cloud_filter=False)
+            added = self.add_features(features)
+            self.mark_synced(range_start, range_end)
+            self.logger.info(f'Catalog index synced {range_start} - {range_end} | new features={added}')
+
+        dates = collapse_acquisitions((iso_datetime, acquisition_orbit(platform, relative_orbit))
+                                      for iso_datetime, platform, relative_orbit
+                                      in self._select_items(start, end, max_cloud_cover))
+        self.logger.info(f'Available dates: {len(dates)}')
+        return dates
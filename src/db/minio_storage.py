@@ -1,35 +1,135 @@
 from minio import Minio
 from minio.error import S3Error
 from io import BytesIO
+import threading
 import logging
 
+from typing import BinaryIO, Dict, Iterable, Set, Tuple
+
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class MinioStorage:
+    """ MinIO client wrapper. Clients are shared per endpoint and buckets that were already checked (or created)
+    are remembered for the lifetime of the process, so each upload costs a single request.
+    """
+    _clients: Dict[Tuple[str, str], Minio] = {}
+    _verified_buckets: Set[Tuple[str, str]] = set()
+    _lock = threading.Lock()
+
+    def __init__(self, creds: dict, logger=None):
+        if logger is None:
+            logger = logging.getLogger(self.__class__.__name__)
+            logger.setLevel(logging.INFO)
+        self.logger = logger
+        self.endpoint = creds['endpoint']
+        self.client = self._get_client(creds)
+
+    @classmethod
+    def _get_client(cls, creds: dict) -> Minio:
+        key = (creds['endpoint'], creds['access_key'])
+        with cls._lock:
+            client = cls._clients.get(key)
+            if client is None:
+                client = Minio(
+                    endpoint=creds['endpoint'],
+                    access_key=creds['access_key'],
+                    secret_key=creds['secret_key'],
+                    secure=False
+                )
+                cls._clients[key] = client
+        return client
+
+    @classmethod
+    def reset(cls):
+        """ Forgets cached clients and verified buckets.
+        """
+        with cls._lock:
+            cls._clients.clear()
+            cls._verified_buckets.clear()
+
+    def ensure_bucket(self, bucket_name: str) -> bool:
+        """ Creates bucket if it does not exist. Check is done only once per endpoint and bucket.
+
+        :param bucket_name: name of bucket
+        :return: True if bucket is available
+        """
+        key = (self.endpoint, bucket_name)
+        if key in self._verified_buckets:
+            return True
+
+        try:
+            if not self.client.bucket_exists(bucket_name):
+                self.client.make_bucket(bucket_name)
+                self.logger.info(f'Bucket "{bucket_name}" created.')
+        except S3Error as e:
+            self.logger.error(f'Error checking/creating bucket "{bucket_name}": {e}')
+            return False
+
+        with self._lock:
+            self._verified_buckets.add(key)
+        return True
+
+    def upload(self, bucket_name: str, object_name: str, data: bytes, content_type: str) -> bool:
+        """ Uploads data as object to bucket.
+
+        :return: True if upload succeeded
+        """
+        if not self.ensure_bucket(bucket_name):
+            return False
+
+        try:
+            self.client.put_object(bucket_name, object_name, BytesIO(data), len(data), content_type)
+            self.logger.info(f'Image uploaded successfully to {object_name}')
+            return True
+        except S3Error as e:
+            self.logger.error(f'Error uploading image: {e}')
+            return False
+
+    def upload_stream(self, bucket_name: str, object_name: str, stream: BinaryIO, content_type: str,
+                      part_size: int = MIN_PART_SIZE) -> bool:
+        """ Uploads stream of unknown length as multipart upload. Only one part is held in memory at a time.
+
+        :param stream: file-like object with read()
+        :param part_size: size of uploaded parts in bytes (min 5 MiB)
+        :return: True if upload succeeded
+        """
+        if not self.ensure_bucket(bucket_name):
+            return False
+
+        try:
+            self.client.put_object(bucket_name, object_name, stream, -1, content_type,
+                                   part_size=max(part_size, MIN_PART_SIZE))
+            self.logger.info(f'Image uploaded successfully to {object_name}')
+            return True
+        except S3Error as e:
+            self.logger.error(f'Error uploading image: {e}')
+            return False
+
+    def download(self, bucket_name: str, object_name: str, file_path: str) -> bool:
+        """ Downloads object to local file (in parts, object is not held in memory).
+
+        :return: True if download succeeded
+        """
+        try:
+            self.client.fget_object(bucket_name, object_name, file_path)
+            return True
+        except S3Error as e:
+            self.logger.error(f'Error downloading {bucket_name}/{object_name}: {e}')
+            return False
+
+    def upload_many(self, bucket_name: str, objects: Iterable[Tuple[str, bytes, str]]) -> int:
+        """ Uploads several objects to one bucket, bucket is checked only once.
+
+        :param bucket_name: name of bucket
+        :param objects: (object_name, data, content_type) tuples
+        :return: number of uploaded objects
+        """
+        if not self.ensure_bucket(bucket_name):
+            return 0
+        return sum(self.upload(bucket_name, object_name, data, content_type)
+                   for object_name, data, content_type in objects)
+
 
-# TODO: create class MinioStorage
 def save_to_minio(creds: dict, bucket_name: str, object_name: str, data: bytes, content_type: str, logger=None):
-    if logger is None:
-        logger = logging.getLogger('MinioStorage')
-        logger.setLevel(logging.INFO)
-
-    client = Minio(
-        endpoint=creds['endpoint'],
-        access_key=creds['access_key'],
-        secret_key=creds['secret_key'],
-        secure=False
-    )
-
-    try:
-        if not client.bucket_exists(bucket_name):
-            client.make_bucket(bucket_name)
-            logger.info(f'Bucket "{bucket_name}" created.')
-    except S3Error as e:
-        logger.error(f'Error checking/creating bucket "{bucket_name}": {e}')
-        logger.exception("Upload failed")
-        return
-
-    bytes_data = BytesIO(data)
-    size = len(data)
-    try:
-        client.put_object(bucket_name, object_name, bytes_data, size, content_type)
-        logger.info(f'Image uploaded successfully to {object_name}')
-    except S3Error as e:
-        logger.error(f'Error uploading image: {e}')
+    MinioStorage(creds, logger).upload(bucket_name, object_name, data, content_type)
@@ -0,0 +1,237 @@
+from sqlalchemy.exc import InterfaceError, OperationalError, SQLAlchemyError
+
+from src.db.pg_data_models import SatelliteImageMetadata, WeatherHourly
+from src.db.pg_database import PostgreSaver
+
+from pathlib import Path
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional, Tuple, Type, Union
+import sqlite3
+import threading
+import json
+import logging
+
+# tables which can be written through outbox
+OUTBOX_MODELS: Dict[str, Type[Union[SatelliteImageMetadata, WeatherHourly]]] = {
+    model.__tablename__: model for model in (SatelliteImageMetadata, WeatherHourly)
+}
+# errors after which the same batch can succeed later (database unavailable, lost connection)
+TRANSIENT_ERRORS = (OperationalError, InterfaceError)
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    if isinstance(value, date):
+        return {'__date__': value.isoformat()}
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def _decode(obj: dict):
+    if '__datetime__' in obj:
+        return datetime.fromisoformat(obj['__datetime__'])
+    if '__date__' in obj:
+        return date.fromisoformat(obj['__date__'])
+    return obj
+
+
+class Outbox:
+    """ Local append-only queue of rows waiting for PostgreSQL, stored in SQLite file.
+
+    Rows are appended right after the data they describe are stored (e.g. image uploaded to MinIO), so a failed
+    or slow database does not block extraction and no row is lost. flush() moves pending rows to PostgreSQL
+    in large batches and deletes them only after the transaction is committed. Rows left by interrupted runs are
+    replayed by the next flush. Tables have unique constraints and rows are inserted with ON CONFLICT DO NOTHING,
+    so replaying a row which was already committed is harmless. Batches rejected by the database for other than
+    transient reasons (e.g. invalid data) are split in halves until the rejected rows are found, only those are
+    moved to table dead_letter together with the error, so they do not block rows behind them.
+
+    Connection is opened on first use and can be reopened after close(), so the outbox can be closed at the end
+    of every pipeline run.
+    """
+    def __init__(self, path: Union[str, Path], batch_size: int = 1000, flush_interval: float = 5.0, logger=None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        """ Returns SQLite connection, opens it (and creates tables) when it is not open. Call with _lock held.
+        """
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS outbox '
+                '(id INTEGER PRIMARY KEY AUTOINCREMENT, table_name TEXT NOT NULL, payload TEXT NOT NULL)'
+            )
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS dead_letter '
+                '(id INTEGER PRIMARY KEY, table_name TEXT NOT NULL, payload TEXT NOT NULL, error TEXT NOT NULL, '
+                'failed_at TEXT NOT NULL)'
+            )
+            self._conn.commit()
+        return self._conn
+
+    @classmethod
+    def from_config(cls, outbox_cfg: Optional[dict], logger=None) -> Optional['Outbox']:
+        """ Creates outbox from cfg['outbox'] (path, batch_size, flush_interval), returns None when outbox is not
+        configured.
+        """
+        if not outbox_cfg:
+            return None
+        return cls(logger=logger, **outbox_cfg)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def append(self, model: Type[Union[SatelliteImageMetadata, WeatherHourly]], rows: List[dict]):
+        """ Durably stores rows of given table in one transaction, either all rows are stored or none.
+        """
+        if model.__tablename__ not in OUTBOX_MODELS:
+            raise ValueError(f'Table {model.__tablename__} is not supported by outbox')
+        if not rows:
+            return
+
+        payloads = [(model.__tablename__, json.dumps(row, default=_encode)) for row in rows]
+        with self._lock, self._connection:
+            self._connection.executemany('INSERT INTO outbox (table_name, payload) VALUES (?, ?)', payloads)
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM outbox').fetchone()[0]
+
+    def dead_letters(self) -> int:
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM dead_letter').fetchone()[0]
+
+    def _next_batch(self) -> Tuple[str, List[int], List[dict]]:
+        """ Returns oldest pending rows of one table: (table, ids, rows).
+        """
+        with self._lock:
+            first = self._connection.execute('SELECT table_name FROM outbox ORDER BY id LIMIT 1').fetchone()
+            if first is None:
+                return '', [], []
+            records = self._connection.execute(
+                'SELECT id, payload FROM outbox WHERE table_name = ? ORDER BY id LIMIT ?',
+                (first[0], self.batch_size)
+            ).fetchall()
+        return first[0], [record[0] for record in records], \
+            [json.loads(record[1], object_hook=_decode) for record in records]
+
+    def _delete(self, ids: List[int]):
+        with self._lock, self._connection:
+            self._connection.executemany('DELETE FROM outbox WHERE id = ?', [(record_id,) for record_id in ids])
+
+    def _move_to_dead_letter(self, ids: List[int], error: Exception):
+        """ Moves rows from outbox to dead_letter table in one transaction. Rows already in dead_letter are kept
+        there, so the move can be repeated.
+        """
+        failed_at = datetime.now(timezone.utc).isoformat()
+        with self._lock, self._connection:
+            self._connection.executemany(
+                'INSERT OR IGNORE INTO dead_letter (id, table_name, payload, error, failed_at) '
+                'SELECT id, table_name, payload, ?, ? FROM outbox WHERE id = ?',
+                [(str(error), failed_at, record_id) for record_id in ids]
+            )
+            self._connection.executemany('DELETE FROM outbox WHERE id = ?', [(record_id,) for record_id in ids])
+
+    def _save_batch(self, postgre_saver: PostgreSaver, db_name: str, table: str, ids: List[int],
+                    rows: List[dict]) -> int:
+        """ Saves rows to PostgreSQL and deletes them from outbox. Rejected batch is split in halves which are
+        saved separately, single rejected row is moved to dead_letter. Transient errors are raised.
+
+        :return: number of rows saved
+        """
+        try:
+            postgre_saver.bulk_save(db_name, OUTBOX_MODELS[table], rows)
+        except TRANSIENT_ERRORS:
+            raise
+        except SQLAlchemyError as e:
+            if len(ids) == 1:
+                self._move_to_dead_letter(ids, e)
+                self.logger.error(f'Outbox row {ids[0]} to {table} rejected, moved to dead letter: {e}')
+                return 0
+            middle = len(ids) // 2
+            return self._save_batch(postgre_saver, db_name, table, ids[:middle], rows[:middle]) + \
+                self._save_batch(postgre_saver, db_name, table, ids[middle:], rows[middle:])
+        self._delete(ids)
+        return len(ids)
+
+    def flush(self, postgre_saver: PostgreSaver, db_name: str = 'satellite_image_processing') -> int:
+        """ Writes pending rows to PostgreSQL in batches of batch_size rows. Stops at first batch failed with
+        transient error, its rows (and all later ones) stay in outbox for the next flush. Batches failed with other
+        errors are split until rejected rows are found, these are moved to dead_letter table and flush continues.
+
+        :param postgre_saver: PostgreSQL saver
+        :param db_name: name of database
+        :return: number of rows moved to PostgreSQL
+        """
+        flushed = 0
+        with self._flush_lock:
+            while True:
+                table, ids, rows = self._next_batch()
+                if not ids:
+                    break
+                try:
+                    flushed += self._save_batch(postgre_saver, db_name, table, ids, rows)
+                except TRANSIENT_ERRORS as e:
+                    self.logger.warning(f'Outbox flush failed, {self.pending()} rows kept for later: {e}')
+                    break
+
+        if flushed:
+            self.logger.info(f'Outbox flushed | rows={flushed}')
+        return flushed
+
+
+class OutboxFlusher:
+    """ Background thread flushing outbox every interval seconds (outbox flush_interval by default). Pending rows
+    from previous runs are flushed on start, remaining rows on exit.
+    """
+    def __init__(self, outbox: Outbox, postgre_saver: PostgreSaver, interval: Optional[float] = None,
+                 db_name: str = 'satellite_image_processing'):
+        self.outbox = outbox
+        self.postgre_saver = postgre_saver
+        self.interval = outbox.flush_interval if interval is None else interval
+        self.db_name = db_name
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        self.outbox.flush(self.postgre_saver, self.db_name)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._flush_loop, name='outbox-flusher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.outbox.flush(self.postgre_saver, self.db_name)
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.interval):
+            self.outbox.flush(self.postgre_saver, self.db_name)
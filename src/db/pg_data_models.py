@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Float, DateTime, UniqueConstraint, ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -16,8 +16,11 @@ class SatelliteImageMetadata(Base):
     max_lat = Column(Float, nullable=False)
     max_lon = Column(Float, nullable=False)
     image_path = Column(String, nullable=False)
+    product = Column(String, nullable=False, default='bands', server_default='bands')
+    # comma-separated bands of 'bands' product in order of image samples, e.g. 'B04,B03,B02,B08'
+    bands = Column(String, nullable=True)
 
-    __table_args__ = (UniqueConstraint(image_date, min_lat, min_lon, max_lat, max_lon),)
+    __table_args__ = (UniqueConstraint(image_date, min_lat, min_lon, max_lat, max_lon, product),)
 
 
 class WeatherHourly(Base):
@@ -35,3 +38,85 @@ class WeatherHourly(Base):
     soil_moisture_0_to_1cm = Column(Float, nullable=True)
 
     __table_args__ = (UniqueConstraint(latitude, longitude, timestamp),)
+
+
+class SentinelCatalogItem(Base):
+    __tablename__ = 'sentinel_catalog'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    collection = Column(String, nullable=False)
+    feature_id = Column(String, nullable=False)
+    min_lat = Column(Float, nullable=False)
+    min_lon = Column(Float, nullable=False)
+    max_lat = Column(Float, nullable=False)
+    max_lon = Column(Float, nullable=False)
+    acquisition_datetime = Column(DateTime, nullable=False)
+    datetime_iso = Column(String, nullable=False)
+    cloud_cover = Column(Float, nullable=True)
+    platform = Column(String, nullable=True)
+    relative_orbit = Column(Integer, nullable=True)
+
+    __table_args__ = (UniqueConstraint(collection, feature_id, min_lat, min_lon, max_lat, max_lon),)
+
+
+class SentinelCatalogSync(Base):
+    __tablename__ = 'sentinel_catalog_sync'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    collection = Column(String, nullable=False)
+    min_lat = Column(Float, nullable=False)
+    min_lon = Column(Float, nullable=False)
+    max_lat = Column(Float, nullable=False)
+    max_lon = Column(Float, nullable=False)
+    synced_from = Column(DateTime, nullable=False)
+    synced_to = Column(DateTime, nullable=False)
+
+    __table_args__ = (UniqueConstraint(collection, min_lat, min_lon, max_lat, max_lon),)
+
+
+class SatelliteImageNdvi(Base):
+    __tablename__ = 'satellite_images_ndvi'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    image_id = Column(Integer, ForeignKey('satellite_images_metadata.id', ondelete='CASCADE'), nullable=False,
+                      unique=True)
+    mean = Column(Float, nullable=True)
+    std = Column(Float, nullable=True)
+    min = Column(Float, nullable=True)
+    max = Column(Float, nullable=True)
+    median = Column(Float, nullable=True)
+    p10 = Column(Float, nullable=True)
+    p25 = Column(Float, nullable=True)
+    p75 = Column(Float, nullable=True)
+    p90 = Column(Float, nullable=True)
+    valid_pixels = Column(Integer, nullable=False)
+    total_pixels = Column(Integer, nullable=False)
+    valid_fraction = Column(Float, nullable=False)
+
+
+class SatelliteIndexStats(Base):
+    __tablename__ = 'satellite_index_stats'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    satellite_type = Column(String, nullable=True)
+    location_name = Column(String, nullable=False)
+    min_lat = Column(Float, nullable=False)
+    min_lon = Column(Float, nullable=False)
+    max_lat = Column(Float, nullable=False)
+    max_lon = Column(Float, nullable=False)
+    index_name = Column(String, nullable=False)
+    date = Column(DateTime, nullable=False)
+    mean = Column(Float, nullable=True)
+    std = Column(Float, nullable=True)
+    min = Column(Float, nullable=True)
+    max = Column(Float, nullable=True)
+    median = Column(Float, nullable=True)
+    p10 = Column(Float, nullable=True)
+    p25 = Column(Float, nullable=True)
+    p75 = Column(Float, nullable=True)
+    p90 = Column(Float, nullable=True)
+    valid_pixels = Column(Integer, nullable=False)
+    total_pixels = Column(Integer, nullable=False)
+    valid_fraction = Column(Float, nullable=False)
+
+    __table_args__ = (UniqueConstraint(min_lat, min_lon, max_lat, max_lon, index_name, date),)
@@ -1,25 +1,83 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy import and_, create_engine, or_, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 
-from src.db.pg_data_models import SatelliteImageMetadata, WeatherHourly
+from src.db.pg_data_models import SatelliteImageMetadata, SatelliteImageNdvi, SatelliteIndexStats, WeatherHourly
 
-from typing import Union
+from datetime import datetime
+from collections import defaultdict
+from typing import Union, Dict, Tuple, List, Type, Set, Optional
+import threading
 import logging
 
+_ENGINES: Dict[Tuple[str, str, str, str, int], Engine] = {}
+_ENGINES_LOCK = threading.Lock()
+
+
+def get_engine(creds: dict, db_name: str, pool_size: int = 5) -> Engine:
+    """ Returns long-lived engine for given credentials and database. Engine (and its connection pool) is created
+    only on first request and reused by every later caller in the process.
+
+    :param creds: PostgreSQL credentials
+    :param db_name: name of database
+    :param pool_size: number of connections kept open in the pool
+    :return: SQLAlchemy engine
+    """
+    key = (creds['username'], creds['password'], creds['hostname'], db_name, pool_size)
+    with _ENGINES_LOCK:
+        engine = _ENGINES.get(key)
+        if engine is None:
+            db_url = f"postgresql://{creds['username']}:{creds['password']}@{creds['hostname']}:5432/{db_name}"
+            engine = create_engine(db_url, pool_size=pool_size, pool_pre_ping=True)
+            _ENGINES[key] = engine
+    return engine
+
+
+def dispose_engines():
+    """ Closes all pooled connections of every registered engine.
+    """
+    with _ENGINES_LOCK:
+        for engine in _ENGINES.values():
+            engine.dispose()
+        _ENGINES.clear()
+
 
 class PostgreSaver:
-    def __init__(self, creds: dict):
+    def __init__(self, creds: dict, pool_size: int = 5):
         self.creds = creds
+        self.pool_size = pool_size
         self.logger = logging.getLogger(self.__class__.__name__)
+        self._sessions: Dict[str, Session] = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
 
-    def _create_session(self, db_name: str):
-        db_url = f"postgresql://{self.creds['username']}:{self.creds['password']}@{self.creds['hostname']}:5432/{db_name}"
-        engine = create_engine(db_url)
-        Session = sessionmaker(bind=engine)
-        session = Session()
+    def _create_session(self, db_name: str) -> Session:
+        """ Returns session bound to pooled engine. Session is kept open until close() is called,
+        so that all records saved within one pipeline run share a single connection.
+
+        :param db_name: name of database
+        :return: session
+        """
+        session = self._sessions.get(db_name)
+        if session is None:
+            engine = get_engine(self.creds, db_name, self.pool_size)
+            session = sessionmaker(bind=engine)()
+            self._sessions[db_name] = session
         return session
 
+    def close(self):
+        """ Closes all sessions opened by this saver and returns their connections to the pool.
+        """
+        for session in self._sessions.values():
+            session.close()
+        self._sessions.clear()
+
     def save(self, db_name: str, record: Union[SatelliteImageMetadata, WeatherHourly]):
         session = self._create_session(db_name)
 
@@ -28,4 +86,118 @@ class PostgreSaver:
             session.commit()
             self.logger.info(f'Record saved to: {record.__tablename__}')
         except IntegrityError as e:
+            session.rollback()
             self.logger.warning(f'Skippping row: {e.orig.diag.message_detail}')
+        except SQLAlchemyError as e:
+            session.rollback()
+            self.logger.error(f'Saving record to {record.__tablename__} failed: {e}')
+            raise
+
+    def bulk_save(self, db_name: str,
+                  model: Type[Union[SatelliteImageMetadata, SatelliteImageNdvi, SatelliteIndexStats, WeatherHourly]],
+                  rows: List[dict], batch_size: int = 1000) -> Tuple[int, int]:
+        """ Inserts rows in multi-row INSERT statements within a single transaction. Rows violating unique
+        constraint of the table are skipped by the database (ON CONFLICT DO NOTHING).
+
+        :param db_name: name of database
+        :param model: ORM model of target table
+        :param rows: list of column-value mappings
+        :param batch_size: max number of rows per INSERT statement
+        :return: number of inserted and skipped rows
+        """
+        if not rows:
+            return 0, 0
+
+        session = self._create_session(db_name)
+        inserted = 0
+        try:
+            for start in range(0, len(rows), batch_size):
+                stmt = insert(model).values(rows[start:start + batch_size]).on_conflict_do_nothing()
+                inserted += session.execute(stmt).rowcount
+            session.commit()
+        except SQLAlchemyError as e:
+            session.rollback()
+            self.logger.error(f'Bulk insert to {model.__tablename__} failed: {e}')
+            raise
+
+        skipped = len(rows) - inserted
+        self.logger.info(f'Records saved to: {model.__tablename__} | inserted={inserted} skipped={skipped}')
+        return inserted, skipped
+
+    def get_ingested_image_dates(self, db_name: str, coords: dict, start: datetime, end: datetime,
+                                 product: str = 'bands') -> Set[datetime]:
+        """ Returns image dates already stored in satellite_images_metadata for given bounding box, time range
+        and product.
+
+        :param db_name: name of database
+        :param coords: bounding box coordinates
+        :param start: start datetime
+        :param end: end datetime
+        :param product: image product (e.g. bands, ndvi)
+        :return: set of image dates
+        """
+        session = self._create_session(db_name)
+        stmt = select(SatelliteImageMetadata.image_date).where(
+            SatelliteImageMetadata.min_lat == coords['min_lat'],
+            SatelliteImageMetadata.min_lon == coords['min_lon'],
+            SatelliteImageMetadata.max_lat == coords['max_lat'],
+            SatelliteImageMetadata.max_lon == coords['max_lon'],
+            SatelliteImageMetadata.image_date >= start,
+            SatelliteImageMetadata.image_date <= end,
+            SatelliteImageMetadata.product == product,
+        )
+        try:
+            return set(session.execute(stmt).scalars())
+        finally:
+            session.rollback()
+
+    def get_weather_timestamps(self, db_name: str, points: List[Tuple[float, float]], start: datetime,
+                               end: datetime) -> Dict[Tuple[float, float], Set[datetime]]:
+        """ Returns timestamps already stored in weather_hourly for every point within start (incl.) - end (excl.).
+
+        :param db_name: name of database
+        :param points: list of (latitude, longitude)
+        :param start: start datetime
+        :param end: end datetime
+        :return: stored timestamps per point
+        """
+        timestamps = defaultdict(set)
+        if not points:
+            return timestamps
+
+        session = self._create_session(db_name)
+        stmt = select(WeatherHourly.latitude, WeatherHourly.longitude, WeatherHourly.timestamp).where(
+            tuple_(WeatherHourly.latitude, WeatherHourly.longitude).in_(points),
+            WeatherHourly.timestamp >= start,
+            WeatherHourly.timestamp < end,
+        )
+        try:
+            for lat, lon, timestamp in session.execute(stmt):
+                timestamps[(lat, lon)].add(timestamp)
+        finally:
+            session.rollback()
+        return timestamps
+
+    def get_images_without_ndvi(self, db_name: str,
+                                limit: Optional[int] = None) -> List[Tuple[int, str, Optional[str]]]:
+        """ Returns raw band images (product 'bands') from satellite_images_metadata which have no row
+        in satellite_images_ndvi yet. Images with known band list are returned only if they contain B04 and B08.
+
+        :param db_name: name of database
+        :param limit: max number of returned images
+        :return: list of (image id, image path, comma-separated bands or None) ordered by image date
+        """
+        session = self._create_session(db_name)
+        bands = SatelliteImageMetadata.bands
+        stmt = (
+            select(SatelliteImageMetadata.id, SatelliteImageMetadata.image_path, bands)
+            .outerjoin(SatelliteImageNdvi, SatelliteImageNdvi.image_id == SatelliteImageMetadata.id)
+            .where(SatelliteImageNdvi.id.is_(None), SatelliteImageMetadata.product == 'bands',
+                   or_(bands.is_(None), and_(bands.like('%B04%'), bands.like('%B08%'))))
+            .order_by(SatelliteImageMetadata.image_date)
+            .limit(limit)
+        )
+        try:
+            return [tuple(row) for row in session.execute(stmt)]
+        finally:
+            session.rollback()
@@ -1,49 +1,180 @@
 from pathlib import Path
+from contextlib import AsyncExitStack, ExitStack
+import asyncio
+import aiohttp
 import requests
+from sqlalchemy.exc import SQLAlchemyError
 import json
-from datetime import datetime, timedelta
-from src.utils.common_utils import get_date_range, date_string_format
+import math
+from datetime import date, datetime, time, timedelta
+from src.utils.common_utils import get_date_range, date_string_format, get_locations
 from src.utils.credentials import CredentialManager
 from src.db.pg_data_models import WeatherHourly
 from src.db.pg_database import PostgreSaver
+from src.db.outbox import Outbox, OutboxFlusher
+from src.extractors.weather_decoder import decode_weather, validate_schema
+from src.extractors.weather_planner import plan_requests, HOURS_PER_DAY
+from src.utils.async_http import AsyncHttpClient
+from src.utils.response_cache import ResponseCache
 
-from typing import Tuple, Dict
+from typing import Tuple, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import logging
 
+OPEN_METEO_URL = 'https://api.open-meteo.com/v1/forecast'
+
+
+def get_json_cached(http, cache: Optional[ResponseCache], url: str, end_date: str, logger):
+    """ Sends GET request, response is served from (and stored to) cache when cache is given.
+
+    :param http: requests module or session
+    :param cache: response cache
+    :param url: request URL
+    :param end_date: last requested day, determines TTL of cached response
+    :param logger: logger
+    :return: parsed JSON response
+    """
+    def fetch():
+        try:
+            response = http.get(url)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            logger.error(f'API request failed: {e}')
+            raise
+        return json.loads(response.content)
+
+    if cache is None:
+        return fetch()
+    return cache.get_or_fetch('GET', url, None, end_date, fetch)
+
+
+async def get_json_cached_async(client: AsyncHttpClient, cache: Optional[ResponseCache], url: str, end_date: str,
+                                logger):
+    """ Async variant of get_json_cached, request is sent through shared client.
+    """
+    async def fetch():
+        try:
+            return await client.get_json(url)
+        except aiohttp.ClientError as e:
+            logger.error(f'API request failed: {e}')
+            raise
+
+    if cache is None:
+        return await fetch()
+    return await cache.get_or_fetch_async('GET', url, None, end_date, fetch)
+
+
+def get_grid_points(coords: dict, spacing: Optional[float] = None) -> List[Tuple[float, float]]:
+    """ Returns centres of grid cells covering bounding box. Without spacing only bbox centroid is returned.
+
+    :param coords: bounding box coordinates
+    :param spacing: grid cell size in degrees
+    :return: list of (latitude, longitude)
+    """
+    if not spacing:
+        return [((coords['min_lat'] + coords['max_lat']) / 2, (coords['min_lon'] + coords['max_lon']) / 2)]
+
+    n_lat = max(1, math.ceil((coords['max_lat'] - coords['min_lat']) / spacing))
+    n_lon = max(1, math.ceil((coords['max_lon'] - coords['min_lon']) / spacing))
+    lat_step = (coords['max_lat'] - coords['min_lat']) / n_lat
+    lon_step = (coords['max_lon'] - coords['min_lon']) / n_lon
+    return [
+        (round(coords['min_lat'] + (i + 0.5) * lat_step, 6), round(coords['min_lon'] + (j + 0.5) * lon_step, 6))
+        for i in range(n_lat)
+        for j in range(n_lon)
+    ]
+
+
+class OpenMeteoBatchExtractor:
+    """ Extracts weather data for many points with comma-separated latitude/longitude lists,
+    one request per batch of up to batch_size points.
+    """
+    def __init__(self, logger, session: Optional[requests.Session] = None, batch_size: int = 50,
+                 cache: Optional[ResponseCache] = None):
+        self.logger = logger
+        self.http = session or requests
+        self.batch_size = batch_size
+        self.cache = cache
+
+    def split_batches(self, points: list) -> List[list]:
+        return [points[i:i + self.batch_size] for i in range(0, len(points), self.batch_size)]
+
+    @staticmethod
+    def _build_history_url(points: List[Tuple[float, float]], frequency: str, start_date: str, end_date: str,
+                           variables: list) -> str:
+        latitudes = ','.join(str(lat) for lat, _ in points)
+        longitudes = ','.join(str(lon) for _, lon in points)
+        return (f'{OPEN_METEO_URL}?latitude={latitudes}&longitude={longitudes}'
+                f'&{frequency}={",".join(variables)}&start_date={start_date}&end_date={end_date}')
+
+    @staticmethod
+    def _split_response(points: List[Tuple[float, float]], weather_data) -> List[dict]:
+        """ Open-Meteo returns single object for one point and list of objects (in request order) for more.
+        """
+        results = weather_data if isinstance(weather_data, list) else [weather_data]
+        if len(results) != len(points):
+            raise ValueError(f'Expected {len(points)} results, got {len(results)}')
+        return results
+
+    def get_history_data(self, points: List[Tuple[float, float]], frequency: str, start_date: str, end_date: str,
+                         variables: list) -> List[dict]:
+        """ Returns weather data for every point, in order of points.
+        """
+        results = []
+        for batch in self.split_batches(points):
+            url = self._build_history_url(batch, frequency, start_date, end_date, variables)
+            self.logger.info(
+                f'Extracting weather data | points={len(batch)} from={start_date} to={end_date} '
+                f'variables={variables} frequency={frequency}'
+            )
+            weather_data = get_json_cached(self.http, self.cache, url, end_date, self.logger)
+            results.extend(self._split_response(batch, weather_data))
+        return results
+
+    async def get_history_data_async(self, client: AsyncHttpClient, points: List[Tuple[float, float]],
+                                     frequency: str, start_date: str, end_date: str, variables: list) -> List[dict]:
+        """ Async variant of get_history_data, batches are requested concurrently.
+        """
+        async def get_batch(batch):
+            url = self._build_history_url(batch, frequency, start_date, end_date, variables)
+            weather_data = await get_json_cached_async(client, self.cache, url, end_date, self.logger)
+            return self._split_response(batch, weather_data)
+
+        self.logger.info(f'Extracting weather data | points={len(points)} from={start_date} to={end_date} '
+                         f'variables={variables} frequency={frequency}')
+        batches = await asyncio.gather(*(get_batch(batch) for batch in self.split_batches(points)))
+        return [result for batch in batches for result in batch]
+
 
 class OpenMeteoExtractor:
-    def __init__(self, coords: dict, logger):
+    """ Extracts weather data for centroid of bounding box, single-point wrapper over OpenMeteoBatchExtractor.
+    """
+    def __init__(self, coords: dict, logger, session: Optional[requests.Session] = None,
+                 cache: Optional[ResponseCache] = None):
         self.logger = logger
         self.coords = coords
-        self.lat = self._get_mean_coords()[0]
-        self.lon = self._get_mean_coords()[1]
+        self.lat, self.lon = self._get_mean_coords()
+        self.batch_extractor = OpenMeteoBatchExtractor(logger, session, cache=cache)
 
     def _get_mean_coords(self) -> Tuple[float, float]:
         mean_lat = (self.coords['min_lat'] + self.coords['max_lat']) / 2
         mean_lon = (self.coords['min_lon'] + self.coords['max_lon']) / 2
         return mean_lat, mean_lon
 
-    @staticmethod
-    def _join_weather_variables(variables: list):
-        return ','.join(variables)
-
     def get_history_data(self, frequency: str, start_date: str, end_date: str, variables: list) -> Dict[str, any]:
-        weather_variables = self._join_weather_variables(variables)
-        url = (f'https://api.open-meteo.com/v1/forecast?latitude={self.lat}&longitude={self.lon}'
-               f'&{frequency}={weather_variables}&start_date={start_date}&end_date={end_date}')
-
-        self.logger.info(
-            f'Extracting weather data | lat={self.lat} lon={self.lon} '
-            f'from={start_date} to={end_date} '
-            f'variables={variables} frequency={frequency}'
-        )
-        try:
-            response = requests.get(url)
-            response.raise_for_status()
-            return json.loads(response.content)
-        except requests.exceptions.RequestException as e:
-            self.logger.error(f'API request failed: {e}')
-            raise
+        return self.batch_extractor.get_history_data([(self.lat, self.lon)], frequency, start_date, end_date,
+                                                     variables)[0]
+
+    async def get_history_data_async(self, client: AsyncHttpClient, frequency: str, start_date: str, end_date: str,
+                                     variables: list) -> Dict[str, any]:
+        """ Async variant of get_history_data. Request is sent through shared client, which limits concurrency.
+
+        :param client: shared async HTTP client
+        :return: weather data
+        """
+        weather_data = await self.batch_extractor.get_history_data_async(
+            client, [(self.lat, self.lon)], frequency, start_date, end_date, variables)
+        return weather_data[0]
 
     def get_forecast_data(self):
         pass
@@ -57,62 +188,197 @@ class OpenMeteoPipeline:
         self._validate_config_params()
         self.secrets_path = Path(__file__).resolve().parents[2] / '.secrets'
         self.credential_manager = CredentialManager(self.secrets_path)
-        self.extractor = OpenMeteoExtractor(self.cfg['location']['coordinates'], self.logger)
+        self.session = requests.Session()
+        self.locations = get_locations(self.cfg)
+        self.cache = ResponseCache.from_config(self.cfg.get('http_cache'), self.logger)
+        self.outbox = Outbox.from_config(self.cfg.get('outbox'), self.logger)
+        self.extractor = OpenMeteoBatchExtractor(self.logger, self.session, self.cfg.get('weather_batch_size', 50),
+                                                 self.cache)
 
     def _validate_config_params(self):
         required_keys = ['location', 'weather_frequency', 'weather_variables']
         for key in required_keys:
-            if key not in self.cfg:
+            if key not in self.cfg and not (key == 'location' and 'locations' in self.cfg):
                 raise KeyError(f'Missing config key: {key}')
 
         coord_keys = ['min_lat', 'max_lat', 'min_lon', 'max_lon']
-        for key in coord_keys:
-            if key not in self.cfg['location'].get('coordinates', {}):
-                raise KeyError(f'Missing coordinate key: {key}')
+        for location in get_locations(self.cfg):
+            for key in coord_keys:
+                if key not in location.get('coordinates', {}):
+                    raise KeyError(f'Missing coordinate key: {key}')
 
-    @staticmethod
-    def _safe_get(lst, idx):
-        return lst[idx] if lst and idx < len(lst) else None
+        if self.cfg.get('weather_schema'):
+            validate_schema(self.cfg['weather_schema'])
 
-    def run(self, history: bool = True, n_days: int = 1):
+    @staticmethod
+    def _get_date_range(n_days: int) -> Tuple[date, date]:
         yesterday_date = datetime.today() - timedelta(days=1)
         start_date, end_date = get_date_range(n_days, end_date=yesterday_date)
-        start_date = date_string_format(start_date)
-        end_date = date_string_format(end_date)
+        return start_date.date(), end_date.date()
 
-        if history:
+    def _get_points(self) -> List[Tuple[dict, float, float]]:
+        """ Returns (location, latitude, longitude) for all points to extract. Every location is represented by its
+        centroid, or by grid of points when cfg['weather_grid_spacing'] is set.
+        """
+        return [
+            (location, lat, lon)
+            for location in self.locations
+            for lat, lon in get_grid_points(location['coordinates'], self.cfg.get('weather_grid_spacing'))
+        ]
+
+    def _plan_requests(self, postgre_saver: PostgreSaver, points: List[Tuple[dict, float, float]], start_date: date,
+                       end_date: date) -> List[Tuple[str, str, List[Tuple[dict, float, float]]]]:
+        """ Plans API requests for start_date - end_date. With cfg['weather_plan_gaps'] (default) only days which are
+        not fully stored in weather_hourly are requested, points with the same gap share requests.
+
+        :return: list of (start_date, end_date, batch of points)
+        """
+        plan = {(start_date, end_date): points}
+        if self.cfg.get('weather_plan_gaps', True):
             try:
-                weather_data = self.extractor.get_history_data(
-                    frequency=self.cfg['weather_frequency'],
-                    start_date=start_date,
-                    end_date=end_date,
-                    variables=self.cfg['weather_variables']
+                timestamps = postgre_saver.get_weather_timestamps(
+                    'satellite_image_processing',
+                    list({(lat, lon) for _, lat, lon in points}),
+                    datetime.combine(start_date, time.min),
+                    datetime.combine(end_date + timedelta(days=1), time.min)
                 )
-                if self.cfg['weather_frequency'] not in weather_data:
-                    raise KeyError(f"Key '{self.cfg['weather_frequency']}' not present in Weather Data.")
-
-                frequency = self.cfg['weather_frequency']
-                frequency_data = weather_data.get(frequency, {})
-
-                if 'time' not in frequency_data:
-                    raise KeyError(f"Key 'time' not present in Weather Data.")
-
-                creds = self.credential_manager.get_pg_credentials()
-                postgre_saver = PostgreSaver(creds)
-                for i in range(len(weather_data[self.cfg['weather_frequency']]['time'])):
-                    data = WeatherHourly(
-                        location_name=self.cfg['location']['name'],
-                        latitude=self.extractor.lat,
-                        longitude=self.extractor.lon,
-                        timestamp=frequency_data['time'][i],
-                        temperature_2m=self._safe_get(frequency_data.get('temperature_2m'), i),
-                        precipitation=self._safe_get(frequency_data.get('precipitation'), i),
-                        rain=self._safe_get(frequency_data.get('rain'), i),
-                        soil_temperature_0cm=self._safe_get(frequency_data.get('soil_temperature_0cm'), i),
-                        soil_moisture_0_to_1cm=self._safe_get(frequency_data.get('soil_moisture_0_to_1cm'), i),
-                    )
-                    postgre_saver.save('satellite_image_processing', data)
+                plan = plan_requests(points, timestamps, start_date, end_date,
+                                     HOURS_PER_DAY.get(self.cfg['weather_frequency'], 1))
+            except SQLAlchemyError as e:
+                self.logger.warning(f'Failed to load stored weather data, requesting whole range: {e}')
+
+        requests_plan = [
+            (date_string_format(range_start), date_string_format(range_end), batch)
+            for (range_start, range_end), range_points in sorted(plan.items(), key=lambda item: item[0])
+            for batch in self.extractor.split_batches(range_points)
+        ]
+
+        self.logger.info(f'Weather plan | window={start_date} - {end_date} points={len(points)} '
+                         f'requests={len(requests_plan)}')
+        for (range_start, range_end), range_points in sorted(plan.items(), key=lambda item: item[0]):
+            self.logger.info(f'Weather plan | missing {range_start} - {range_end} points={len(range_points)}')
+        return requests_plan
+
+    def _save_weather_data(self, postgre_saver: PostgreSaver, location: dict, lat: float, lon: float,
+                           weather_data: dict):
+        if self.cfg['weather_frequency'] not in weather_data:
+            raise KeyError(f"Key '{self.cfg['weather_frequency']}' not present in Weather Data.")
+
+        frequency = self.cfg['weather_frequency']
+        frequency_data = weather_data.get(frequency, {})
+
+        if 'time' not in frequency_data:
+            raise KeyError(f"Key 'time' not present in Weather Data.")
+
+        frame = decode_weather(frequency_data, self.cfg['weather_variables'],
+                               schema=self.cfg.get('weather_schema'), logger=self.logger)
+        rows = frame.to_rows(
+            location_name=location['name'],
+            latitude=lat,
+            longitude=lon
+        )
+        if self.outbox is not None:
+            self.outbox.append(WeatherHourly, rows)
+        else:
+            postgre_saver.bulk_save('satellite_image_processing', WeatherHourly, rows)
+
+    def _get_postgre_saver(self) -> PostgreSaver:
+        creds = self.credential_manager.get_pg_credentials()
+        return PostgreSaver(creds, pool_size=self.cfg.get('pg_pool_size', 5))
+
+    def _save_batch(self, postgre_saver: PostgreSaver, batch: List[Tuple[dict, float, float]], results):
+        if isinstance(results, Exception):
+            for location, _, _ in batch:
+                self.logger.error(f"Failed to process and save weather data for {location['name']}: {results}")
+            return
+
+        for (location, lat, lon), weather_data in zip(batch, results):
+            try:
+                self._save_weather_data(postgre_saver, location, lat, lon, weather_data)
 
             except Exception as e:
-                self.logger.error(f'Failed to process and save weather data: {e}')
+                self.logger.error(f"Failed to process and save weather data for {location['name']}: {e}")
+
+    def _log_cache_stats(self):
+        if self.cache is not None:
+            self.logger.info(f'Response cache | {self.cache.stats()}')
+
+    def run(self, history: bool = True, n_days: int = 1, max_workers: Optional[int] = None):
+        """ Extracts weather data for all configured locations and saves them to PostgreSQL. Points of all locations
+        are requested in batches of cfg['weather_batch_size'], up to max_workers batches at once. With cfg['outbox']
+        rows are appended to local outbox and flushed to PostgreSQL in background.
+
+        :param history: extract historical data
+        :param n_days: number of days to look back from yesterday
+        :param max_workers: max number of concurrent requests, defaults to cfg['max_workers'] or 1
+        """
+        if max_workers is None:
+            max_workers = self.cfg.get('max_workers', 1)
+        start_date, end_date = self._get_date_range(n_days)
+
+        if history:
+            with self._get_postgre_saver() as postgre_saver, self._get_postgre_saver() as flush_saver, \
+                    ExitStack() as stack, ThreadPoolExecutor(max_workers=max_workers) as executor:
+                if self.outbox is not None:
+                    # outbox is closed after the final flush
+                    stack.enter_context(self.outbox)
+                    stack.enter_context(OutboxFlusher(self.outbox, flush_saver))
+                requests_plan = self._plan_requests(postgre_saver, self._get_points(), start_date, end_date)
+                futures = {
+                    executor.submit(
+                        self.extractor.get_history_data,
+                        [(lat, lon) for _, lat, lon in batch],
+                        frequency=self.cfg['weather_frequency'],
+                        start_date=range_start,
+                        end_date=range_end,
+                        variables=self.cfg['weather_variables']
+                    ): batch
+                    for range_start, range_end, batch in requests_plan
+                }
+                for future in as_completed(futures):
+                    try:
+                        results = future.result()
+                    except Exception as e:
+                        results = e
+                    self._save_batch(postgre_saver, futures[future], results)
+
+            self._log_cache_stats()
+
+    async def run_async(self, history: bool = True, n_days: int = 1, client: Optional[AsyncHttpClient] = None):
+        """ Async variant of run. Database writes run in worker thread so that event loop is not blocked.
+
+        :param history: extract historical data
+        :param n_days: number of days to look back from yesterday
+        :param client: shared async HTTP client, new one is opened when not given
+        """
+        start_date, end_date = self._get_date_range(n_days)
+
+        if history:
+            with self._get_postgre_saver() as postgre_saver:
+                requests_plan = await asyncio.to_thread(
+                    self._plan_requests, postgre_saver, self._get_points(), start_date, end_date)
+
+            async with AsyncExitStack() as stack:
+                if client is None:
+                    client = await stack.enter_async_context(
+                        AsyncHttpClient(self.cfg.get('max_concurrency', 8), logger=self.logger))
+                results = await asyncio.gather(
+                    *(self.extractor.get_history_data_async(
+                        client,
+                        [(lat, lon) for _, lat, lon in batch],
+                        frequency=self.cfg['weather_frequency'],
+                        start_date=range_start,
+                        end_date=range_end,
+                        variables=self.cfg['weather_variables']
+                    ) for range_start, range_end, batch in requests_plan),
+                    return_exceptions=True
+                )
+
+            with self._get_postgre_saver() as postgre_saver:
+                for (_, _, batch), batch_results in zip(requests_plan, results):
+                    await asyncio.to_thread(self._save_batch, postgre_saver, batch, batch_results)
+                if self.outbox is not None:
+                    with self.outbox:
+                        await asyncio.to_thread(self.outbox.flush, postgre_saver)
 
+            self._log_cache_stats()
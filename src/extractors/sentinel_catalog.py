@@ -0,0 +1,59 @@
+from src.utils.common_utils import parse_iso_datetime
+
+from typing import Iterable, List, Optional, Tuple
+
+# feature properties used downstream (catalog index, dedupe), the rest of the feature is not transferred
+CATALOG_FIELDS = {
+    "include": [
+        "id",
+        "properties.datetime",
+        "properties.eo:cloud_cover",
+        "properties.platform",
+        "properties.sat:relative_orbit",
+    ]
+}
+
+
+def cloud_cover_filter(max_cloud_cover: float) -> dict:
+    """ Returns CQL2 filter of Catalog API request keeping scenes with cloud cover up to max_cloud_cover percent.
+    Collections without eo:cloud_cover (e.g. Sentinel-1) return no features with this filter.
+    """
+    return {
+        "filter": f"eo:cloud_cover <= {max_cloud_cover}",
+        "filter-lang": "cql2-text",
+    }
+
+
+def acquisition_orbit(platform: Optional[str], relative_orbit: Optional[int]) -> Optional[str]:
+    """ Returns orbit key of acquisition: platform and relative orbit when available, platform otherwise
+    (a platform passes over the same area at most once a day).
+    """
+    if relative_orbit is None:
+        return platform
+    return f'{platform}/{relative_orbit}'
+
+
+def feature_acquisition(feature: dict) -> Tuple[str, Optional[str]]:
+    """ Returns (datetime, orbit) of catalog feature, see acquisition_orbit.
+    """
+    properties = feature['properties']
+    return properties['datetime'], acquisition_orbit(properties.get('platform'), properties.get('sat:relative_orbit'))
+
+
+def collapse_acquisitions(acquisitions: Iterable[Tuple[str, Optional[str]]]) -> List[str]:
+    """ Collapses acquisitions per day and orbit. Areas on the border of several granules are listed once per granule
+    with (almost) the same datetime, only the earliest datetime of every day and orbit is kept.
+
+    :param acquisitions: (datetime in ISO format, orbit)
+    :return: datetimes in ISO format ordered by time
+    """
+    ordered = sorted(acquisitions, key=lambda acquisition: parse_iso_datetime(acquisition[0]))
+    dates = []
+    seen = set()
+    for iso_datetime, orbit in ordered:
+        key = (parse_iso_datetime(iso_datetime).date(), orbit)
+        if key in seen:
+            continue
+        seen.add(key)
+        dates.append(iso_datetime)
+    return dates
@@ -0,0 +1,157 @@
+from typing import Callable, Dict, List
+
+# Scene classification (SCL) classes treated as cloudy: cloud shadow, cloud medium / high probability, cirrus
+SCL_CLOUD_CLASSES = (3, 8, 9, 10)
+SCL_NO_DATA = 0
+
+# normalized difference index -> (first band, second band), index = (first - second) / (first + second)
+INDICES = {
+    'ndvi': ('B08', 'B04'),
+    'ndwi': ('B03', 'B08'),
+}
+
+
+def _setup(inputs: List[str], n_bands: int, sample_type: str) -> str:
+    inputs = ', '.join(f'"{band}"' for band in inputs)
+    return f"""
+        //VERSION=3
+        function setup() {{
+          return {{
+            input: [{inputs}],
+            output: {{ bands: {n_bands}, sampleType: "{sample_type}" }},
+          }}
+        }}
+"""
+
+
+def bands_evalscript(bands: List[str], sample_type: str, scale: float) -> str:
+    """ Returns raw bands multiplied by scale.
+    """
+    factor = '' if scale == 1 else f'{scale} * '
+    values = ', '.join(f'{factor}sample.{band}' for band in bands)
+    return _setup(bands, len(bands), sample_type) + f"""
+        function evaluatePixel(sample) {{
+          return [{values}]
+        }}
+        """
+
+
+def _index_evalscript(first: str, second: str, sample_type: str, scale: float) -> str:
+    """ Returns normalized difference (first - second) / (first + second) as single band. FLOAT32 keeps the
+    index as is (NaN = no data), integer types store (index + 1) * scale (0 = no data).
+    """
+    if sample_type == 'FLOAT32':
+        no_data, value = 'NaN', 'index'
+    else:
+        no_data, value = '0', f'(index + 1) * {scale}'
+    return _setup([first, second, 'dataMask'], 1, sample_type) + f"""
+        function evaluatePixel(sample) {{
+          if (sample.dataMask == 0 || sample.{first} + sample.{second} == 0) {{
+            return [{no_data}]
+          }}
+          let index = (sample.{first} - sample.{second}) / (sample.{first} + sample.{second})
+          return [{value}]
+        }}
+        """
+
+
+def ndvi_evalscript(bands: List[str], sample_type: str, scale: float) -> str:
+    return _index_evalscript(*INDICES['ndvi'], sample_type, scale)
+
+
+def ndwi_evalscript(bands: List[str], sample_type: str, scale: float) -> str:
+    return _index_evalscript(*INDICES['ndwi'], sample_type, scale)
+
+
+def true_color_evalscript(bands: List[str], sample_type: str, scale: float) -> str:
+    """ Returns B04, B03, B02 brightened by scale (2.5 is usual for AUTO sample type).
+    """
+    return bands_evalscript(['B04', 'B03', 'B02'], sample_type, scale)
+
+
+def cloud_mask_evalscript(bands: List[str], sample_type: str, scale: float) -> str:
+    """ Returns 1 for cloudy pixels (by scene classification), 0 for clear pixels and 255 for no data.
+    """
+    classes = ', '.join(str(cls) for cls in SCL_CLOUD_CLASSES)
+    return _setup(['SCL'], 1, sample_type) + f"""
+        function evaluatePixel(sample) {{
+          if (sample.SCL == {SCL_NO_DATA}) {{
+            return [255]
+          }}
+          return [[{classes}].includes(sample.SCL) ? 1 : 0]
+        }}
+        """
+
+
+def statistical_evalscript(index: str, mask_clouds: bool = True) -> str:
+    """ Returns evalscript for Statistical API with output named by index and dataMask excluding no data
+    (and cloudy pixels by scene classification when mask_clouds is set).
+    """
+    if index not in INDICES:
+        raise ValueError(f'Unknown index {index}, expected one of {list(INDICES)}')
+    first, second = INDICES[index]
+    classes = ', '.join(str(cls) for cls in SCL_CLOUD_CLASSES)
+    clouds = f' && ![{classes}].includes(sample.SCL)' if mask_clouds else ''
+    return f"""
+        //VERSION=3
+        function setup() {{
+          return {{
+            input: [{{ bands: ["{first}", "{second}", "SCL", "dataMask"] }}],
+            output: [
+              {{ id: "{index}", bands: 1, sampleType: "FLOAT32" }},
+              {{ id: "dataMask", bands: 1 }}
+            ]
+          }}
+        }}
+
+        function evaluatePixel(sample) {{
+          let index = (sample.{first} - sample.{second}) / (sample.{first} + sample.{second})
+          let valid = sample.dataMask == 1 && isFinite(index){clouds}
+          return {{ {index}: [index], dataMask: [valid ? 1 : 0] }}
+        }}
+        """
+
+
+def multitemporal_evalscript(bands: List[str], sample_type: str, scale: float) -> str:
+    """ Returns bands of every acquisition (orbit) in time range as one stack (bands of first scene, bands of
+    second scene, ...). Acquisition dates are returned in userdata output in the same order.
+    """
+    factor = '' if scale == 1 else f'{scale} * '
+    inputs = ', '.join(f'"{band}"' for band in bands)
+    values = '\n'.join(f'            values.push({factor}samples[i].{band})' for band in bands)
+    return f"""
+        //VERSION=3
+        function setup() {{
+          return {{
+            input: [{{ bands: [{inputs}] }}],
+            output: {{ id: "default", bands: {len(bands)}, sampleType: "{sample_type}" }},
+            mosaicking: "ORBIT"
+          }}
+        }}
+
+        function updateOutput(outputs, collection) {{
+          outputs.default.bands = Math.max(collection.scenes.length, 1) * {len(bands)}
+        }}
+
+        function updateOutputMetadata(scenes, inputMetadata, outputMetadata) {{
+          outputMetadata.userData = {{ dates: scenes.map(scene => scene.date) }}
+        }}
+
+        function evaluatePixel(samples) {{
+          let values = []
+          for (let i = 0; i < samples.length; i++) {{
+{values}
+          }}
+          return values
+        }}
+        """
+
+
+# product name -> evalscript builder(bands, sample_type, scale)
+PRODUCTS: Dict[str, Callable[[List[str], str, float], str]] = {
+    'bands': bands_evalscript,
+    'ndvi': ndvi_evalscript,
+    'ndwi': ndwi_evalscript,
+    'true_color': true_color_evalscript,
+    'cloud_mask': cloud_mask_evalscript,
+}
@@ -2,21 +2,52 @@ from pathlib import Path
 from datetime import datetime, timedelta
 import pytz
 
+from contextlib import AsyncExitStack, ExitStack, contextmanager
+from tempfile import TemporaryDirectory
+import asyncio
+import aiohttp
 import requests
+import threading
 import json
+import time
+import os
 
 from oauthlib.oauth2 import BackendApplicationClient
 from requests_oauthlib import OAuth2Session
+from sqlalchemy.exc import SQLAlchemyError
 
-from src.db.minio_storage import save_to_minio
-from src.db.pg_database import PostgreSaver
-from src.db.pg_data_models import SatelliteImageMetadata
+from src.db.minio_storage import MinioStorage
+from src.db.pg_database import PostgreSaver, get_engine
+from src.db.catalog_index import CatalogIndex, DEFAULT_SETTLE_TIME
+from src.db.outbox import Outbox, OutboxFlusher
+from src.db.pg_data_models import SatelliteImageMetadata, SatelliteIndexStats
 
+from src.extractors.sentinel_scheduler import SentinelHubScheduler
+from src.extractors.sentinel_catalog import CATALOG_FIELDS, cloud_cover_filter, feature_acquisition, \
+    collapse_acquisitions
+from src.extractors.sentinel_tiler import Tile, plan_tiles, write_mosaic
+from src.extractors.sentinel_output import OutputProfile, OutputStats, CountingReader, write_geotiff
+from src.extractors.sentinel_multitemporal import multitemporal_responses, split_multitemporal
+from src.extractors.sentinel_evalscripts import multitemporal_evalscript
+from src.extractors.sentinel_statistics import STATISTICS_URL, statistical_request, parse_statistics
 from src.utils.credentials import CredentialManager
-from src.utils.common_utils import get_date_range, get_iso_datetime_format, get_compact_datime_format
+from src.utils.common_utils import get_date_range, get_iso_datetime_format, get_compact_datime_format, \
+    parse_iso_datetime, get_locations
+from src.utils.async_http import AsyncHttpClient
+from src.utils.response_cache import ResponseCache
+from src.utils.stages import Stage, StagePipeline
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Awaitable, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar, Union
 import logging
 
+CATALOG_URL = "https://sh.dataspace.copernicus.eu/api/v1/catalog/1.0.0/search"
+PROCESS_URL = "https://sh.dataspace.copernicus.eu/api/v1/process"
+TOKEN_URL = "https://identity.dataspace.copernicus.eu/auth/realms/CDSE/protocol/openid-connect/token"
+CATALOG_PAGE_LIMIT = 100
+
+T = TypeVar('T')
+
 
 class SentinelHubAuthenticator:
     def __init__(self, credentials: dict, token_path: Path, logger):
@@ -28,8 +59,10 @@ class SentinelHubAuthenticator:
         self.token = None
 
     def save_token(self, token: dict):
-        with open(self.token_path, 'w') as f:
+        tmp_path = self.token_path.with_name(f'{self.token_path.name}.{os.getpid()}.tmp')
+        with open(tmp_path, 'w') as f:
             json.dump(token, f)
+        os.replace(tmp_path, self.token_path)
 
     def load_token(self) -> dict:
         """ Loads existing SentinelHub API token.
@@ -52,6 +85,21 @@ class SentinelHubAuthenticator:
         client = BackendApplicationClient(client_id=self.client_id)
         return OAuth2Session(client=client)
 
+    def fetch_token(self) -> dict:
+        """ Requests a new token from SentinelHub and stores it to file.
+
+        :return: token
+        """
+        try:
+            self.logger.info('Fetching new token.')
+            self.token = self.oauth.fetch_token(token_url=TOKEN_URL, client_secret=self.client_secret,
+                                                include_client_id=True)
+            self.save_token(self.token)
+        except Exception as e:
+            self.logger.error(f'Failed to fetch token: {e}')
+            raise
+        return self.token
+
     def authenticate(self):
         """ Handles OAuth2 authentication with SentinelHub. Reuses a stored token if valid, otherwise requests a new one.
         """
@@ -60,101 +108,294 @@ class SentinelHubAuthenticator:
             self.token = self.load_token()
 
         if not self.token or self.expired_token_check():
-            try:
-                self.logger.info('Fetching new token.')
-                self.token = self.oauth.fetch_token(
-                    token_url='https://identity.dataspace.copernicus.eu/auth/realms/CDSE/protocol/openid-connect/token',
-                    client_secret=self.client_secret, include_client_id=True)
-
-                self.save_token(self.token)
-            except Exception as e:
-                self.logger.error(f'Failed to fetch token: {e}')
-                raise
+            self.fetch_token()
         else:
             self.logger.info('Using existing token from file.')
         return self.token, self.oauth
 
 
+class SentinelHubTokenProvider:
+    """ Keeps SentinelHub token in memory and shares it between threads.
+
+    Token is refreshed refresh_margin before it expires, either by background thread (see start) or by the first
+    caller which notices it. Refresh is done under a lock, so only one token request is in flight at a time.
+    """
+    def __init__(self, authenticator: SentinelHubAuthenticator, logger,
+                 refresh_margin: timedelta = timedelta(minutes=5), retry_interval: float = 10):
+        self.authenticator = authenticator
+        self.logger = logger
+        self.refresh_margin = refresh_margin
+        self.retry_interval = retry_interval
+        self.oauth = authenticator.oauth
+        self._token = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _refresh_at(self, token: dict) -> float:
+        return token['expires_at'] - self.refresh_margin.total_seconds()
+
+    def get_token(self) -> dict:
+        """ Returns valid token, refreshes it first when it is about to expire.
+
+        :return: token
+        """
+        token = self._token
+        if token is not None and self._refresh_at(token) > time.time():
+            return token
+
+        with self._lock:
+            if self._token is None:
+                self._token, self.oauth = self.authenticator.authenticate()
+            if self._refresh_at(self._token) <= time.time():
+                self._token = self.authenticator.fetch_token()
+            return self._token
+
+    @property
+    def access_token(self) -> str:
+        return self.get_token()['access_token']
+
+    def start(self):
+        """ Starts background thread which refreshes token before it expires.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._refresh_loop, name='sentinelhub-token-refresh', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _refresh_loop(self):
+        while True:
+            try:
+                delay = self._refresh_at(self.get_token()) - time.time()
+            except Exception as e:
+                self.logger.error(f'Background token refresh failed: {e}')
+                delay = self.retry_interval
+            if self._stop.wait(max(delay, 1)):
+                return
+
+
 class SentinelImageExtractor:
-    def __init__(self, cfg: dict, oauth: OAuth2Session, token: dict, logger):
+    def __init__(self, cfg: dict, oauth: OAuth2Session, token: Union[dict, SentinelHubTokenProvider], logger,
+                 cache: Optional[ResponseCache] = None, scheduler: Optional[SentinelHubScheduler] = None):
         self.cfg = cfg
         self.bbox = self._coords_to_bbox()
         self.token = token
         self.oauth = oauth
         self.logger = logger
+        self.cache = cache
+        self.scheduler = scheduler
+        self.profile = OutputProfile.from_config(cfg.get('output_profile'))
+        self.stats = OutputStats(self.profile.name)
 
     def _coords_to_bbox(self):
         coords = self.cfg['location']['coordinates']
         return [coords['min_lon'], coords['min_lat'], coords['max_lon'], coords['max_lat']]
 
-    def get_available_dates(self, iso_start_datetime: str, iso_end_datetime: str):
-        """ Queries SentinelHub Catalog API for available image timestamps within a given image_datetime range and bounding box.
+    def _access_token(self) -> str:
+        if isinstance(self.token, SentinelHubTokenProvider):
+            return self.token.access_token
+        return self.token['access_token']
 
-        :param iso_start_datetime: start datetime in ISO format
-        :param iso_end_datetime: end datetime in ISO format
+    def _send(self, send: Callable[[], requests.Response]) -> requests.Response:
+        if self.scheduler is None:
+            return send()
+        return self.scheduler.request(send)
+
+    async def _send_async(self, send: Callable[[], Awaitable[T]]) -> T:
+        if self.scheduler is None:
+            return await send()
+        return await self.scheduler.request_async(send)
+
+    def _fetch_json(self, url: str, body: dict, iso_end_datetime: str, fetch: Callable[[], Any]) -> Any:
+        """ Returns JSON response of POST request, served from (and stored to) cache when cache is set.
         """
-        headers = {
-            "Authorization": f"Bearer {self.token['access_token']}",
+        if self.cache is None:
+            return fetch()
+        return self.cache.get_or_fetch('POST', url, body, iso_end_datetime, fetch)
+
+    async def _fetch_json_async(self, url: str, body: dict, iso_end_datetime: str,
+                                fetch: Callable[[], Awaitable[Any]]) -> Any:
+        if self.cache is None:
+            return await fetch()
+        return await self.cache.get_or_fetch_async('POST', url, body, iso_end_datetime, fetch)
+
+    def _catalog_headers(self) -> dict:
+        return {
+            "Authorization": f"Bearer {self._access_token()}",
             "Content-Type": "application/json"
         }
 
-        all_dates = []
-
-        data = {
+    def _catalog_request(self, iso_start_datetime: str, iso_end_datetime: str, cloud_filter: bool = True) -> dict:
+        request = {
             "bbox": self.bbox,
             "datetime": f"{iso_start_datetime}/{iso_end_datetime}",
             "collections": [self.cfg['sentinel_type']],
-            "limit": 5,
+            "limit": CATALOG_PAGE_LIMIT,
+            "fields": CATALOG_FIELDS,
         }
+        max_cloud_cover = self.cfg.get('max_cloud_cover')
+        if cloud_filter and max_cloud_cover is not None:
+            request.update(cloud_cover_filter(max_cloud_cover))
+        return request
 
+    def _collapse_acquisitions(self, features: List[dict]) -> List[str]:
+        dates = collapse_acquisitions(feature_acquisition(feat) for feat in features)
+        self.logger.info(f'Available dates: {len(dates)} (catalog features: {len(features)})')
+        return dates
+
+    def _log_catalog_request(self, iso_start_datetime: str, iso_end_datetime: str):
         self.logger.info(f'Extracting available dates for ...')
         self.logger.info(f"Location - {self.cfg['location']['name']}")
         self.logger.info(f"Date - {iso_start_datetime} - {iso_end_datetime}")
-        url = "https://sh.dataspace.copernicus.eu/api/v1/catalog/1.0.0/search"
+
+    @staticmethod
+    def _add_catalog_page(data: dict, response_data: dict, all_features: List[dict]) -> bool:
+        """ Adds features of Catalog API response page to all_features and sets token of next page to request data.
+
+        :return: False when there is no next page
+        """
+        features = response_data.get('features', [])
+        if not features:
+            return False
+
+        all_features.extend(features)
+
+        next_page = response_data.get("context", {}).get("next")
+        if next_page is None:
+            return False
+
+        data['next'] = next_page
+        return True
+
+    def search_catalog(self, iso_start_datetime: str, iso_end_datetime: str, cloud_filter: bool = True) -> List[dict]:
+        """ Queries SentinelHub Catalog API for features within a given datetime range and bounding box.
+
+        :param iso_start_datetime: start datetime in ISO format
+        :param iso_end_datetime: end datetime in ISO format
+        :param cloud_filter: apply cfg['max_cloud_cover'] on API side
+        :return: catalog features
+        """
+        all_features = []
+
+        data = self._catalog_request(iso_start_datetime, iso_end_datetime, cloud_filter)
+
+        self._log_catalog_request(iso_start_datetime, iso_end_datetime)
+
+        def fetch():
+            response = self._send(lambda: requests.post(CATALOG_URL, json=data, headers=self._catalog_headers()))
+            response.raise_for_status()
+            return response.json()
 
         while True:
             try:
-                response = requests.post(url, json=data, headers=headers)
-                response.raise_for_status()
-                response_data = response.json()
+                response_data = self._fetch_json(CATALOG_URL, data, iso_end_datetime, fetch)
+            except requests.exceptions.RequestException as e:
+                self.logger.error(f'API request failed: {e}')
+                raise
 
-                features = response_data.get('features', [])
+            if not self._add_catalog_page(data, response_data, all_features):
+                break
 
-                if not features:
-                    break
+        return all_features
 
-                all_dates.extend([feat['properties']['datetime'] for feat in features])
+    def get_available_dates(self, iso_start_datetime: str, iso_end_datetime: str):
+        """ Queries SentinelHub Catalog API for available image timestamps within a given image_datetime range and bounding box.
+        Scenes over cfg['max_cloud_cover'] are filtered out by the API, remaining ones are collapsed per day and orbit.
 
-                next_page = response_data.get("context", {}).get("next")
+        :param iso_start_datetime: start datetime in ISO format
+        :param iso_end_datetime: end datetime in ISO format
+        """
+        return self._collapse_acquisitions(self.search_catalog(iso_start_datetime, iso_end_datetime))
 
-                if next_page is None:
-                    break
+    async def get_available_dates_async(self, client: AsyncHttpClient, iso_start_datetime: str,
+                                        iso_end_datetime: str):
+        """ Async variant of get_available_dates.
 
-                data['next'] = next_page
+        :param client: shared async HTTP client
+        :param iso_start_datetime: start datetime in ISO format
+        :param iso_end_datetime: end datetime in ISO format
+        """
+        data = self._catalog_request(iso_start_datetime, iso_end_datetime)
+        self._log_catalog_request(iso_start_datetime, iso_end_datetime)
 
-            except requests.exceptions.RequestException as e:
+        async def fetch():
+            return await self._send_async(
+                lambda: client.post_json(CATALOG_URL, json=data, headers=self._catalog_headers()))
+
+        all_features = []
+        while True:
+            try:
+                response_data = await self._fetch_json_async(CATALOG_URL, data, iso_end_datetime, fetch)
+            except aiohttp.ClientError as e:
                 self.logger.error(f'API request failed: {e}')
                 raise
 
-        self.logger.info(f'Available dates: {len(all_dates)}')
-        return all_dates
+            if not self._add_catalog_page(data, response_data, all_features):
+                break
 
-    def download_sentinel_image(self, iso_datetime: str) -> bytes:
-        """ Fetches a satellite image for a specific datetime using SentinelHub Process API.
+        return self._collapse_acquisitions(all_features)
 
-        :param iso_datetime: target datetime in ISO format
-        :return: Image data in TIFF format
+    def get_statistics(self, iso_start_datetime: str, iso_end_datetime: str, index: str = 'ndvi',
+                       resolution: float = 10, mask_clouds: bool = True) -> List[dict]:
+        """ Queries SentinelHub Statistical API for daily statistics of index over the bounding box. Whole time range
+        is covered by a single request, no imagery is downloaded.
+
+        :param iso_start_datetime: start datetime in ISO format
+        :param iso_end_datetime: end datetime in ISO format
+        :param index: index name (ndvi, ndwi)
+        :param resolution: resolution in meters per pixel
+        :param mask_clouds: exclude cloudy pixels (by scene classification)
+        :return: one row of statistics per day with valid pixels
         """
-        headers = {
-            "Authorization": f"Bearer {self.token['access_token']}",
+        request = statistical_request(self.bbox, self.cfg['sentinel_type'], iso_start_datetime, iso_end_datetime,
+                                      index, resolution, mask_clouds)
+
+        self.logger.info(f'Extracting {index} statistics for ...')
+        self.logger.info(f"Location - {self.cfg['location']['name']}")
+        self.logger.info(f"Date - {iso_start_datetime} - {iso_end_datetime}")
+
+        def fetch():
+            response = self._send(lambda: requests.post(STATISTICS_URL, json=request, headers=self._catalog_headers()))
+            response.raise_for_status()
+            return response.json()
+
+        try:
+            response_data = self._fetch_json(STATISTICS_URL, request, iso_end_datetime, fetch)
+        except requests.exceptions.RequestException as e:
+            self.logger.error(f'Statistical API request failed: {e}')
+            raise
+
+        rows = parse_statistics(response_data, index)
+        self.logger.info(f'Days with {index} statistics: {len(rows)}')
+        return rows
+
+    def _process_headers(self) -> dict:
+        return {
+            "Authorization": f"Bearer {self._access_token()}",
             "Accept": "image/tiff"
         }
 
-        request = {
+    def _process_request(self, iso_datetime: str, bbox: Optional[List[float]] = None, width: int = 512,
+                         height: int = 512, iso_end_datetime: Optional[str] = None) -> dict:
+        return {
             "input": {
                 "bounds": {
                     "properties": {"crs": "http://www.opengis.net/def/crs/OGC/1.3/CRS84"},
-                    "bbox": self.bbox,
+                    "bbox": bbox or self.bbox,
                 },
                 "data": [
                     {
@@ -162,45 +403,188 @@ class SentinelImageExtractor:
                         "dataFilter": {
                             "timeRange": {
                                 "from": iso_datetime,
-                                "to": iso_datetime
+                                "to": iso_end_datetime or iso_datetime
                             }
                         },
                     }
                 ],
             },
             "output": {
-                "width": 512,
-                "height": 512,
+                "width": width,
+                "height": height,
             },
-            "evalscript": self._default_evalscript()
+            "evalscript": self.profile.evalscript()
         }
 
+    def _log_process_request(self, iso_datetime: str):
         self.logger.info(f"Extracting {self.cfg['sentinel_type']} images for ...")
         self.logger.info(f"Location - {self.cfg['location']['name']}")
         self.logger.info(f"Date - {iso_datetime}")
-        url = "https://sh.dataspace.copernicus.eu/api/v1/process"
+
+    def download_sentinel_image(self, iso_datetime: str) -> bytes:
+        """ Fetches a satellite image for a specific datetime using SentinelHub Process API.
+
+        :param iso_datetime: target datetime in ISO format
+        :return: Image data in TIFF format
+        """
+        request = self._process_request(iso_datetime)
+
+        self._log_process_request(iso_datetime)
         try:
-            response = self.oauth.post(url, json=request, headers=headers)
+            response = self._send(lambda: self.oauth.post(PROCESS_URL, json=request, headers=self._process_headers()))
             response.raise_for_status()
+            self.stats.add_download(len(response.content), response.headers)
             return response.content
         except requests.exceptions.RequestException as e:
             self.logger.error(f'Failed to get sentinel images: {e}')
             raise
 
-    def _default_evalscript(self):
-        return """
-        //VERSION=3
-        function setup() {
-          return {
-            input: ["B02", "B03", "B04", "B08"],
-            output: { bands: 4 },
-          }
-        }
+    @contextmanager
+    def stream_sentinel_image(self, iso_datetime: str) -> Iterator[BinaryIO]:
+        """ Streams a satellite image for a specific datetime using SentinelHub Process API.
+        Response body is not buffered, it is read from the connection by the consumer.
 
-        function evaluatePixel(sample) {
-          return [sample.B04, sample.B03, sample.B02, sample.B08]
-        }
+        :param iso_datetime: target datetime in ISO format
+        :return: file-like response body (TIFF)
+        """
+        request = self._process_request(iso_datetime)
+
+        self._log_process_request(iso_datetime)
+        try:
+            response = self._send(
+                lambda: self.oauth.post(PROCESS_URL, json=request, headers=self._process_headers(), stream=True))
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            self.logger.error(f'Failed to get sentinel images: {e}')
+            raise
+
+        response.raw.decode_content = True
+        stream = CountingReader(response.raw)
+        try:
+            yield stream
+        finally:
+            self.stats.add_download(stream.bytes_read, response.headers)
+            response.close()
+
+    def download_sentinel_images(self, iso_datetimes: List[str]) -> Dict[str, bytes]:
+        """ Fetches images of several acquisitions in one Process API request. Evalscript with ORBIT mosaicking
+        returns band stack of all acquisitions in time range together with their dates (multipart TAR response),
+        the stack is split into per-acquisition TIFFs locally. Only raw bands products are supported. All scenes in
+        time range are processed, so dates should follow each other in catalog (see SentinelDataPipeline._group_dates).
+
+        :param iso_datetimes: acquisition datetimes in ISO format
+        :return: image (TIFF, compressed by output profile) per requested datetime, acquisitions which were not
+            returned by API are missing
+        """
+        if self.profile.product != 'bands':
+            raise ValueError(f'Multi-date requests support only bands product, not {self.profile.product}')
+
+        ordered = sorted(iso_datetimes, key=parse_iso_datetime)
+        request = self._process_request(ordered[0], iso_end_datetime=ordered[-1])
+        max_cloud_cover = self.cfg.get('max_cloud_cover')
+        if max_cloud_cover is not None:
+            # scenes dropped by catalog cloud filter are not processed (and billed) either
+            request['input']['data'][0]['dataFilter']['maxCloudCoverage'] = max_cloud_cover
+        request['evalscript'] = multitemporal_evalscript(self.profile.bands, self.profile.sample_type,
+                                                         self.profile.scale)
+        request['output']['responses'] = multitemporal_responses()
+
+        self._log_process_request(f'{ordered[0]} - {ordered[-1]} ({len(ordered)} acquisitions)')
+        try:
+            response = self._send(lambda: self.oauth.post(
+                PROCESS_URL, json=request, headers={**self._process_headers(), "Accept": "application/tar"}))
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            self.logger.error(f'Failed to get sentinel images: {e}')
+            raise
+        self.stats.add_download(len(response.content), response.headers)
+
+        # acquisitions are matched by day, catalog may list several datetimes (granules) of one orbit
+        by_day = {}
+        for iso_datetime in ordered:
+            by_day.setdefault(parse_iso_datetime(iso_datetime).date(), iso_datetime)
+
+        images = {}
+        for scene_date, data, extratags in split_multitemporal(response.content, len(self.profile.bands)):
+            iso_datetime = by_day.get(parse_iso_datetime(scene_date).date())
+            if iso_datetime is None or iso_datetime in images:
+                continue
+            images[iso_datetime] = write_geotiff(data, extratags, self.profile.tiff_compression)
+
+        missing = [iso_datetime for iso_datetime in ordered if iso_datetime not in images]
+        if missing:
+            self.logger.warning(f'Acquisitions missing in multi-date response: {missing}')
+        return images
+
+    def _download_tile(self, iso_datetime: str, tile: Tile, path: Path):
+        request = self._process_request(iso_datetime, tile.bbox, tile.width, tile.height)
+        try:
+            response = self._send(lambda: self.oauth.post(PROCESS_URL, json=request, headers=self._process_headers()))
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            self.logger.error(f'Failed to get tile {tile.row}/{tile.col}: {e}')
+            raise
+        self.stats.add_download(len(response.content), response.headers)
+        path.write_bytes(response.content)
+
+    @contextmanager
+    def mosaic_sentinel_image(self, iso_datetime: str, resolution: float, tile_size: int = 1024,
+                              max_workers: int = 4) -> Iterator[BinaryIO]:
+        """ Fetches a satellite image at target resolution as tiles (in parallel) and mosaics them into one GeoTIFF.
+        Tiles and mosaic are kept in temporary files, so memory use does not grow with size of the area.
+
+        :param iso_datetime: target datetime in ISO format
+        :param resolution: target resolution in meters per pixel
+        :param tile_size: max tile width and height in pixels
+        :param max_workers: max number of tiles downloaded at once
+        :return: mosaic file opened for reading (GeoTIFF)
         """
+        grid = plan_tiles(self.bbox, resolution, tile_size)
+
+        self._log_process_request(iso_datetime)
+        self.logger.info(f'Tiles - {grid.n_rows} x {grid.n_cols} ({grid.width} x {grid.height} px)')
+
+        with TemporaryDirectory() as tmp_dir:
+            tmp_dir = Path(tmp_dir)
+
+            def tile_path(tile: Tile) -> Path:
+                return tmp_dir / f'{tile.row}_{tile.col}.tiff'
+
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(grid))) as executor:
+                futures = [executor.submit(self._download_tile, iso_datetime, tile, tile_path(tile))
+                           for tile in grid.tiles()]
+                try:
+                    for future in as_completed(futures):
+                        future.result()
+                except Exception:
+                    for future in futures:
+                        future.cancel()
+                    raise
+
+            mosaic_path = tmp_dir / 'mosaic.tiff'
+            write_mosaic(grid, tile_path, mosaic_path, self.profile.tiff_compression)
+            with open(mosaic_path, 'rb') as f:
+                yield f
+
+    async def download_sentinel_image_async(self, client: AsyncHttpClient, iso_datetime: str) -> bytes:
+        """ Async variant of download_sentinel_image.
+
+        :param client: shared async HTTP client
+        :param iso_datetime: target datetime in ISO format
+        :return: Image data in TIFF format
+        """
+        request = self._process_request(iso_datetime)
+
+        self._log_process_request(iso_datetime)
+        try:
+            response = await self._send_async(
+                lambda: client.request_with_headers('POST', PROCESS_URL, json=request,
+                                                    headers=self._process_headers()))
+        except aiohttp.ClientError as e:
+            self.logger.error(f'Failed to get sentinel images: {e}')
+            raise
+        self.stats.add_download(len(response.body), response.headers)
+        return response.body
 
 
 class SentinelDataPipeline:
@@ -210,53 +594,493 @@ class SentinelDataPipeline:
         self.secrets_path = Path(__file__).resolve().parents[2] / '.secrets'
         self.token_path = self.secrets_path / 'sentinelhub_token.json'
         self.cred_mgr = CredentialManager(self.secrets_path)
+        self.bucket_name = 'satellite-images'
+        self.locations = get_locations(cfg)
+        self.cache = ResponseCache.from_config(cfg.get('http_cache'), self.logger)
+        self.outbox = Outbox.from_config(cfg.get('outbox'), self.logger)
+        self.scheduler = SentinelHubScheduler.from_config(cfg.get('rate_limit'), self.logger)
+        self.stage_stats: Dict[str, dict] = {}
+        if cfg.get('multi_date') and (cfg.get('tiling') or cfg.get('stream_images', False) or
+                                      OutputProfile.from_config(cfg.get('output_profile')).product != 'bands'):
+            self.logger.warning('Multi-date requests are used only for untiled and not streamed bands products, '
+                                'images are downloaded one by one.')
 
-    def run(self, n_days: int = 1):
-        """ Executes the full extraction process for the last n_days:
+    def _create_services(self, oauth: OAuth2Session,
+                         token: Union[dict, SentinelHubTokenProvider]) -> List[SentinelImageExtractor]:
+        """ Creates one image extractor per location. All extractors share the same token (provider), OAuth session
+        and request scheduler.
+        """
+        return [
+            SentinelImageExtractor({**self.cfg, 'location': location}, oauth, token, self.logger, self.cache,
+                                   self.scheduler)
+            for location in self.locations
+        ]
 
-        Authenticates with SentinelHub
-        Gets available images
-        Downloads and saves each image to MinIO
-        Logs metadata to PostgreSQL
+    def _log_cache_stats(self):
+        if self.cache is not None:
+            self.logger.info(f'Response cache | {self.cache.stats()}')
+
+    def _log_scheduler_stats(self):
+        self.logger.info(f'SentinelHub requests | {self.scheduler.stats()}')
+
+    def _log_output_stats(self, services: List[SentinelImageExtractor]):
+        for profile, stats in OutputStats.merge(service.stats for service in services).items():
+            self.logger.info(f'Output profile {profile} | {stats.as_dict()}')
+
+    def _get_available_dates(self, service: SentinelImageExtractor, pg_creds: dict, start_date: datetime,
+                             end_date: datetime) -> List[str]:
+        """ Returns available image datetimes. With cfg['catalog_index'] (True or {'settle_hours': N}) the dates are
+        served from local catalog index, which queries Catalog API only for not yet synced time ranges.
+        """
+        index_cfg = self.cfg.get('catalog_index', False)
+        if index_cfg:
+            settle_hours = index_cfg.get('settle_hours') if isinstance(index_cfg, dict) else None
+            index = CatalogIndex(
+                get_engine(pg_creds, 'satellite_image_processing', self.cfg.get('pg_pool_size', 5)),
+                self.cfg['sentinel_type'],
+                service.cfg['location']['coordinates'],
+                self.logger,
+                DEFAULT_SETTLE_TIME if settle_hours is None else timedelta(hours=settle_hours)
+            )
+            return index.sync(service, start_date, end_date, self.cfg.get('max_cloud_cover'))
+
+        return service.get_available_dates(get_iso_datetime_format(start_date), get_iso_datetime_format(end_date))
+
+    async def _get_available_dates_async(self, client: AsyncHttpClient, service: SentinelImageExtractor,
+                                         pg_creds: dict, start_date: datetime, end_date: datetime) -> List[str]:
+        if self.cfg.get('catalog_index', False):
+            return await asyncio.to_thread(self._get_available_dates, service, pg_creds, start_date, end_date)
+
+        return await service.get_available_dates_async(
+            client, get_iso_datetime_format(start_date), get_iso_datetime_format(end_date))
+
+    def _skip_ingested(self, postgre_saver: PostgreSaver, service: SentinelImageExtractor,
+                       dates: List[str]) -> List[str]:
+        """ Removes dates whose image metadata is already stored, so that they are not downloaded again.
+        Ingested dates are loaded in one query for the whole window.
+
+        :param postgre_saver: PostgreSQL saver
+        :param service: image extractor of the location
+        :param dates: available image datetimes in ISO format
+        :return: dates which are not ingested yet
+        """
+        if not dates:
+            return dates
+
+        parsed_dates = [parse_iso_datetime(date) for date in dates]
+        try:
+            ingested = postgre_saver.get_ingested_image_dates(
+                'satellite_image_processing',
+                service.cfg['location']['coordinates'],
+                min(parsed_dates),
+                max(parsed_dates),
+                service.profile.product
+            )
+        except SQLAlchemyError as e:
+            self.logger.warning(f'Failed to load ingested images, downloading all: {e}')
+            return dates
+
+        new_dates = [date for date, parsed in zip(dates, parsed_dates) if parsed not in ingested]
+        self.logger.info(f"Skipping already ingested images for {service.cfg['location']['name']}: "
+                         f"{len(dates) - len(new_dates)}")
+        return new_dates
+
+    def _upload(self, storage: MinioStorage, file_name: str, image: bytes):
+        if not storage.upload(self.bucket_name, file_name, image, 'image/tiff'):
+            raise RuntimeError(f'Upload of {self.bucket_name}/{file_name} failed')
+        self.logger.info(f'Saved image to {self.bucket_name}/{file_name}')
+
+    def _upload_stream(self, storage: MinioStorage, file_name: str, stream: BinaryIO):
+        if not storage.upload_stream(self.bucket_name, file_name, stream, 'image/tiff'):
+            raise RuntimeError(f'Upload of {self.bucket_name}/{file_name} failed')
+        self.logger.info(f'Saved image to {self.bucket_name}/{file_name}')
+
+    def _download_and_save(self, service: SentinelImageExtractor, storage: MinioStorage, date: str) -> str:
+        """ Downloads image for given datetime and uploads it to MinIO. With cfg['tiling'] the image is fetched
+        as tiles at target resolution and mosaicked on disk. With cfg['stream_images'] the response body
+        is piped directly into multipart upload instead of being buffered in memory (output profile compression
+        is not applied in this mode).
+
+        :param service: image extractor
+        :param storage: MinIO storage
+        :param date: image datetime in ISO format
+        :return: name of saved object
+        """
+        file_name = self._get_file_name(service, date)
+        tiling = self.cfg.get('tiling')
+        if tiling:
+            with service.mosaic_sentinel_image(date, **tiling) as mosaic:
+                self._upload_stream(storage, file_name, mosaic)
+                service.stats.add_stored(os.fstat(mosaic.fileno()).st_size)
+        elif self.cfg.get('stream_images', False):
+            with service.stream_sentinel_image(date) as stream:
+                self._upload_stream(storage, file_name, stream)
+                service.stats.add_stored(stream.bytes_read)
+        else:
+            image = service.profile.compress(service.download_sentinel_image(date))
+            self._upload(storage, file_name, image)
+            service.stats.add_stored(len(image))
+        return file_name
+
+    def _group_dates(self, service: SentinelImageExtractor, dates: List[str],
+                     available_dates: Optional[List[str]] = None) -> List[List[str]]:
+        """ Groups dates downloaded by one request. With cfg['multi_date'] = {'max_dates': N, 'max_span_days': D}
+        up to N acquisitions within D days are fetched at once, otherwise (and for tiled, streamed or index products)
+        every date on its own. Multi-date request returns every scene in its time range, so only dates which directly
+        follow each other in available_dates (no acquisition in between was already ingested) are grouped.
+
+        :param service: image extractor
+        :param dates: dates to download
+        :param available_dates: all available dates of the location, dates by default
+        :return: groups of dates
+        """
+        multi_date = self.cfg.get('multi_date')
+        if not multi_date or self.cfg.get('tiling') or self.cfg.get('stream_images', False) \
+                or service.profile.product != 'bands':
+            return [[date] for date in dates]
+
+        max_dates = multi_date.get('max_dates', 10)
+        max_span = timedelta(days=multi_date.get('max_span_days', 10))
+        positions = {date: i for i, date in enumerate(sorted(available_dates or dates, key=parse_iso_datetime))}
+        groups = []
+        for date in sorted(dates, key=parse_iso_datetime):
+            group = groups[-1] if groups else None
+            if group is not None and len(group) < max_dates and positions[date] == positions[group[-1]] + 1 \
+                    and parse_iso_datetime(date) - parse_iso_datetime(group[0]) <= max_span:
+                group.append(date)
+            else:
+                groups.append([date])
+        return groups
+
+    def _download_images(self, service: SentinelImageExtractor, storage: MinioStorage,
+                         dates: List[str]) -> List[Tuple[SentinelImageExtractor, str, str, Optional[bytes]]]:
+        """ Download stage: fetches images of given dates (in one request if there are more of them).
+        Buffered images are compressed and passed to upload stage, tiled and streamed images are uploaded
+        right away, as they are never held in memory. Failed dates are logged and left out, so that metadata of
+        the other ones are still saved.
+
+        :param service: image extractor
+        :param storage: MinIO storage
+        :param dates: image datetimes in ISO format
+        :return: list of (service, date, name of object, image or None when already uploaded)
+        """
+        if self.cfg.get('tiling') or self.cfg.get('stream_images', False):
+            saved = []
+            for date in dates:
+                try:
+                    saved.append((service, date, self._download_and_save(service, storage, date), None))
+                except Exception as e:
+                    self.logger.error(f"Failed to process and save image for {service.cfg['location']['name']} "
+                                      f"image_datetime {date}: {e}")
+            return saved
+
+        try:
+            if len(dates) > 1:
+                images = service.download_sentinel_images(dates)
+            else:
+                images = {dates[0]: service.profile.compress(service.download_sentinel_image(dates[0]))}
+        except Exception as e:
+            self.logger.error(f"Failed to process and save image for {service.cfg['location']['name']} "
+                              f"image_datetime {', '.join(dates)}: {e}")
+            return []
+
+        return [(service, date, self._get_file_name(service, date), image) for date, image in images.items()]
+
+    def _upload_image(self, storage: MinioStorage, service: SentinelImageExtractor, date: str, file_name: str,
+                      image: Optional[bytes]) -> List[Tuple[SentinelImageExtractor, str, str]]:
+        """ Upload stage: stores downloaded image to MinIO.
+        """
+        if image is not None:
+            try:
+                self._upload(storage, file_name, image)
+            except Exception as e:
+                self.logger.error(f"Failed to process and save image for {service.cfg['location']['name']} "
+                                  f"image_datetime {date}: {e}")
+                return []
+            service.stats.add_stored(len(image))
+        return [(service, date, file_name)]
+
+    def _save_metadata(self, postgre_saver: PostgreSaver, images: List[Tuple[SentinelImageExtractor, str, str]]):
+        """ Metadata stage: writes metadata of a batch of stored images in one transaction.
+        """
+        self._save_metadata_rows(
+            postgre_saver, [self._create_metadata(service, date, file_name) for service, date, file_name in images])
+
+    def _save_metadata_rows(self, postgre_saver: PostgreSaver, rows: List[dict]):
+        """ Appends rows to outbox (flushed to PostgreSQL by OutboxFlusher) or, without outbox, writes them directly.
+        """
+        if self.outbox is not None:
+            self.outbox.append(SatelliteImageMetadata, rows)
+            return
+
+        try:
+            postgre_saver.bulk_save('satellite_image_processing', SatelliteImageMetadata, rows)
+        except SQLAlchemyError as e:
+            self.logger.error(f'Failed to save metadata of {len(rows)} images: {e}')
+
+    async def _download_and_save_async(self, client: AsyncHttpClient, service: SentinelImageExtractor,
+                                       storage: MinioStorage, date: str) -> str:
+        """ Async variant of _download_and_save. Tiled and streamed images are processed by sync path in thread,
+        so that they are not buffered in memory.
+        """
+        if self.cfg.get('tiling') or self.cfg.get('stream_images', False):
+            return await asyncio.to_thread(self._download_and_save, service, storage, date)
+
+        image = await service.download_sentinel_image_async(client, date)
+        image = await asyncio.to_thread(service.profile.compress, image)
+        file_name = self._get_file_name(service, date)
+        await asyncio.to_thread(self._upload, storage, file_name, image)
+        service.stats.add_stored(len(image))
+        return file_name
+
+    @staticmethod
+    def _get_file_name(service: SentinelImageExtractor, date: str) -> str:
+        """ Returns object name of image. Products other than raw bands are suffixed with product name,
+        so that all products of the same acquisition can be stored side by side.
+        """
+        name = f"{get_compact_datime_format(date)}_{service.cfg['location']['name']}"
+        if service.profile.product != 'bands':
+            name = f'{name}_{service.profile.product}'
+        return f'{name}.tiff'
+
+    def _create_metadata(self, service: SentinelImageExtractor, date: str, file_name: str) -> dict:
+        location = service.cfg['location']
+        return {
+            'satellite_type': self.cfg['sentinel_type'],
+            'location_name': location['name'],
+            'image_date': parse_iso_datetime(date),
+            'min_lat': location['coordinates']['min_lat'],
+            'min_lon': location['coordinates']['min_lon'],
+            'max_lat': location['coordinates']['max_lat'],
+            'max_lon': location['coordinates']['max_lon'],
+            'image_path': file_name,
+            'product': service.profile.product,
+            'bands': ','.join(service.profile.bands) if service.profile.product == 'bands' else None
+        }
+
+    def _create_stats_rows(self, service: SentinelImageExtractor, index: str, stats: List[dict]) -> List[dict]:
+        location = service.cfg['location']
+        return [
+            {
+                'satellite_type': self.cfg['sentinel_type'],
+                'location_name': location['name'],
+                'min_lat': location['coordinates']['min_lat'],
+                'min_lon': location['coordinates']['min_lon'],
+                'max_lat': location['coordinates']['max_lat'],
+                'max_lon': location['coordinates']['max_lon'],
+                'index_name': index,
+                **row
+            }
+            for row in stats
+        ]
+
+    def run_statistics(self, n_days: int = 1, max_workers: Optional[int] = None):
+        """ Alternative to run which extracts daily index statistics (Statistical API) instead of images:
+        one request per location for the whole time range, all rows are written to satellite_index_stats at once.
+        Options are taken from cfg['statistics'] (index, resolution, mask_clouds).
 
         :param n_days: number of days to look back from today
+        :param max_workers: number of worker threads, defaults to cfg['max_workers'] or max concurrency of request
+            scheduler
         """
+        if max_workers is None:
+            max_workers = self.cfg.get('max_workers', self.scheduler.max_concurrency)
+        stats_cfg = self.cfg.get('statistics', {})
+        index = stats_cfg.get('index', 'ndvi')
 
         sentinel_creds = self.cred_mgr.get_sentinelhub_credentials()
         auth = SentinelHubAuthenticator(sentinel_creds, self.token_path, self.logger)
-        token, oauth = auth.authenticate()
+        token_provider = SentinelHubTokenProvider(auth, self.logger)
+        token_provider.get_token()
 
-        service = SentinelImageExtractor(self.cfg, oauth, token, self.logger)
-        minio_creds = self.cred_mgr.get_minio_credentials()
+        services = self._create_services(token_provider.oauth, token_provider)
         pg_creds = self.cred_mgr.get_pg_credentials()
 
         start_date, end_date = get_date_range(n_days)
-        iso_start_date = get_iso_datetime_format(start_date)
-        iso_end_date = get_iso_datetime_format(end_date)
+        rows = []
+        with token_provider, ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(service.get_statistics, get_iso_datetime_format(start_date),
+                                get_iso_datetime_format(end_date), **stats_cfg): service
+                for service in services
+            }
+            for future in as_completed(futures):
+                service = futures[future]
+                try:
+                    rows.extend(self._create_stats_rows(service, index, future.result()))
+                except Exception as e:
+                    self.logger.error(f"Failed to get statistics for {service.cfg['location']['name']}: {e}")
 
-        available_dates = service.get_available_dates(iso_start_date, iso_end_date)
-        for date in available_dates:
+        with PostgreSaver(pg_creds, pool_size=self.cfg.get('pg_pool_size', 5)) as postgre_saver:
             try:
-                image = service.download_sentinel_image(date)
-                file_name = f"{get_compact_datime_format(date)}_{self.cfg['location']['name']}.tiff"
-                bucket_name = 'satellite-images'
-                save_to_minio(minio_creds, bucket_name, file_name, image, 'image/tiff', self.logger)
-                self.logger.info(f'Saved image to {bucket_name}/{file_name}')
-
-                # TODO: mechanism to load metadata later (i.e. when PostgreSQL fails)
-                metadata = SatelliteImageMetadata(
-                    satellite_type=self.cfg['sentinel_type'],
-                    location_name=self.cfg['location']['name'],
-                    image_date=date,
-                    min_lat=self.cfg['location']['coordinates']['min_lat'],
-                    min_lon=self.cfg['location']['coordinates']['min_lon'],
-                    max_lat=self.cfg['location']['coordinates']['max_lat'],
-                    max_lon=self.cfg['location']['coordinates']['max_lon'],
-                    image_path=file_name
-                )
-
-                postgre_saver = PostgreSaver(pg_creds)
-                postgre_saver.save('satellite_image_processing', metadata)
+                postgre_saver.bulk_save('satellite_image_processing', SatelliteIndexStats, rows)
+            except SQLAlchemyError as e:
+                self.logger.error(f'Failed to save {len(rows)} {index} statistics rows: {e}')
 
-            except Exception as e:
-                self.logger.error(f'Failed to process and save image for image_datetime {date}: {e}')
+        self._log_cache_stats()
+        self._log_scheduler_stats()
+
+    def _find_dates(self, postgre_saver: PostgreSaver, lock: threading.Lock, pg_creds: dict, start_date: datetime,
+                    end_date: datetime, force: bool,
+                    service: SentinelImageExtractor) -> List[Tuple[SentinelImageExtractor, List[str]]]:
+        """ Catalog stage: returns groups of dates of the location to download.
+        """
+        try:
+            available_dates = self._get_available_dates(service, pg_creds, start_date, end_date)
+            new_dates = available_dates
+            if not force:
+                # saver session is shared by catalog workers
+                with lock:
+                    new_dates = self._skip_ingested(postgre_saver, service, available_dates)
+        except Exception as e:
+            self.logger.error(f"Failed to get available dates for {service.cfg['location']['name']}: {e}")
+            return []
+        return [(service, dates) for dates in self._group_dates(service, new_dates, available_dates)]
+
+    def _create_stages(self, storage: MinioStorage, catalog_saver: PostgreSaver, metadata_saver: PostgreSaver,
+                       pg_creds: dict, start_date: datetime, end_date: datetime, max_workers: int,
+                       force: bool) -> StagePipeline:
+        """ Creates pipeline catalog -> download -> upload -> metadata. Options are taken from cfg['stages']:
+        catalog_workers, upload_workers, queue_size (max items waiting for each stage), metadata_batch_size,
+        flush_interval (seconds after which incomplete metadata batch is written) and log_interval (seconds
+        between stage stats logs). Download stage runs max_workers threads.
+        """
+        stages_cfg = self.cfg.get('stages', {})
+        queue_size = stages_cfg.get('queue_size', 2 * max_workers)
+        lock = threading.Lock()
+        return StagePipeline([
+            Stage('catalog',
+                  lambda service: self._find_dates(catalog_saver, lock, pg_creds, start_date, end_date, force,
+                                                   service),
+                  workers=stages_cfg.get('catalog_workers', 2), queue_size=len(self.locations), logger=self.logger),
+            Stage('download', lambda item: self._download_images(item[0], storage, item[1]),
+                  workers=max_workers, queue_size=queue_size, logger=self.logger),
+            Stage('upload', lambda item: self._upload_image(storage, *item),
+                  workers=stages_cfg.get('upload_workers', 2), queue_size=queue_size, logger=self.logger),
+            Stage('metadata', lambda images: self._save_metadata(metadata_saver, images),
+                  batch_size=stages_cfg.get('metadata_batch_size', 50),
+                  flush_interval=stages_cfg.get('flush_interval', 1.0), queue_size=queue_size, logger=self.logger),
+        ], stages_cfg.get('log_interval'), self.logger)
+
+    def run(self, n_days: int = 1, max_workers: Optional[int] = None, force: bool = False):
+        """ Executes the full extraction process for the last n_days and all configured locations:
+
+        Authenticates with SentinelHub (once for all locations, token is refreshed in background)
+        Gets available images
+        Downloads and saves each image to MinIO (up to max_workers images at once)
+        Logs metadata to PostgreSQL (in batches)
+
+        Steps run as stages connected by bounded queues (see _create_stages), so downloads continue while
+        images are uploaded and metadata written. Stage stats are kept in self.stage_stats.
+        With cfg['outbox'] metadata are first appended to local outbox and flushed to PostgreSQL in background,
+        rows which could not be written are replayed on the next run.
+
+        :param n_days: number of days to look back from today
+        :param max_workers: number of download threads, defaults to cfg['max_workers'] or max concurrency of request
+            scheduler (number of concurrent SentinelHub requests is adapted by scheduler within this bound)
+        :param force: download images even if they are already ingested
+        """
+        if max_workers is None:
+            max_workers = self.cfg.get('max_workers', self.scheduler.max_concurrency)
+
+        sentinel_creds = self.cred_mgr.get_sentinelhub_credentials()
+        auth = SentinelHubAuthenticator(sentinel_creds, self.token_path, self.logger)
+        token_provider = SentinelHubTokenProvider(auth, self.logger)
+        token_provider.get_token()
+
+        services = self._create_services(token_provider.oauth, token_provider)
+        storage = MinioStorage(self.cred_mgr.get_minio_credentials(), self.logger)
+        pg_creds = self.cred_mgr.get_pg_credentials()
+        pool_size = self.cfg.get('pg_pool_size', 5)
+
+        start_date, end_date = get_date_range(n_days)
+        with token_provider, \
+                PostgreSaver(pg_creds, pool_size=pool_size) as catalog_saver, \
+                PostgreSaver(pg_creds, pool_size=pool_size) as metadata_saver, \
+                ExitStack() as stack:
+            if self.outbox is not None:
+                # outbox is closed after the final flush
+                stack.enter_context(self.outbox)
+                # flushes rows left by previous runs before new ones are checked
+                stack.enter_context(OutboxFlusher(self.outbox, metadata_saver))
+            stages = self._create_stages(storage, catalog_saver, metadata_saver, pg_creds, start_date, end_date,
+                                         max_workers, force)
+            with stages:
+                for service in services:
+                    stages.put(service)
+
+        self.stage_stats = stages.stats()
+        stages.log_stats()
+        self._log_cache_stats()
+        self._log_scheduler_stats()
+        self._log_output_stats(services)
+
+    async def run_async(self, n_days: int = 1, max_concurrency: Optional[int] = None,
+                        client: Optional[AsyncHttpClient] = None, force: bool = False):
+        """ Async variant of run. Requests for all locations share one HTTP connection pool, number of in-flight
+        requests is limited by max_concurrency.
+
+        :param n_days: number of days to look back from today
+        :param max_concurrency: max number of in-flight requests, defaults to cfg['max_concurrency'] or 8
+        :param client: shared async HTTP client, new one is opened when not given
+        :param force: download images even if they are already ingested
+        """
+        if max_concurrency is None:
+            max_concurrency = self.cfg.get('max_concurrency', 8)
+
+        sentinel_creds = self.cred_mgr.get_sentinelhub_credentials()
+        auth = SentinelHubAuthenticator(sentinel_creds, self.token_path, self.logger)
+        token_provider = SentinelHubTokenProvider(auth, self.logger)
+        await asyncio.to_thread(token_provider.get_token)
+
+        services = self._create_services(token_provider.oauth, token_provider)
+        storage = MinioStorage(self.cred_mgr.get_minio_credentials(), self.logger)
+        pg_creds = self.cred_mgr.get_pg_credentials()
+
+        start_date, end_date = get_date_range(n_days)
+
+        async with AsyncExitStack() as stack:
+            stack.enter_context(token_provider)
+            if client is None:
+                client = await stack.enter_async_context(AsyncHttpClient(max_concurrency, logger=self.logger))
+
+            date_lists = await asyncio.gather(
+                *(self._get_available_dates_async(client, service, pg_creds, start_date, end_date)
+                  for service in services),
+                return_exceptions=True
+            )
+
+            jobs = []
+            with PostgreSaver(pg_creds, pool_size=self.cfg.get('pg_pool_size', 5)) as postgre_saver:
+                for service, available_dates in zip(services, date_lists):
+                    if isinstance(available_dates, Exception):
+                        self.logger.error(f"Failed to get available dates for {service.cfg['location']['name']}: "
+                                          f"{available_dates}")
+                        continue
+                    if not force:
+                        available_dates = await asyncio.to_thread(
+                            self._skip_ingested, postgre_saver, service, available_dates)
+                    jobs.extend((service, date) for date in available_dates)
+
+            results = await asyncio.gather(
+                *(self._download_and_save_async(client, service, storage, date) for service, date in jobs),
+                return_exceptions=True
+            )
+
+        rows = []
+        for (service, date), result in zip(jobs, results):
+            if isinstance(result, Exception):
+                self.logger.error(f"Failed to process and save image for {service.cfg['location']['name']} "
+                                  f"image_datetime {date}: {result}")
+                continue
+            rows.append(self._create_metadata(service, date, result))
+
+        with PostgreSaver(pg_creds, pool_size=self.cfg.get('pg_pool_size', 5)) as postgre_saver:
+            self._save_metadata_rows(postgre_saver, rows)
+            if self.outbox is not None:
+                with self.outbox:
+                    self.outbox.flush(postgre_saver)
+
+        self._log_cache_stats()
+        self._log_scheduler_stats()
+        self._log_output_stats(services)
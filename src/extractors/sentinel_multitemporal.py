@@ -0,0 +1,46 @@
+import numpy as np
+
+from io import BytesIO
+from typing import List, Tuple
+import tarfile
+import json
+
+from src.extractors.sentinel_output import read_geotiff
+
+IMAGE_MEMBER = 'default.tif'
+USERDATA_MEMBER = 'userdata.json'
+
+
+def multitemporal_responses() -> List[dict]:
+    """ Returns Process API output responses of multi-temporal request: band stack and acquisition dates.
+    """
+    return [
+        {"identifier": "default", "format": {"type": "image/tiff"}},
+        {"identifier": "userdata", "format": {"type": "application/json"}},
+    ]
+
+
+def split_multitemporal(content: bytes, n_bands: int) -> List[Tuple[str, np.ndarray, list]]:
+    """ Splits multipart (TAR) response of multi-temporal request into per-acquisition images.
+
+    :param content: TAR with band stack (default.tif) and acquisition dates (userdata.json)
+    :param n_bands: number of bands per acquisition
+    :return: list of (acquisition date, pixel data, GeoTIFF tags)
+    """
+    with tarfile.open(fileobj=BytesIO(content)) as tar:
+        image = tar.extractfile(IMAGE_MEMBER).read()
+        userdata = json.loads(tar.extractfile(USERDATA_MEMBER).read())
+
+    data, extratags = read_geotiff(image)
+    if data.ndim == 2:
+        data = data[..., np.newaxis]
+
+    dates = userdata['dates']
+    if data.shape[-1] != len(dates) * n_bands:
+        raise ValueError(f'Band stack has {data.shape[-1]} bands, expected {len(dates)} x {n_bands}')
+
+    scenes = []
+    for i, date in enumerate(dates):
+        scene = data[..., i * n_bands:(i + 1) * n_bands]
+        scenes.append((date, scene[..., 0] if n_bands == 1 else scene, extratags))
+    return scenes
@@ -0,0 +1,170 @@
+import numpy as np
+import tifffile
+
+from dataclasses import dataclass, field, replace
+from typing import BinaryIO, Dict, Iterable, List, Mapping, Optional, Tuple, Union
+from io import BytesIO
+import threading
+
+from src.extractors.sentinel_evalscripts import PRODUCTS
+from src.extractors.sentinel_scheduler import PROCESSING_UNITS_HEADER, parse_header_number
+
+SAMPLE_TYPES = ('AUTO', 'UINT8', 'UINT16', 'FLOAT32')
+COMPRESSIONS = {None: None, 'deflate': 'zlib'}
+# GeoTIFF tags copied when image is re-encoded
+GEOTIFF_TAGS = (33550, 33922, 34264, 34735, 34736, 34737)
+
+
+@dataclass(frozen=True)
+class OutputProfile:
+    """ Format of images requested from Process API and stored to MinIO.
+
+    Product selects evalscript computed on SentinelHub side (see sentinel_evalscripts.PRODUCTS): raw bands or
+    a single-band index / mask. Band values (reflectance) are multiplied by scale before they are converted to
+    sample_type, e.g. UINT16 with scale 10000 keeps 4 decimal places. AUTO maps 0 - 1 to 0 - 255 on the API side.
+    Process API returns uncompressed TIFF, compression is applied before upload.
+    """
+    name: str = 'default'
+    bands: List[str] = field(default_factory=lambda: ['B04', 'B03', 'B02', 'B08'])
+    sample_type: str = 'AUTO'
+    scale: float = 1
+    compression: Optional[str] = None
+    product: str = 'bands'
+
+    def __post_init__(self):
+        if self.product not in PRODUCTS:
+            raise ValueError(f'Unknown product {self.product}, expected one of {list(PRODUCTS)}')
+        if self.sample_type not in SAMPLE_TYPES:
+            raise ValueError(f'Unknown sample type {self.sample_type}, expected one of {SAMPLE_TYPES}')
+        if self.compression not in COMPRESSIONS:
+            raise ValueError(f'Unknown compression {self.compression}, expected one of {list(COMPRESSIONS)}')
+
+    @classmethod
+    def from_config(cls, profile_cfg: Union[None, str, dict]) -> 'OutputProfile':
+        """ Creates profile from cfg['output_profile'], which is either name of predefined profile or dict of
+        profile fields. Dict with 'name' of predefined profile overrides only given fields.
+        """
+        if profile_cfg is None:
+            return OUTPUT_PROFILES['default']
+        if isinstance(profile_cfg, str):
+            if profile_cfg not in OUTPUT_PROFILES:
+                raise ValueError(f'Unknown output profile {profile_cfg}, expected one of {list(OUTPUT_PROFILES)}')
+            return OUTPUT_PROFILES[profile_cfg]
+
+        base = OUTPUT_PROFILES.get(profile_cfg.get('name'))
+        if base is not None:
+            return replace(base, **profile_cfg)
+        return cls(**profile_cfg)
+
+    @property
+    def tiff_compression(self) -> Optional[str]:
+        return COMPRESSIONS[self.compression]
+
+    def evalscript(self) -> str:
+        return PRODUCTS[self.product](self.bands, self.sample_type, self.scale)
+
+    def compress(self, image: bytes) -> bytes:
+        """ Re-encodes TIFF with profile compression, GeoTIFF tags are kept.
+
+        :param image: TIFF returned by Process API
+        :return: compressed TIFF (image unchanged when profile has no compression)
+        """
+        if self.compression is None:
+            return image
+
+        data, extratags = read_geotiff(image)
+        return write_geotiff(data, extratags, self.tiff_compression)
+
+
+def read_geotiff(image: bytes) -> Tuple[np.ndarray, list]:
+    """ Decodes TIFF, returns pixel data and GeoTIFF tags (as tifffile extratags).
+    """
+    with tifffile.TiffFile(BytesIO(image)) as tiff:
+        page = tiff.pages[0]
+        data = page.asarray()
+        extratags = [(tag.code, tag.dtype, tag.count, tag.value, True)
+                     for tag in page.tags.values() if tag.code in GEOTIFF_TAGS]
+    return data, extratags
+
+
+def write_geotiff(data: np.ndarray, extratags: list, compression: Optional[str] = None) -> bytes:
+    output = BytesIO()
+    tifffile.imwrite(output, data, photometric='minisblack', planarconfig='contig' if data.ndim == 3 else None,
+                     compression=compression, extratags=extratags)
+    return output.getvalue()
+
+
+OUTPUT_PROFILES: Dict[str, OutputProfile] = {
+    'default': OutputProfile(),
+    'uint8': OutputProfile('uint8', sample_type='UINT8', scale=255, compression='deflate'),
+    'uint16': OutputProfile('uint16', sample_type='UINT16', scale=10000, compression='deflate'),
+    'rgb_uint8': OutputProfile('rgb_uint8', bands=['B04', 'B03', 'B02'], sample_type='UINT8', scale=255,
+                               compression='deflate'),
+    'ndvi': OutputProfile('ndvi', sample_type='FLOAT32', compression='deflate', product='ndvi'),
+    'ndvi_uint16': OutputProfile('ndvi_uint16', sample_type='UINT16', scale=10000, compression='deflate',
+                                 product='ndvi'),
+    'ndwi': OutputProfile('ndwi', sample_type='FLOAT32', compression='deflate', product='ndwi'),
+    'true_color': OutputProfile('true_color', sample_type='AUTO', scale=2.5, compression='deflate',
+                                product='true_color'),
+    'cloud_mask': OutputProfile('cloud_mask', sample_type='UINT8', compression='deflate', product='cloud_mask'),
+}
+
+
+class CountingReader:
+    """ File-like wrapper counting bytes read from stream.
+    """
+    def __init__(self, stream: BinaryIO):
+        self.stream = stream
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.stream.read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+class OutputStats:
+    """ Thread-safe counters of downloaded and stored bytes and processing units of one output profile.
+    """
+    def __init__(self, profile: str):
+        self.profile = profile
+        self.images = 0
+        self.downloaded_bytes = 0
+        self.stored_bytes = 0
+        self.processing_units = 0.0
+        self._lock = threading.Lock()
+
+    def add_download(self, n_bytes: int, headers: Optional[Mapping] = None):
+        units = parse_header_number(headers.get(PROCESSING_UNITS_HEADER)) if headers is not None else None
+        with self._lock:
+            self.downloaded_bytes += n_bytes
+            self.processing_units += units or 0.0
+
+    def add_stored(self, n_bytes: int):
+        with self._lock:
+            self.images += 1
+            self.stored_bytes += n_bytes
+
+    @classmethod
+    def merge(cls, stats: Iterable['OutputStats']) -> Dict[str, 'OutputStats']:
+        """ Sums stats by profile.
+        """
+        merged = {}
+        for item in stats:
+            total = merged.setdefault(item.profile, cls(item.profile))
+            total.images += item.images
+            total.downloaded_bytes += item.downloaded_bytes
+            total.stored_bytes += item.stored_bytes
+            total.processing_units += item.processing_units
+        return merged
+
+    def as_dict(self) -> dict:
+        per_image = max(self.images, 1)
+        return {
+            'images': self.images,
+            'downloaded_bytes': self.downloaded_bytes,
+            'stored_bytes': self.stored_bytes,
+            'processing_units': round(self.processing_units, 3),
+            'stored_bytes_per_image': self.stored_bytes // per_image,
+            'processing_units_per_image': round(self.processing_units / per_image, 3),
+        }
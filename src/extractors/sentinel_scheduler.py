@@ -0,0 +1,224 @@
+import asyncio
+import aiohttp
+import requests
+
+from typing import Awaitable, Callable, Mapping, Optional, TypeVar
+import threading
+import random
+import time
+import logging
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RETRY_AFTER_HEADER = 'Retry-After'
+RATE_LIMIT_REMAINING_HEADER = 'X-RateLimit-Remaining'
+PROCESSING_UNITS_HEADER = 'X-ProcessingUnits-Spent'
+
+T = TypeVar('T')
+
+
+def parse_header_number(value) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class SentinelHubScheduler:
+    """ Adaptive limit on concurrent SentinelHub requests (AIMD).
+
+    Every successful request raises the limit so that it grows by about one slot per round of requests, every
+    throttled request (429 or exhausted rate limit) halves it. After 429 all requests wait until Retry-After has
+    passed. Throttled and failed (5xx, connection error) requests are retried with jittered exponential backoff.
+    Processing units reported by API are summed for the lifetime of scheduler (i.e. per run).
+
+    One scheduler should be shared by all extractors talking to the same account.
+    """
+    def __init__(self, max_concurrency: int = 8, min_concurrency: int = 1, initial_concurrency: int = 2,
+                 max_retries: int = 5, backoff_base: float = 1.0, backoff_max: float = 60.0,
+                 retry_after_unit: float = 0.001, logger=None):
+        """
+        :param max_concurrency: upper bound of concurrent requests
+        :param min_concurrency: lower bound of concurrent requests
+        :param initial_concurrency: number of concurrent requests before any response is seen
+        :param max_retries: number of retries of one request
+        :param backoff_base: backoff of first retry in seconds, doubled with every retry
+        :param backoff_max: max backoff in seconds
+        :param retry_after_unit: Retry-After unit in seconds (SentinelHub sends milliseconds)
+        :param logger: logger
+        """
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_after_unit = retry_after_unit
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+
+        self._limit = float(max(min_concurrency, min(initial_concurrency, max_concurrency)))
+        self._in_flight = 0
+        self._blocked_until = 0.0
+        self._cond = threading.Condition()
+
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.processing_units = 0.0
+
+    @classmethod
+    def from_config(cls, scheduler_cfg: Optional[dict], logger=None) -> 'SentinelHubScheduler':
+        """ Creates scheduler from cfg['rate_limit'], defaults are used for missing keys.
+        """
+        return cls(logger=logger, **(scheduler_cfg or {}))
+
+    @property
+    def concurrency(self) -> int:
+        return int(self._limit)
+
+    def stats(self) -> dict:
+        return {
+            'requests': self.requests,
+            'retries': self.retries,
+            'throttled': self.throttled,
+            'processing_units': round(self.processing_units, 3),
+            'concurrency': self.concurrency,
+        }
+
+    def backoff(self, attempt: int) -> float:
+        """ Returns full-jitter exponential backoff for given retry attempt (0-based).
+        """
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def retry_delay(self, headers: Mapping, attempt: int) -> float:
+        retry_after = parse_header_number(headers.get(RETRY_AFTER_HEADER))
+        if retry_after is not None:
+            return min(self.backoff_max, retry_after * self.retry_after_unit)
+        return self.backoff(attempt)
+
+    def _acquire(self):
+        with self._cond:
+            while True:
+                wait = self._blocked_until - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                elif self._in_flight < self.concurrency:
+                    break
+                else:
+                    self._cond.wait()
+            self._in_flight += 1
+            self.requests += 1
+
+    def _release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def _increase(self):
+        with self._cond:
+            self._limit = min(float(self.max_concurrency), self._limit + 1 / self._limit)
+            self._cond.notify_all()
+
+    def _decrease(self, delay: float = 0.0):
+        with self._cond:
+            self._limit = max(float(self.min_concurrency), self._limit / 2)
+            self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+            self.throttled += 1
+        self.logger.warning(f'SentinelHub throttled requests, concurrency limit lowered to {self.concurrency}')
+
+    def _record(self, headers: Mapping):
+        units = parse_header_number(headers.get(PROCESSING_UNITS_HEADER))
+        if units is not None:
+            with self._cond:
+                self.processing_units += units
+
+    def _on_response(self, status: int, headers: Mapping, attempt: int) -> Optional[float]:
+        """ Updates limit by response, returns delay before retry or None if response is final.
+        """
+        self._record(headers)
+        if status not in RETRY_STATUSES or attempt >= self.max_retries:
+            if parse_header_number(headers.get(RATE_LIMIT_REMAINING_HEADER)) == 0:
+                self._decrease()
+            elif status < 400:
+                self._increase()
+            return None
+
+        delay = self.retry_delay(headers, attempt)
+        with self._cond:
+            self.retries += 1
+        if status == 429:
+            self._decrease(delay)
+        self.logger.warning(f'SentinelHub responded {status}, retrying in {delay:.1f} s '
+                            f'(attempt {attempt + 1}/{self.max_retries})')
+        return delay
+
+    def request(self, send: Callable[[], requests.Response]) -> requests.Response:
+        """ Sends request once a slot is free and retries it when API is throttling or failing.
+
+        :param send: function sending the request
+        :return: final response (status is not checked)
+        """
+        attempt = 0
+        while True:
+            throttled = False
+            self._acquire()
+            try:
+                response = send()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.backoff(attempt)
+                with self._cond:
+                    self.retries += 1
+                self.logger.warning(f'SentinelHub request failed: {e}, retrying in {delay:.1f} s')
+            else:
+                delay = self._on_response(response.status_code, response.headers, attempt)
+                if delay is None:
+                    return response
+                throttled = response.status_code == 429
+                response.close()
+            finally:
+                self._release()
+
+            # after 429 all requests (including this one) wait in _acquire until Retry-After has passed
+            if not throttled:
+                time.sleep(delay)
+            attempt += 1
+
+    async def request_async(self, send: Callable[[], Awaitable[T]]) -> T:
+        """ Async variant of request. Concurrency is limited by the async HTTP client, scheduler only retries
+        and delays requests while API is throttling. When result of send has status and headers (AsyncResponse),
+        they are handled like those of sync responses, processing units included.
+
+        :param send: coroutine function sending the request, raising aiohttp.ClientResponseError on error status
+        :return: result of send
+        """
+        attempt = 0
+        while True:
+            wait = self._blocked_until - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+            self.requests += 1
+            try:
+                result = await send()
+            except aiohttp.ClientResponseError as e:
+                delay = self._on_response(e.status, e.headers or {}, attempt)
+                if delay is None:
+                    raise
+            except aiohttp.ClientConnectionError as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.backoff(attempt)
+                self.retries += 1
+                self.logger.warning(f'SentinelHub request failed: {e}, retrying in {delay:.1f} s')
+            else:
+                headers = getattr(result, 'headers', None)
+                if headers is None:
+                    self._increase()
+                else:
+                    self._on_response(result.status, headers, attempt)
+                return result
+
+            await asyncio.sleep(delay)
+            attempt += 1
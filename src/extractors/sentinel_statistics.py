@@ -0,0 +1,93 @@
+import math
+
+from src.extractors.sentinel_evalscripts import statistical_evalscript
+from src.extractors.sentinel_tiler import plan_tiles
+from src.utils.common_utils import parse_iso_datetime
+
+from typing import List, Optional
+
+STATISTICS_URL = "https://sh.dataspace.copernicus.eu/api/v1/statistics"
+PERCENTILES = (10, 25, 50, 75, 90)
+
+
+def statistical_request(bbox: List[float], collection: str, iso_start_datetime: str, iso_end_datetime: str,
+                        index: str = 'ndvi', resolution: float = 10, mask_clouds: bool = True,
+                        interval: str = 'P1D') -> dict:
+    """ Builds Statistical API request returning statistics of index for every interval (day by default)
+    of the whole time range.
+
+    :param bbox: [min_lon, min_lat, max_lon, max_lat]
+    :param collection: data collection (e.g. sentinel-2-l2a)
+    :param iso_start_datetime: start datetime in ISO format
+    :param iso_end_datetime: end datetime in ISO format
+    :param index: index name (see sentinel_evalscripts.INDICES)
+    :param resolution: resolution in meters per pixel
+    :param mask_clouds: exclude cloudy pixels (by scene classification)
+    :param interval: aggregation interval (ISO 8601 duration)
+    :return: request body
+    """
+    grid = plan_tiles(bbox, resolution)
+    return {
+        "input": {
+            "bounds": {
+                "properties": {"crs": "http://www.opengis.net/def/crs/OGC/1.3/CRS84"},
+                "bbox": bbox,
+            },
+            "data": [{"type": collection}],
+        },
+        "aggregation": {
+            "timeRange": {"from": iso_start_datetime, "to": iso_end_datetime},
+            "aggregationInterval": {"of": interval},
+            "evalscript": statistical_evalscript(index, mask_clouds),
+            "resx": grid.res_lon,
+            "resy": grid.res_lat,
+        },
+        "calculations": {
+            "default": {"statistics": {"default": {"percentiles": {"k": list(PERCENTILES)}}}}
+        },
+    }
+
+
+def _number(value) -> Optional[float]:
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) else value
+
+
+def parse_statistics(response: dict, index: str) -> List[dict]:
+    """ Converts Statistical API response to one row per interval with at least one valid pixel.
+    Intervals which failed on API side are skipped.
+
+    :param response: Statistical API response
+    :param index: index name (id of evalscript output)
+    :return: list of rows (date, mean, std, min, max, median, p10, p25, p75, p90, valid/total pixels)
+    """
+    rows = []
+    for item in response.get('data', []):
+        if 'error' in item:
+            continue
+        stats = item['outputs'][index]['bands']['B0']['stats']
+        total = int(stats.get('sampleCount', 0))
+        valid = total - int(stats.get('noDataCount', 0))
+        if valid <= 0:
+            continue
+
+        percentiles = {float(k): _number(v) for k, v in stats.get('percentiles', {}).items()}
+        rows.append({
+            'date': parse_iso_datetime(item['interval']['from']),
+            'mean': _number(stats.get('mean')),
+            'std': _number(stats.get('stDev')),
+            'min': _number(stats.get('min')),
+            'max': _number(stats.get('max')),
+            'median': percentiles.get(50.0),
+            'p10': percentiles.get(10.0),
+            'p25': percentiles.get(25.0),
+            'p75': percentiles.get(75.0),
+            'p90': percentiles.get(90.0),
+            'valid_pixels': valid,
+            'total_pixels': total,
+            'valid_fraction': valid / total,
+        })
+    return rows
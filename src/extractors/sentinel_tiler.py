@@ -0,0 +1,142 @@
+import numpy as np
+import tifffile
+
+from dataclasses import dataclass
+from typing import BinaryIO, Callable, Iterator, List, Union
+from pathlib import Path
+import math
+
+METERS_PER_DEGREE = 111320.0
+# Process API output limit is 2500 px, TIFF tiles have to be multiples of 16 px
+MAX_TILE_SIZE = 2496
+TIFF_TILE_ALIGNMENT = 16
+
+# GeoTIFF tags
+MODEL_PIXEL_SCALE_TAG = 33550
+MODEL_TIEPOINT_TAG = 33922
+GEO_KEY_DIRECTORY_TAG = 34735
+
+
+@dataclass(frozen=True)
+class Tile:
+    row: int
+    col: int
+    bbox: List[float]  # [min_lon, min_lat, max_lon, max_lat]
+    width: int
+    height: int
+
+
+@dataclass(frozen=True)
+class TileGrid:
+    """ Split of bounding box (CRS84) into equally sized tiles of tile_size x tile_size px, edge tiles are cropped.
+    Rows go from north to south, columns from west to east.
+    """
+    bbox: List[float]
+    res_lon: float
+    res_lat: float
+    width: int
+    height: int
+    tile_size: int
+
+    @property
+    def n_rows(self) -> int:
+        return math.ceil(self.height / self.tile_size)
+
+    @property
+    def n_cols(self) -> int:
+        return math.ceil(self.width / self.tile_size)
+
+    def __len__(self) -> int:
+        return self.n_rows * self.n_cols
+
+    def tiles(self) -> List[Tile]:
+        """ Returns tiles in row-major order.
+        """
+        min_lon, _, _, max_lat = self.bbox
+        tiles = []
+        for row in range(self.n_rows):
+            for col in range(self.n_cols):
+                width = min(self.tile_size, self.width - col * self.tile_size)
+                height = min(self.tile_size, self.height - row * self.tile_size)
+                left = min_lon + col * self.tile_size * self.res_lon
+                top = max_lat - row * self.tile_size * self.res_lat
+                tiles.append(Tile(row, col, [left, top - height * self.res_lat, left + width * self.res_lon, top],
+                                  width, height))
+        return tiles
+
+    def geotiff_tags(self) -> list:
+        """ Returns tifffile extratags georeferencing the mosaic in EPSG:4326.
+        """
+        min_lon, _, _, max_lat = self.bbox
+        geo_keys = (
+            1, 1, 0, 3,
+            1024, 0, 1, 2,     # GTModelType = geographic
+            1025, 0, 1, 1,     # GTRasterType = pixel is area
+            2048, 0, 1, 4326,  # GeographicType = WGS 84
+        )
+        return [
+            (MODEL_PIXEL_SCALE_TAG, 'd', 3, (self.res_lon, self.res_lat, 0.0), True),
+            (MODEL_TIEPOINT_TAG, 'd', 6, (0.0, 0.0, 0.0, min_lon, max_lat, 0.0), True),
+            (GEO_KEY_DIRECTORY_TAG, 'H', len(geo_keys), geo_keys, True),
+        ]
+
+
+def plan_tiles(bbox: List[float], resolution: float, tile_size: int = 1024) -> TileGrid:
+    """ Splits bounding box into tiles at target resolution. Meters are converted to degrees at the center latitude
+    of bounding box. Areas smaller than tile_size need a single (smaller) tile.
+
+    :param bbox: [min_lon, min_lat, max_lon, max_lat]
+    :param resolution: target resolution in meters per pixel
+    :param tile_size: max tile width and height in pixels
+    :return: tile grid
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    res_lat = resolution / METERS_PER_DEGREE
+    res_lon = resolution / (METERS_PER_DEGREE * math.cos(math.radians((min_lat + max_lat) / 2)))
+
+    width = max(1, math.ceil((max_lon - min_lon) / res_lon))
+    height = max(1, math.ceil((max_lat - min_lat) / res_lat))
+
+    tile_size = min(tile_size, MAX_TILE_SIZE, max(width, height))
+    tile_size = math.ceil(tile_size / TIFF_TILE_ALIGNMENT) * TIFF_TILE_ALIGNMENT
+    return TileGrid(list(bbox), res_lon, res_lat, width, height, tile_size)
+
+
+def _pad(data: np.ndarray, tile_size: int) -> np.ndarray:
+    if data.shape[0] == tile_size and data.shape[1] == tile_size:
+        return data
+    padded = np.zeros((tile_size, tile_size) + data.shape[2:], dtype=data.dtype)
+    padded[:data.shape[0], :data.shape[1]] = data
+    return padded
+
+
+def write_mosaic(grid: TileGrid, read_tile: Callable[[Tile], Union[str, Path, BinaryIO]],
+                 output: Union[str, Path, BinaryIO], compression=None):
+    """ Writes tiles into one tiled GeoTIFF. Tiles are read one by one in row-major order,
+    so only one tile is held in memory at a time.
+
+    :param grid: tile grid
+    :param read_tile: returns TIFF file (path or file-like object) of given tile
+    :param output: path or file-like object of mosaic
+    :param compression: TIFF compression (e.g. 'zlib'), uncompressed by default
+    """
+    tiles = grid.tiles()
+    first = tifffile.imread(read_tile(tiles[0]))
+    samples = first.shape[2:]
+
+    def iter_tiles() -> Iterator[np.ndarray]:
+        yield _pad(first, grid.tile_size)
+        for tile in tiles[1:]:
+            yield _pad(tifffile.imread(read_tile(tile)), grid.tile_size)
+
+    tifffile.imwrite(
+        output,
+        iter_tiles(),
+        shape=(grid.height, grid.width) + samples,
+        dtype=first.dtype,
+        tile=(grid.tile_size, grid.tile_size),
+        photometric='minisblack',
+        planarconfig='contig' if samples else None,
+        compression=compression,
+        extratags=grid.geotiff_tags(),
+    )
@@ -0,0 +1,103 @@
+import numpy as np
+
+from src.db.pg_data_models import WeatherHourly
+
+from typing import Dict, List, Optional
+import logging
+
+# Open-Meteo variable -> weather_hourly column
+WEATHER_HOURLY_SCHEMA = {
+    'temperature_2m': 'temperature_2m',
+    'precipitation': 'precipitation',
+    'rain': 'rain',
+    'soil_temperature_0cm': 'soil_temperature_0cm',
+    'soil_moisture_0_to_1cm': 'soil_moisture_0_to_1cm',
+}
+# weather_hourly columns filled by pipeline, not by weather variables
+WEATHER_KEY_COLUMNS = ('id', 'location_name', 'latitude', 'longitude', 'timestamp')
+
+
+def validate_schema(schema: Dict[str, str]):
+    """ Checks that every variable of custom schema (cfg['weather_schema']) maps to a value column of weather_hourly.
+
+    :param schema: Open-Meteo variable -> weather_hourly column
+    :raises ValueError: when a target column does not exist or is a key column
+    """
+    value_columns = set(WeatherHourly.__table__.columns.keys()) - set(WEATHER_KEY_COLUMNS)
+    invalid = {variable: column for variable, column in schema.items() if column not in value_columns}
+    if invalid:
+        raise ValueError(f'Weather schema maps to unknown weather_hourly columns: {invalid}, '
+                         f'expected one of {sorted(value_columns)}')
+
+
+class WeatherFrame:
+    """ Column-oriented weather data. Every column is a float64 array aligned with timestamps,
+    missing values are stored as NaN.
+    """
+    def __init__(self, timestamps: np.ndarray, columns: Dict[str, np.ndarray]):
+        self.timestamps = timestamps
+        self.columns = columns
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def mask(self, column: str) -> np.ndarray:
+        """ Returns boolean mask of missing values for given column.
+        """
+        return np.isnan(self.columns[column])
+
+    def to_rows(self, **constants) -> List[dict]:
+        """ Converts frame to list of column-value mappings suitable for bulk insert.
+
+        :param constants: values repeated on every row (e.g. location_name, latitude, longitude)
+        :return: list of rows
+        """
+        names = list(self.columns)
+        values = []
+        for name in names:
+            column = self.columns[name].astype(object)
+            column[np.isnan(self.columns[name])] = None
+            values.append(column.tolist())
+
+        timestamps = self.timestamps.tolist()
+        row_values = zip(*values) if values else [()] * len(timestamps)
+        return [
+            {**constants, 'timestamp': timestamp, **dict(zip(names, row))}
+            for timestamp, row in zip(timestamps, row_values)
+        ]
+
+
+def decode_weather(frequency_data: dict, variables: List[str], schema: Optional[Dict[str, str]] = None,
+                   logger=None) -> WeatherFrame:
+    """ Decodes Open-Meteo frequency payload (e.g. response['hourly']) into WeatherFrame.
+
+    :param frequency_data: payload with 'time' list and one list per variable
+    :param variables: requested weather variables
+    :param schema: mapping of weather variables to table columns
+    :param logger: logger
+    :return: decoded weather frame
+    """
+    if logger is None:
+        logger = logging.getLogger('WeatherDecoder')
+    if schema is None:
+        schema = WEATHER_HOURLY_SCHEMA
+
+    unmapped = [var for var in variables if var not in schema]
+    if unmapped:
+        logger.warning(f'Weather variables without target column are not saved: {unmapped}')
+
+    timestamps = np.array(frequency_data['time'], dtype='datetime64[s]')
+    n_rows = len(timestamps)
+
+    columns = {}
+    for var in variables:
+        if var not in schema:
+            continue
+        values = np.full(n_rows, np.nan)
+        raw = frequency_data.get(var)
+        if raw:
+            raw = np.array(raw[:n_rows], dtype=np.float64)
+            values[:len(raw)] = raw
+        columns[schema[var]] = values
+
+    return WeatherFrame(timestamps, columns)
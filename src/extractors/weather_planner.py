@@ -0,0 +1,54 @@
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Set, Tuple
+
+HOURS_PER_DAY = {
+    'hourly': 24,
+    'daily': 1,
+}
+
+
+def get_missing_ranges(timestamps: Set[datetime], start_date: date, end_date: date,
+                       expected_per_day: int = 24) -> List[Tuple[date, date]]:
+    """ Returns contiguous day ranges (inclusive) within start_date - end_date which are not fully stored.
+    Day is complete when it has at least expected_per_day stored timestamps.
+
+    :param timestamps: stored timestamps
+    :param start_date: first requested day
+    :param end_date: last requested day
+    :param expected_per_day: number of timestamps per complete day
+    :return: list of (first_day, last_day)
+    """
+    counts = {}
+    for timestamp in timestamps:
+        counts[timestamp.date()] = counts.get(timestamp.date(), 0) + 1
+
+    ranges = []
+    day = start_date
+    while day <= end_date:
+        if counts.get(day, 0) < expected_per_day:
+            if ranges and ranges[-1][1] == day - timedelta(days=1):
+                ranges[-1] = (ranges[-1][0], day)
+            else:
+                ranges.append((day, day))
+        day += timedelta(days=1)
+    return ranges
+
+
+def plan_requests(points: Iterable, timestamps: Dict[Tuple[float, float], Set[datetime]], start_date: date,
+                  end_date: date, expected_per_day: int = 24) -> Dict[Tuple[date, date], list]:
+    """ Groups points by missing day range, so that points with the same gap can be requested together.
+
+    :param points: items whose last two values are (latitude, longitude)
+    :param timestamps: stored timestamps per (latitude, longitude)
+    :param start_date: first requested day
+    :param end_date: last requested day
+    :param expected_per_day: number of timestamps per complete day
+    :return: points per missing (first_day, last_day) range
+    """
+    plan = {}
+    for point in points:
+        lat, lon = point[-2], point[-1]
+        for day_range in get_missing_ranges(timestamps.get((lat, lon), set()), start_date, end_date,
+                                            expected_per_day):
+            plan.setdefault(day_range, []).append(point)
+    return plan
@@ -1,19 +1,24 @@
+import argparse
+
 from src.extractors.sentinel_hub import SentinelDataPipeline
 from src.extractors.open_meteo import OpenMeteoPipeline
+from src.transformers.ndvi import NdviPipeline
 
 from src.utils.log_utils import setup_logger
 
 
 CONFIG = {
-    'location': {
-        'name': 'Cerhenice',
-        'coordinates': {
-            'min_lon': 15.0492,
-            'min_lat': 50.0566,
-            'max_lon': 15.0949,
-            'max_lat': 50.0859
-        }
-    },
+    'locations': [
+        {
+            'name': 'Cerhenice',
+            'coordinates': {
+                'min_lon': 15.0492,
+                'min_lat': 50.0566,
+                'max_lon': 15.0949,
+                'max_lat': 50.0859
+            }
+        },
+    ],
     'sentinel_type': 'sentinel-2-l2a',
     'weather_frequency': 'hourly',
     'weather_variables': [
@@ -26,10 +31,25 @@ CONFIG = {
 }
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description='Extract satellite images and weather data.')
+    parser.add_argument('--force', action='store_true', help='re-process images that are already ingested')
+    parser.add_argument('--statistics', action='store_true',
+                        help='extract daily index statistics (Statistical API) instead of images')
+    return parser.parse_args()
+
+
 def main():
+    args = parse_args()
     setup_logger('extraction')
     sdp = SentinelDataPipeline(CONFIG)
-    sdp.run(n_days=1)
+    if args.statistics:
+        sdp.run_statistics(n_days=1)
+    else:
+        sdp.run(n_days=1, force=args.force)
+
+        ndvi = NdviPipeline(CONFIG)
+        ndvi.run()
 
     omp = OpenMeteoPipeline(CONFIG)
     omp.run(n_days=5)
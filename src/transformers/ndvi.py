@@ -0,0 +1,229 @@
+import numpy as np
+import tifffile
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.db.minio_storage import MinioStorage
+from src.db.pg_database import PostgreSaver
+from src.db.pg_data_models import SatelliteImageNdvi
+from src.utils.credentials import CredentialManager
+
+from typing import Iterator, List, Optional, Sequence, Tuple, Union
+import logging
+
+# NDVI histogram used for median and percentiles, bin width 0.001
+HISTOGRAM_BINS = 2000
+HISTOGRAM_RANGE = (-1.0, 1.0)
+PERCENTILES = (10, 25, 50, 75, 90)
+CHUNK_PIXELS = 1024 * 1024
+RED_BAND = 'B04'
+NIR_BAND = 'B08'
+
+
+def compute_ndvi(red: np.ndarray, nir: np.ndarray) -> np.ndarray:
+    """ Computes NDVI = (NIR - RED) / (NIR + RED). Pixels with zero reflectance in both bands (no data) are NaN.
+
+    :param red: red band (B04)
+    :param nir: near infrared band (B08)
+    :return: NDVI as float32 array
+    """
+    red = red.astype(np.float32)
+    nir = nir.astype(np.float32)
+    total = nir + red
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(total > 0, (nir - red) / total, np.float32(np.nan))
+
+
+class NdviAccumulator:
+    """ Zonal statistics of NDVI computed chunk by chunk. Mean, std, min and max are exact, median and percentiles
+    are read from fixed histogram (precision 0.001), so memory does not depend on image size.
+    """
+    def __init__(self):
+        self.histogram = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+        self.total_pixels = 0
+        self.valid_pixels = 0
+        self.sum = 0.0
+        self.sum_squares = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def add(self, ndvi: np.ndarray, total_pixels: Optional[int] = None):
+        """ Adds chunk of NDVI values (NaN = not valid).
+
+        :param ndvi: NDVI values
+        :param total_pixels: number of image pixels in chunk, defaults to ndvi.size (chunks padded to full tile
+            size count only pixels inside the image)
+        """
+        self.total_pixels += ndvi.size if total_pixels is None else total_pixels
+        valid = ndvi[~np.isnan(ndvi)]
+        if not valid.size:
+            return
+
+        valid = valid.astype(np.float64)
+        self.valid_pixels += valid.size
+        self.sum += valid.sum()
+        self.sum_squares += np.dot(valid, valid)
+        self.min = min(self.min, valid.min())
+        self.max = max(self.max, valid.max())
+
+        bins = ((valid - HISTOGRAM_RANGE[0]) * (HISTOGRAM_BINS / (HISTOGRAM_RANGE[1] - HISTOGRAM_RANGE[0])))
+        bins = np.clip(bins.astype(np.int64), 0, HISTOGRAM_BINS - 1)
+        self.histogram += np.bincount(bins, minlength=HISTOGRAM_BINS)
+
+    def percentiles(self, q: Sequence[float]) -> np.ndarray:
+        cumulative = np.cumsum(self.histogram)
+        ranks = np.asarray(q, dtype=np.float64) / 100 * (self.valid_pixels - 1)
+        bins = np.searchsorted(cumulative, ranks, side='right')
+        width = (HISTOGRAM_RANGE[1] - HISTOGRAM_RANGE[0]) / HISTOGRAM_BINS
+        return np.clip(HISTOGRAM_RANGE[0] + (bins + 0.5) * width, self.min, self.max)
+
+    def result(self) -> dict:
+        stats = {
+            'valid_pixels': int(self.valid_pixels),
+            'total_pixels': int(self.total_pixels),
+            'valid_fraction': self.valid_pixels / self.total_pixels if self.total_pixels else 0.0,
+        }
+        if not self.valid_pixels:
+            return {**stats, 'mean': None, 'std': None, 'min': None, 'max': None,
+                    'median': None, 'p10': None, 'p25': None, 'p75': None, 'p90': None}
+
+        mean = self.sum / self.valid_pixels
+        p10, p25, median, p75, p90 = self.percentiles(PERCENTILES).tolist()
+        return {
+            **stats,
+            'mean': mean,
+            'std': float(np.sqrt(max(self.sum_squares / self.valid_pixels - mean ** 2, 0.0))),
+            'min': float(self.min),
+            'max': float(self.max),
+            'median': median,
+            'p10': p10,
+            'p25': p25,
+            'p75': p75,
+            'p90': p90,
+        }
+
+
+def iter_band_chunks(path: Union[str, Path], bands: Tuple[int, int],
+                     chunk_pixels: int = CHUNK_PIXELS) -> Iterator[Tuple[np.ndarray, np.ndarray, int]]:
+    """ Yields chunks of two bands of multi-band TIFF. Uncompressed images are memory mapped and read by row
+    blocks, other images are decoded strip by strip (or tile by tile).
+
+    :param path: TIFF file
+    :param bands: indexes of bands (samples) to read
+    :param chunk_pixels: approx. number of pixels per chunk of memory mapped image
+    :return: (first band, second band, number of image pixels in chunk)
+    """
+    try:
+        image = tifffile.memmap(path, mode='r')
+    except ValueError:
+        image = None
+
+    if image is not None:
+        rows = max(1, chunk_pixels // image.shape[1])
+        for start in range(0, image.shape[0], rows):
+            chunk = image[start:start + rows]
+            yield chunk[..., bands[0]], chunk[..., bands[1]], chunk.shape[0] * chunk.shape[1]
+        return
+
+    with tifffile.TiffFile(path) as tiff:
+        page = tiff.pages[0]
+        height, width = page.shape[:2]
+        for segment, indices, shape in page.segments():
+            if segment is None:
+                continue
+            row, col = indices[-3], indices[-2]
+            pixels = (min(shape[-3], height - row)) * (min(shape[-2], width - col))
+            yield segment[..., bands[0]], segment[..., bands[1]], pixels
+
+
+def ndvi_stats(path: Union[str, Path], red_band: int = 0, nir_band: int = 3,
+               chunk_pixels: int = CHUNK_PIXELS) -> dict:
+    """ Computes NDVI zonal statistics of the whole image (area of the location).
+
+    :param path: TIFF file
+    :param red_band: index of red band (B04) in image
+    :param nir_band: index of near infrared band (B08) in image
+    :param chunk_pixels: approx. number of pixels processed at once
+    :return: statistics (mean, std, min, max, median, percentiles, valid pixels)
+    """
+    accumulator = NdviAccumulator()
+    for red, nir, pixels in iter_band_chunks(path, (red_band, nir_band), chunk_pixels):
+        accumulator.add(compute_ndvi(red, nir), pixels)
+    return accumulator.result()
+
+
+class NdviPipeline:
+    """ Computes NDVI statistics of stored images which have not been processed yet and saves them to
+    satellite_images_ndvi.
+
+    Red and NIR band indexes are taken from band list stored with image metadata (output profile bands).
+    Config (cfg['ndvi'], optional): red_band and nir_band indexes of images stored without band list
+    (default profile returns B04, B03, B02, B08), batch_size - number of images per DB write.
+    """
+    def __init__(self, cfg: dict):
+        self.cfg = cfg
+        self.ndvi_cfg = cfg.get('ndvi', {})
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.secrets_path = Path(__file__).resolve().parents[2] / '.secrets'
+        self.cred_mgr = CredentialManager(self.secrets_path)
+        self.bucket_name = 'satellite-images'
+
+    def _band_indexes(self, bands: Optional[str]) -> Tuple[int, int]:
+        """ Returns indexes of red and NIR band in image with given comma-separated bands (configured indexes
+        when bands are not known).
+        """
+        if bands is None:
+            return self.ndvi_cfg.get('red_band', 0), self.ndvi_cfg.get('nir_band', 3)
+
+        band_list: List[str] = bands.split(',')
+        if RED_BAND not in band_list or NIR_BAND not in band_list:
+            raise ValueError(f'Image bands {bands} do not contain {RED_BAND} and {NIR_BAND}')
+        return band_list.index(RED_BAND), band_list.index(NIR_BAND)
+
+    def _process_image(self, storage: MinioStorage, tmp_dir: Path, image_id: int, image_path: str,
+                       bands: Optional[str] = None) -> dict:
+        red_band, nir_band = self._band_indexes(bands)
+        file_path = tmp_dir / f'{image_id}.tiff'
+        if not storage.download(self.bucket_name, image_path, str(file_path)):
+            raise RuntimeError(f'Download of {self.bucket_name}/{image_path} failed')
+        try:
+            stats = ndvi_stats(file_path, red_band, nir_band)
+        finally:
+            file_path.unlink(missing_ok=True)
+        return {'image_id': image_id, **stats}
+
+    def _save(self, postgre_saver: PostgreSaver, rows: list):
+        try:
+            postgre_saver.bulk_save('satellite_image_processing', SatelliteImageNdvi, rows)
+        except SQLAlchemyError as e:
+            self.logger.error(f'Failed to save NDVI statistics of {len(rows)} images: {e}')
+
+    def run(self, limit: Optional[int] = None):
+        """ Processes images without NDVI statistics.
+
+        :param limit: max number of processed images
+        """
+        storage = MinioStorage(self.cred_mgr.get_minio_credentials(), self.logger)
+        pg_creds = self.cred_mgr.get_pg_credentials()
+        batch_size = self.ndvi_cfg.get('batch_size', 100)
+
+        with PostgreSaver(pg_creds, pool_size=self.cfg.get('pg_pool_size', 5)) as postgre_saver, \
+                TemporaryDirectory() as tmp_dir:
+            images = postgre_saver.get_images_without_ndvi('satellite_image_processing', limit)
+            self.logger.info(f'Images without NDVI: {len(images)}')
+
+            rows = []
+            for image_id, image_path, bands in images:
+                try:
+                    rows.append(self._process_image(storage, Path(tmp_dir), image_id, image_path, bands))
+                except Exception as e:
+                    self.logger.error(f'Failed to compute NDVI of {image_path}: {e}')
+                    continue
+
+                if len(rows) >= batch_size:
+                    self._save(postgre_saver, rows)
+                    rows = []
+
+            self._save(postgre_saver, rows)
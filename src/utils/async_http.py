@@ -0,0 +1,73 @@
+import asyncio
+import aiohttp
+
+from typing import Mapping, NamedTuple, Optional
+import logging
+
+
+class AsyncResponse(NamedTuple):
+    status: int
+    headers: Mapping[str, str]
+    body: bytes
+
+
+class AsyncHttpClient:
+    """ Shared aiohttp session with a limit on number of in-flight requests.
+
+    Usage:
+        async with AsyncHttpClient(max_concurrency=8) as client:
+            data = await client.get_json(url)
+    """
+    def __init__(self, max_concurrency: int = 8, timeout: float = 300, logger=None):
+        self.max_concurrency = max_concurrency
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def open(self):
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+
+    async def request(self, method: str, url: str, **kwargs) -> bytes:
+        """ Sends request once a concurrency slot is free.
+
+        :param method: HTTP method
+        :param url: request URL
+        :param kwargs: keyword arguments passed to aiohttp (json, headers, ...)
+        :return: response body
+        """
+        response = await self.request_with_headers(method, url, **kwargs)
+        return response.body
+
+    async def request_with_headers(self, method: str, url: str, **kwargs) -> AsyncResponse:
+        """ Like request, returns status and headers together with response body.
+        """
+        async with self.semaphore:
+            async with self.session.request(method, url, **kwargs) as response:
+                response.raise_for_status()
+                return AsyncResponse(response.status, response.headers.copy(), await response.read())
+
+    async def get_json(self, url: str, **kwargs) -> dict:
+        async with self.semaphore:
+            async with self.session.get(url, **kwargs) as response:
+                response.raise_for_status()
+                return await response.json(content_type=None)
+
+    async def post_json(self, url: str, **kwargs) -> dict:
+        async with self.semaphore:
+            async with self.session.post(url, **kwargs) as response:
+                response.raise_for_status()
+                return await response.json(content_type=None)
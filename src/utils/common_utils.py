@@ -1,5 +1,5 @@
-from datetime import datetime, timedelta
-from typing import Optional, Tuple
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
 
 
 def get_date_range(n_days: int, end_date: Optional[datetime] = None) -> Tuple[datetime, datetime]:
@@ -19,3 +19,20 @@ def get_compact_datime_format(iso_date: str) -> str:
 
 def date_string_format(date_time: datetime) -> str:
     return date_time.strftime('%Y-%m-%d')
+
+
+def parse_iso_datetime(iso_date: str) -> datetime:
+    """ Parses ISO datetime (e.g. '2025-01-01T10:00:00.024Z') to naive UTC datetime.
+    """
+    date_time = datetime.fromisoformat(iso_date.replace('Z', '+00:00'))
+    if date_time.tzinfo is not None:
+        date_time = date_time.astimezone(timezone.utc).replace(tzinfo=None)
+    return date_time
+
+
+def get_locations(cfg: dict) -> List[dict]:
+    """ Returns configured locations. Config contains either single 'location' or list of 'locations'.
+    """
+    if 'locations' in cfg:
+        return cfg['locations']
+    return [cfg['location']]
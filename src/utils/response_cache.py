@@ -0,0 +1,185 @@
+from pathlib import Path
+from datetime import date, datetime, timedelta
+from urllib.parse import urlsplit, parse_qsl, urlencode
+import hashlib
+import json
+import os
+import threading
+import time
+import logging
+
+from typing import Any, Awaitable, Callable, Optional, Union
+
+# eviction removes entries until cache size drops to this fraction of max_bytes
+EVICT_TARGET = 0.9
+
+
+class ResponseCache:
+    """ On-disk cache of HTTP response bodies.
+
+    Every entry is stored in a separate file named by hash of normalized request (method, URL with sorted query
+    parameters and JSON body). File starts with one line of JSON metadata followed by response body. Entries expire
+    after their TTL, least recently used entries are evicted once total size exceeds max_bytes.
+
+    Total size is tracked in memory (directory is scanned on first write), the directory is scanned again only
+    when the size exceeds max_bytes. Eviction then goes down to EVICT_TARGET of max_bytes, so scans are rare.
+    """
+    def __init__(self, cache_dir: Union[str, Path], max_bytes: int = 256 * 1024 * 1024,
+                 ttl_past: float = 30 * 24 * 3600, ttl_recent: float = 3600, logger=None):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl_past = ttl_past
+        self.ttl_recent = ttl_recent
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None
+
+    @classmethod
+    def from_config(cls, cache_cfg: Optional[dict], logger=None) -> Optional['ResponseCache']:
+        """ Creates cache from cfg['http_cache'], returns None when caching is not configured.
+        """
+        if not cache_cfg:
+            return None
+        return cls(logger=logger, **cache_cfg)
+
+    @staticmethod
+    def make_key(method: str, url: str, body: Optional[dict] = None) -> str:
+        parts = urlsplit(url)
+        query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+        normalized = json.dumps(
+            [method.upper(), parts.scheme, parts.netloc.lower(), parts.path, query, body],
+            sort_keys=True
+        )
+        return hashlib.sha256(normalized.encode()).hexdigest()
+
+    def ttl_for(self, end: Union[str, date, datetime]) -> float:
+        """ Returns TTL for response covering data up to end. Data for past days do not change,
+        so they are kept for ttl_past, anything reaching into yesterday or later only for ttl_recent.
+        """
+        if isinstance(end, str):
+            end = datetime.fromisoformat(end.replace('Z', '+00:00'))
+        if isinstance(end, datetime):
+            end = end.date()
+        return self.ttl_past if end < date.today() - timedelta(days=1) else self.ttl_recent
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                meta = json.loads(f.readline())
+                data = f.read()
+        except (FileNotFoundError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        if meta['expires_at'] < time.time():
+            self._remove(path)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def get_or_fetch(self, method: str, url: str, body: Optional[dict], end: Union[str, date, datetime],
+                     fetch: Callable[[], Any]) -> Any:
+        """ Returns JSON response of request from cache, on miss calls fetch and stores its result.
+
+        :param method: HTTP method
+        :param url: request URL
+        :param body: JSON body of request
+        :param end: end of requested data, determines TTL
+        :param fetch: sends request and returns parsed JSON response
+        :return: parsed JSON response
+        """
+        key = self.make_key(method, url, body)
+        cached = self.get(key)
+        if cached is not None:
+            return json.loads(cached)
+        data = fetch()
+        self.set(key, json.dumps(data).encode(), self.ttl_for(end))
+        return data
+
+    async def get_or_fetch_async(self, method: str, url: str, body: Optional[dict], end: Union[str, date, datetime],
+                                 fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """ Async variant of get_or_fetch, fetch returns awaitable.
+        """
+        key = self.make_key(method, url, body)
+        cached = self.get(key)
+        if cached is not None:
+            return json.loads(cached)
+        data = await fetch()
+        self.set(key, json.dumps(data).encode(), self.ttl_for(end))
+        return data
+
+    def set(self, key: str, data: bytes, ttl: float):
+        path = self._path(key)
+        tmp_path = self.cache_dir / f'{key}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(json.dumps({'expires_at': time.time() + ttl}).encode() + b'\n')
+            f.write(data)
+        size = os.path.getsize(tmp_path)
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan()[1]
+            self._size += size - self._file_size(path)
+            os.replace(tmp_path, path)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    @staticmethod
+    def _file_size(path: Path) -> int:
+        try:
+            return path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def _remove(self, path: Path):
+        with self._lock:
+            size = self._file_size(path)
+            path.unlink(missing_ok=True)
+            if self._size is not None:
+                self._size -= size
+
+    def _scan(self) -> tuple:
+        """ Returns (entries as (mtime, size, path), total size) of cache directory. Call with _lock held.
+        """
+        entries = []
+        for path in self.cache_dir.iterdir():
+            if path.suffix == '.tmp':
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries, sum(size for _, size, _ in entries)
+
+    def _evict(self):
+        """ Removes least recently used entries until total size drops to EVICT_TARGET of max_bytes. Size is
+        recomputed from directory, so changes made by other processes are taken into account. Call with _lock held.
+        """
+        entries, total = self._scan()
+        target = self.max_bytes * EVICT_TARGET
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+        self._size = total
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,179 @@
+from queue import Queue, Empty
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import threading
+import time
+import logging
+
+# marks end of input of one worker
+_DONE = object()
+
+
+class Stage:
+    """ Step of StagePipeline: worker threads take items from bounded input queue and pass them to handler.
+    Items returned by handler are put to input queue of the next stage, which blocks the worker while the queue
+    is full (backpressure), so at most queue_size items wait between two stages.
+
+    With batch_size the handler gets lists of up to batch_size items. Batch is handed over once it is full,
+    when no new item arrives within flush_interval seconds or when input ends.
+    """
+    def __init__(self, name: str, handler: Callable[[Any], Optional[Iterable]], workers: int = 1,
+                 queue_size: int = 16, batch_size: Optional[int] = None, flush_interval: float = 1.0, logger=None):
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.queue: Queue = Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+        self.next_stage: Optional['Stage'] = None
+
+        self.items = 0
+        self.emitted = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.blocked_seconds = 0.0
+        self.max_queue_depth = 0
+        self._started_at: Optional[float] = None
+        self._finished_at: Optional[float] = None
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    def put(self, item):
+        self.queue.put(item)
+        depth = self.queue.qsize()
+        with self._lock:
+            self.max_queue_depth = max(self.max_queue_depth, depth)
+
+    def start(self):
+        self._started_at = time.monotonic()
+        self._threads = [
+            threading.Thread(target=self._work, name=f'stage-{self.name}-{i}', daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def close(self):
+        """ Ends input and waits until all queued items are processed.
+        """
+        for _ in self._threads:
+            self.queue.put(_DONE)
+        for thread in self._threads:
+            thread.join()
+        self._finished_at = time.monotonic()
+
+    def _next_item(self) -> tuple:
+        """ Returns (item or batch, done), where done is set when end of input was reached. Item is _DONE when
+        there is nothing left to process.
+        """
+        item = self.queue.get()
+        if item is _DONE or self.batch_size is None:
+            return item, item is _DONE
+
+        batch = [item]
+        while len(batch) < self.batch_size:
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except Empty:
+                break
+            if item is _DONE:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _process(self, item):
+        started = time.monotonic()
+        try:
+            outputs = list(self.handler(item) or [])
+        except Exception as e:
+            outputs = []
+            self.logger.error(f'Stage {self.name} failed: {e}')
+            with self._lock:
+                self.failed += 1
+        finished = time.monotonic()
+
+        if self.next_stage is not None:
+            for output in outputs:
+                self.next_stage.put(output)
+
+        with self._lock:
+            self.items += len(item) if self.batch_size is not None else 1
+            self.emitted += len(outputs)
+            self.busy_seconds += finished - started
+            self.blocked_seconds += time.monotonic() - finished
+
+    def _work(self):
+        done = False
+        while not done:
+            item, done = self._next_item()
+            if item is not _DONE:
+                self._process(item)
+
+    def stats(self) -> dict:
+        end = self._finished_at or time.monotonic()
+        elapsed = max(end - self._started_at, 1e-9) if self._started_at is not None else 0.0
+        with self._lock:
+            return {
+                'items': self.items,
+                'emitted': self.emitted,
+                'failed': self.failed,
+                'queue_depth': self.queue.qsize(),
+                'max_queue_depth': self.max_queue_depth,
+                'items_per_s': round(self.items / elapsed, 3) if elapsed else 0.0,
+                'utilization': round(self.busy_seconds / (elapsed * self.workers), 3) if elapsed else 0.0,
+                'blocked_seconds': round(self.blocked_seconds, 3),
+            }
+
+
+class StagePipeline:
+    """ Chain of stages connected by bounded queues, each stage runs its own worker threads.
+
+    Items are fed to the first stage with put(). On exit (or join()) stages are closed one by one from the first,
+    so every item is processed before the next stage ends. Stats of all stages can be logged periodically with
+    log_interval, stage with the highest utilization and the fullest input queue is the bottleneck.
+    """
+    def __init__(self, stages: List[Stage], log_interval: Optional[float] = None, logger=None):
+        self.stages = stages
+        for stage, next_stage in zip(stages, stages[1:]):
+            stage.next_stage = next_stage
+        self.log_interval = log_interval
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+        self._stop = threading.Event()
+        self._monitor: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.join()
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+        if self.log_interval:
+            self._stop.clear()
+            self._monitor = threading.Thread(target=self._log_loop, name='stage-monitor', daemon=True)
+            self._monitor.start()
+
+    def put(self, item):
+        self.stages[0].put(item)
+
+    def join(self):
+        for stage in self.stages:
+            stage.close()
+        self._stop.set()
+        if self._monitor is not None:
+            self._monitor.join()
+            self._monitor = None
+
+    def stats(self) -> Dict[str, dict]:
+        return {stage.name: stage.stats() for stage in self.stages}
+
+    def log_stats(self):
+        for name, stats in self.stats().items():
+            self.logger.info(f'Stage {name} | {stats}')
+
+    def _log_loop(self):
+        while not self._stop.wait(self.log_interval):
+            self.log_stats()
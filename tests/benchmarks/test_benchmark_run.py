@@ -0,0 +1,48 @@
+import json
+
+import pytest
+
+from benchmarks.run import main, make_locations
+
+
+def test_make_locations():
+    locations = make_locations(5, size=0.1)
+
+    assert len(locations) == 5
+    assert len({location['name'] for location in locations}) == 5
+    coords = locations[1]['coordinates']
+    assert coords['max_lat'] - coords['min_lat'] == pytest.approx(0.1)
+    assert coords['min_lon'] == pytest.approx(locations[0]['coordinates']['min_lon'] + 0.2)
+
+
+def test_benchmark_run(tmp_path):
+    output = tmp_path / 'result.json'
+
+    report = main(['--locations', '2', '--days', '2', '--latency-ms', '0', '--image-size', '64',
+                   '--output', str(output)])
+
+    assert json.loads(output.read_text()) == report
+    sentinel = report['results']['sentinel']
+    assert sentinel['db_rows'] == {'satellite_images_metadata': 4}
+    assert sentinel['requests'] > 0 and sentinel['bytes'] > 0
+    assert sentinel['stages']['download']['failed'] == 0
+    open_meteo = report['results']['open_meteo']
+    assert open_meteo['db_rows']['weather_hourly'] == 2 * 3 * 24
+    assert open_meteo['peak_rss_mb'] > 0
+
+
+def test_benchmark_run_multi_date(tmp_path):
+    report = main(['--locations', '1', '--days', '4', '--latency-ms', '0', '--image-size', '32',
+                   '--pipelines', 'sentinel', '--set', 'multi_date={"max_dates": 3}',
+                   '--output', str(tmp_path / 'result.json')])
+
+    sentinel = report['results']['sentinel']
+    assert sentinel['db_rows'] == {'satellite_images_metadata': 4}
+    assert sentinel['stages']['download']['items'] == 2
+
+
+def test_benchmark_run_reports_failed_pipeline(tmp_path):
+    report = main(['--locations', '1', '--days', '1', '--pipelines', 'sentinel', '--timeout', '60',
+                   '--set', 'output_profile="unknown"', '--output', str(tmp_path / 'result.json')])
+
+    assert 'Unknown output profile unknown' in report['results']['sentinel']['error']
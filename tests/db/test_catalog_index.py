@@ -0,0 +1,155 @@
+from unittest.mock import MagicMock, patch
+from datetime import datetime, timedelta, timezone
+import pytest
+from sqlalchemy import create_engine
+
+from src.db.catalog_index import CatalogIndex
+from src.db.pg_data_models import SentinelCatalogItem, SentinelCatalogSync
+from src.extractors.sentinel_catalog import collapse_acquisitions, feature_acquisition
+from src.utils.common_utils import get_iso_datetime_format
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine('sqlite://')
+    SentinelCatalogItem.__table__.create(engine)
+    SentinelCatalogSync.__table__.create(engine)
+    return engine
+
+
+@pytest.fixture
+def coords():
+    return {
+        'min_lat': 0.0,
+        'min_lon': 0.0,
+        'max_lat': 1.0,
+        'max_lon': 1.0
+    }
+
+
+def feature(feature_id, iso_datetime, cloud_cover=10.0, relative_orbit=None):
+    properties = {'datetime': iso_datetime, 'eo:cloud_cover': cloud_cover, 'platform': 'sentinel-2a'}
+    if relative_orbit is not None:
+        properties['sat:relative_orbit'] = relative_orbit
+    return {'id': feature_id, 'properties': properties}
+
+
+def test_sync_queries_only_missing_ranges(engine, coords):
+    extractor = MagicMock()
+    extractor.search_catalog.side_effect = [
+        [feature('a', '2025-01-02T10:00:00.024Z'), feature('b', '2025-01-04T10:00:00.024Z')],
+        [feature('b', '2025-01-04T10:00:00.024Z'), feature('c', '2025-01-06T10:00:00.024Z')],
+    ]
+    index = CatalogIndex(engine, 'sentinel-2-l2a', coords, MagicMock(), settle_time=timedelta(0))
+
+    dates = index.sync(extractor, datetime(2025, 1, 1), datetime(2025, 1, 5))
+    assert dates == ['2025-01-02T10:00:00.024Z', '2025-01-04T10:00:00.024Z']
+
+    dates = index.sync(extractor, datetime(2025, 1, 3), datetime(2025, 1, 7))
+    assert dates == ['2025-01-04T10:00:00.024Z', '2025-01-06T10:00:00.024Z']
+    assert extractor.search_catalog.call_args_list[1].args == ('2025-01-05T00:00:00.000000Z',
+                                                               '2025-01-07T00:00:00.000000Z')
+
+    dates = index.sync(extractor, datetime(2025, 1, 1), datetime(2025, 1, 7))
+    assert len(dates) == 3
+    assert extractor.search_catalog.call_count == 2
+
+
+def test_missing_ranges_before_and_after(engine, coords):
+    index = CatalogIndex(engine, 'sentinel-2-l2a', coords, MagicMock(), settle_time=timedelta(0))
+    index.mark_synced(datetime(2025, 1, 3), datetime(2025, 1, 5))
+
+    assert index.missing_ranges(datetime(2025, 1, 1), datetime(2025, 1, 7)) == [
+        (datetime(2025, 1, 1), datetime(2025, 1, 3)),
+        (datetime(2025, 1, 5), datetime(2025, 1, 7)),
+    ]
+    assert index.missing_ranges(datetime(2025, 1, 3), datetime(2025, 1, 4)) == []
+
+
+def test_mark_synced_respects_settle_time(engine, coords):
+    index = CatalogIndex(engine, 'sentinel-2-l2a', coords, MagicMock(), settle_time=timedelta(days=1))
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    index.mark_synced(now - timedelta(hours=6), now)
+
+    assert index.missing_ranges(now - timedelta(hours=6), now) == [(now - timedelta(hours=6), now)]
+
+
+def test_index_separates_bboxes(engine, coords):
+    other_coords = {**coords, 'max_lat': 2.0}
+    index = CatalogIndex(engine, 'sentinel-2-l2a', coords, MagicMock(), settle_time=timedelta(0))
+    other_index = CatalogIndex(engine, 'sentinel-2-l2a', other_coords, MagicMock(), settle_time=timedelta(0))
+
+    assert index.add_features([feature('a', '2025-01-02T10:00:00Z')]) == 1
+    assert index.add_features([feature('a', '2025-01-02T10:00:00Z')]) == 0
+
+    assert index.get_dates(datetime(2025, 1, 1), datetime(2025, 1, 3)) == ['2025-01-02T10:00:00Z']
+    assert other_index.get_dates(datetime(2025, 1, 1), datetime(2025, 1, 3)) == []
+
+
+def test_sync_filters_cloud_cover_and_collapses_per_day(engine, coords):
+    extractor = MagicMock()
+    extractor.search_catalog.return_value = [
+        feature('a', '2025-01-02T10:00:00.024Z', cloud_cover=5.0),
+        feature('b', '2025-01-02T10:00:03.024Z', cloud_cover=5.0),
+        feature('c', '2025-01-04T10:00:00.024Z', cloud_cover=80.0),
+    ]
+    index = CatalogIndex(engine, 'sentinel-2-l2a', coords, MagicMock(), settle_time=timedelta(0))
+
+    dates = index.sync(extractor, datetime(2025, 1, 1), datetime(2025, 1, 5), max_cloud_cover=20)
+
+    assert dates == ['2025-01-02T10:00:00.024Z']
+    assert extractor.search_catalog.call_args.kwargs == {'cloud_filter': False}
+    assert len(index.get_dates(datetime(2025, 1, 1), datetime(2025, 1, 5))) == 3
+
+
+def test_back_to_back_daily_runs(engine, coords):
+    extractor = MagicMock()
+    extractor.search_catalog.return_value = []
+    index = CatalogIndex(engine, 'sentinel-2-l2a', coords, MagicMock(), settle_time=timedelta(hours=6))
+    day = datetime(2025, 1, 10, 12)
+
+    for run in range(3):
+        now = day + timedelta(days=run)
+        with patch.object(CatalogIndex, '_now', return_value=now):
+            index.sync(extractor, now - timedelta(days=1), now)
+
+    # every run queries its day plus unsettled tail of the previous run
+    assert [call.args for call in extractor.search_catalog.call_args_list] == [
+        (get_iso_datetime_format(start), get_iso_datetime_format(end)) for start, end in [
+            (day - timedelta(days=1), day),
+            (day - timedelta(hours=6), day + timedelta(days=1)),
+            (day + timedelta(hours=18), day + timedelta(days=2)),
+        ]
+    ]
+
+    # longer window is served from index except the unsettled tail
+    now = day + timedelta(days=2)
+    with patch.object(CatalogIndex, '_now', return_value=now):
+        assert index.missing_ranges(now - timedelta(days=3), now) == [(now - timedelta(hours=6), now)]
+
+
+def test_disjoint_newer_range_replaces_interval(engine, coords):
+    index = CatalogIndex(engine, 'sentinel-2-l2a', coords, MagicMock(), settle_time=timedelta(0))
+    index.mark_synced(datetime(2025, 1, 1), datetime(2025, 1, 3))
+
+    assert index.missing_ranges(datetime(2025, 1, 10), datetime(2025, 1, 11)) == [
+        (datetime(2025, 1, 10), datetime(2025, 1, 11))]
+    index.mark_synced(datetime(2025, 1, 10), datetime(2025, 1, 11))
+    assert index.missing_ranges(datetime(2025, 1, 10), datetime(2025, 1, 11)) == []
+
+
+def test_sync_collapses_per_orbit_as_api(engine, coords):
+    features = [
+        feature('a', '2025-01-02T10:00:00.024Z', relative_orbit=22),
+        feature('b', '2025-01-02T10:00:03.024Z', relative_orbit=22),
+        feature('c', '2025-01-02T10:10:00.024Z', relative_orbit=65),
+    ]
+    extractor = MagicMock()
+    extractor.search_catalog.return_value = features
+    index = CatalogIndex(engine, 'sentinel-2-l2a', coords, MagicMock(), settle_time=timedelta(0))
+
+    dates = index.sync(extractor, datetime(2025, 1, 1), datetime(2025, 1, 5))
+
+    assert dates == collapse_acquisitions(feature_acquisition(feat) for feat in features)
+    assert dates == ['2025-01-02T10:00:00.024Z', '2025-01-02T10:10:00.024Z']
@@ -0,0 +1,109 @@
+from unittest.mock import patch, MagicMock
+import pytest
+from minio.error import S3Error
+
+from src.db.minio_storage import MinioStorage, save_to_minio
+
+
+@pytest.fixture
+def creds():
+    return {
+        'endpoint': 'localhost:9000',
+        'access_key': 'xxx',
+        'secret_key': 'yyy'
+    }
+
+
+@pytest.fixture(autouse=True)
+def reset_storage():
+    MinioStorage.reset()
+    yield
+    MinioStorage.reset()
+
+
+@patch('src.db.minio_storage.Minio')
+def test_client_is_shared(mock_minio, creds):
+    first = MinioStorage(creds)
+    second = MinioStorage(creds)
+
+    assert first.client is second.client
+    mock_minio.assert_called_once_with(endpoint='localhost:9000', access_key='xxx', secret_key='yyy', secure=False)
+
+
+@patch('src.db.minio_storage.Minio')
+def test_bucket_checked_once(mock_minio, creds):
+    client = mock_minio.return_value
+    client.bucket_exists.return_value = False
+
+    storage = MinioStorage(creds)
+    assert storage.upload('bucket', 'a.tiff', b'image-bytes', 'image/tiff')
+    assert MinioStorage(creds).upload('bucket', 'b.tiff', b'image-bytes', 'image/tiff')
+
+    client.bucket_exists.assert_called_once_with('bucket')
+    client.make_bucket.assert_called_once_with('bucket')
+    assert client.put_object.call_count == 2
+
+    args = client.put_object.call_args[0]
+    assert args[0] == 'bucket'
+    assert args[1] == 'b.tiff'
+    assert args[3] == len(b'image-bytes')
+
+
+@patch('src.db.minio_storage.Minio')
+def test_bucket_error_not_memoized(mock_minio, creds):
+    client = mock_minio.return_value
+    client.bucket_exists.side_effect = [S3Error('code', 'msg', 'res', 'req', 'host', MagicMock()), True]
+
+    storage = MinioStorage(creds, MagicMock())
+
+    assert not storage.upload('bucket', 'a.tiff', b'image-bytes', 'image/tiff')
+    assert storage.upload('bucket', 'a.tiff', b'image-bytes', 'image/tiff')
+    assert client.bucket_exists.call_count == 2
+    client.put_object.assert_called_once()
+
+
+@patch('src.db.minio_storage.Minio')
+def test_upload_many(mock_minio, creds):
+    client = mock_minio.return_value
+    client.bucket_exists.return_value = True
+
+    objects = [(f'{i}.tiff', b'image-bytes', 'image/tiff') for i in range(3)]
+    uploaded = MinioStorage(creds).upload_many('bucket', objects)
+
+    assert uploaded == 3
+    client.bucket_exists.assert_called_once()
+    assert client.put_object.call_count == 3
+
+
+@patch('src.db.minio_storage.Minio')
+def test_save_to_minio(mock_minio, creds):
+    client = mock_minio.return_value
+    client.bucket_exists.return_value = True
+
+    save_to_minio(creds, 'bucket', 'a.tiff', b'image-bytes', 'image/tiff')
+
+    client.put_object.assert_called_once()
+
+
+@patch('src.db.minio_storage.Minio')
+def test_upload_stream(mock_minio, creds):
+    client = mock_minio.return_value
+    client.bucket_exists.return_value = True
+    stream = MagicMock()
+
+    assert MinioStorage(creds).upload_stream('bucket', 'a.tiff', stream, 'image/tiff', part_size=1)
+
+    client.put_object.assert_called_once_with('bucket', 'a.tiff', stream, -1, 'image/tiff',
+                                              part_size=5 * 1024 * 1024)
+
+
+@patch('src.db.minio_storage.Minio')
+def test_download(mock_minio, creds):
+    client = mock_minio.return_value
+    client.fget_object.side_effect = [None, S3Error('code', 'msg', 'res', 'req', 'host', MagicMock())]
+
+    storage = MinioStorage(creds, MagicMock())
+
+    assert storage.download('bucket', 'a.tiff', '/tmp/a.tiff')
+    assert not storage.download('bucket', 'b.tiff', '/tmp/b.tiff')
+    client.fget_object.assert_any_call('bucket', 'a.tiff', '/tmp/a.tiff')
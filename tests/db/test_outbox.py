@@ -0,0 +1,138 @@
+from unittest.mock import MagicMock
+from datetime import datetime
+import sqlite3
+import pytest
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from src.db.outbox import Outbox, OutboxFlusher
+from src.db.pg_data_models import SatelliteImageMetadata, SatelliteIndexStats, WeatherHourly
+
+
+def metadata_row(image_path):
+    return {'location_name': 'loc', 'image_date': datetime(2025, 1, 1, 10, 0, 0, 24000), 'min_lat': 0.0,
+            'min_lon': 0.0, 'max_lat': 1.0, 'max_lon': 1.0, 'image_path': image_path, 'product': 'bands'}
+
+
+def test_flush_writes_batches_per_table(tmp_path):
+    outbox = Outbox(tmp_path / 'outbox.sqlite', batch_size=2)
+    outbox.append(SatelliteImageMetadata, [metadata_row('a.tiff'), metadata_row('b.tiff'), metadata_row('c.tiff')])
+    outbox.append(WeatherHourly, [{'location_name': 'loc', 'latitude': 0.0, 'longitude': 1.0,
+                                   'timestamp': datetime(2025, 1, 1), 'temperature_2m': None}])
+    postgre_saver = MagicMock()
+
+    assert outbox.flush(postgre_saver) == 4
+    assert outbox.pending() == 0
+
+    calls = [(call.args[1], [row.get('image_path') for row in call.args[2]])
+             for call in postgre_saver.bulk_save.call_args_list]
+    assert calls == [
+        (SatelliteImageMetadata, ['a.tiff', 'b.tiff']),
+        (SatelliteImageMetadata, ['c.tiff']),
+        (WeatherHourly, [None]),
+    ]
+    assert postgre_saver.bulk_save.call_args_list[0].args[2][0] == metadata_row('a.tiff')
+
+
+def test_failed_flush_keeps_rows_for_replay(tmp_path):
+    path = tmp_path / 'outbox.sqlite'
+    outbox = Outbox(path)
+    outbox.append(SatelliteImageMetadata, [metadata_row('a.tiff')])
+    postgre_saver = MagicMock()
+    postgre_saver.bulk_save.side_effect = OperationalError('INSERT', {}, Exception('connection refused'))
+
+    assert outbox.flush(postgre_saver) == 0
+    outbox.close()
+
+    # next run replays rows left by the failed one
+    with Outbox(path) as outbox:
+        postgre_saver = MagicMock()
+        assert outbox.pending() == 1
+        assert outbox.flush(postgre_saver) == 1
+        assert postgre_saver.bulk_save.call_args.args[2] == [metadata_row('a.tiff')]
+
+
+def test_rejected_batch_moves_to_dead_letter(tmp_path):
+    outbox = Outbox(tmp_path / 'outbox.sqlite', batch_size=1)
+    outbox.append(SatelliteImageMetadata, [metadata_row('bad.tiff'), metadata_row('good.tiff')])
+    postgre_saver = MagicMock()
+    postgre_saver.bulk_save.side_effect = [IntegrityError('INSERT', {}, Exception('null value')), (1, 0)]
+
+    assert outbox.flush(postgre_saver) == 1
+    assert outbox.pending() == 0
+    assert outbox.dead_letters() == 1
+    assert postgre_saver.bulk_save.call_args.args[2] == [metadata_row('good.tiff')]
+
+
+def test_rejected_batch_is_split_to_failing_rows(tmp_path):
+    outbox = Outbox(tmp_path / 'outbox.sqlite')
+    outbox.append(SatelliteImageMetadata, [metadata_row(f'{i}.tiff') for i in range(5)] + [metadata_row('bad.tiff')])
+    postgre_saver = MagicMock()
+    saved = []
+
+    def bulk_save(db_name, model, rows):
+        if any(row['image_path'] == 'bad.tiff' for row in rows):
+            raise IntegrityError('INSERT', {}, Exception('null value'))
+        saved.extend(row['image_path'] for row in rows)
+
+    postgre_saver.bulk_save.side_effect = bulk_save
+
+    assert outbox.flush(postgre_saver) == 5
+    assert sorted(saved) == [f'{i}.tiff' for i in range(5)]
+    assert outbox.pending() == 0
+    assert outbox.dead_letters() == 1
+
+
+def test_failed_append_stores_no_rows(tmp_path):
+    path = tmp_path / 'outbox.sqlite'
+    outbox = Outbox(path)
+    outbox.pending()
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TRIGGER reject BEFORE INSERT ON outbox WHEN NEW.payload LIKE '%bad.tiff%' "
+                     "BEGIN SELECT RAISE(ABORT, 'rejected'); END")
+
+    with pytest.raises(sqlite3.IntegrityError):
+        outbox.append(SatelliteImageMetadata, [metadata_row('a.tiff'), metadata_row('bad.tiff')])
+    assert outbox.pending() == 0
+
+
+def test_dead_letter_move_can_be_repeated(tmp_path):
+    path = tmp_path / 'outbox.sqlite'
+    outbox = Outbox(path)
+    outbox.append(SatelliteImageMetadata, [metadata_row('bad.tiff')])
+    # row copied to dead_letter but not deleted from outbox by interrupted run
+    with sqlite3.connect(path) as conn:
+        conn.execute("INSERT INTO dead_letter SELECT id, table_name, payload, 'error', 'now' FROM outbox")
+    postgre_saver = MagicMock()
+    postgre_saver.bulk_save.side_effect = IntegrityError('INSERT', {}, Exception('null value'))
+
+    assert outbox.flush(postgre_saver) == 0
+    assert outbox.pending() == 0
+    assert outbox.dead_letters() == 1
+
+
+def test_outbox_reopens_after_close(tmp_path):
+    outbox = Outbox(tmp_path / 'outbox.sqlite')
+    with outbox:
+        outbox.append(SatelliteImageMetadata, [metadata_row('a.tiff')])
+
+    assert outbox.pending() == 1
+    outbox.close()
+
+
+def test_flusher_replays_on_start_and_flushes_on_exit(tmp_path):
+    outbox = Outbox(tmp_path / 'outbox.sqlite', flush_interval=60)
+    outbox.append(SatelliteImageMetadata, [metadata_row('old.tiff')])
+    postgre_saver = MagicMock()
+
+    with OutboxFlusher(outbox, postgre_saver):
+        assert postgre_saver.bulk_save.call_count == 1
+        outbox.append(SatelliteImageMetadata, [metadata_row('new.tiff')])
+
+    assert postgre_saver.bulk_save.call_count == 2
+    assert outbox.pending() == 0
+
+
+def test_append_rejects_unsupported_table(tmp_path):
+    outbox = Outbox(tmp_path / 'outbox.sqlite')
+    with pytest.raises(ValueError):
+        outbox.append(SatelliteIndexStats, [{'index_name': 'ndvi'}])
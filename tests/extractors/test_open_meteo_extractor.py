@@ -1,5 +1,9 @@
-from unittest.mock import patch, MagicMock
-from src.extractors.open_meteo import OpenMeteoExtractor
+import asyncio
+from unittest.mock import patch, MagicMock, AsyncMock
+import pytest
+
+from src.extractors.open_meteo import OpenMeteoExtractor, OpenMeteoBatchExtractor, get_grid_points
+from src.utils.response_cache import ResponseCache
 
 
 @patch('src.extractors.open_meteo.requests.get')
@@ -42,3 +46,90 @@ def test_get_mean_coords():
 
     assert mean_lat == 0.5
     assert mean_lon == 0.5
+
+
+def test_get_history_data_async():
+    coords = {
+        "min_lat": 0.0,
+        "min_lon": 0.0,
+        "max_lat": 1.0,
+        "max_lon": 1.0
+    }
+    client = MagicMock()
+    client.get_json = AsyncMock(return_value={"key": "value"})
+
+    correct_url = ('https://api.open-meteo.com/v1/forecast?latitude=0.5&longitude=0.5'
+                   '&hourly=var1,var2&start_date=2025-01-01&end_date=2025-01-02')
+
+    logger = MagicMock()
+    extractor = OpenMeteoExtractor(coords, logger)
+    weather_data = asyncio.run(
+        extractor.get_history_data_async(client, 'hourly', '2025-01-01', '2025-01-02', ['var1', 'var2']))
+
+    client.get_json.assert_awaited_once_with(correct_url)
+    assert weather_data == {"key": "value"}
+
+
+@patch('src.extractors.open_meteo.requests.get')
+def test_batch_get_history_data(mock_get):
+    mock_get.side_effect = [
+        MagicMock(content=b'[{"latitude": 0.5}, {"latitude": 1.5}]'),
+        MagicMock(content=b'{"latitude": 2.5}'),
+    ]
+    points = [(0.5, 0.5), (1.5, 1.5), (2.5, 2.5)]
+
+    extractor = OpenMeteoBatchExtractor(MagicMock(), batch_size=2)
+    weather_data = extractor.get_history_data(points, 'hourly', '2025-01-01', '2025-01-02', ['var1', 'var2'])
+
+    assert weather_data == [{"latitude": 0.5}, {"latitude": 1.5}, {"latitude": 2.5}]
+    assert mock_get.call_args_list[0].args[0] == (
+        'https://api.open-meteo.com/v1/forecast?latitude=0.5,1.5&longitude=0.5,1.5'
+        '&hourly=var1,var2&start_date=2025-01-01&end_date=2025-01-02')
+
+
+@patch('src.extractors.open_meteo.requests.get')
+def test_batch_get_history_data_result_mismatch(mock_get):
+    mock_get.return_value.content = b'[{"latitude": 0.5}]'
+
+    extractor = OpenMeteoBatchExtractor(MagicMock(), batch_size=2)
+    with pytest.raises(ValueError):
+        extractor.get_history_data([(0.5, 0.5), (1.5, 1.5)], 'hourly', '2025-01-01', '2025-01-02', ['var1'])
+
+
+def test_batch_get_history_data_async():
+    client = MagicMock()
+    client.get_json = AsyncMock(side_effect=[[{"latitude": 0.5}, {"latitude": 1.5}], {"latitude": 2.5}])
+    points = [(0.5, 0.5), (1.5, 1.5), (2.5, 2.5)]
+
+    extractor = OpenMeteoBatchExtractor(MagicMock(), batch_size=2)
+    weather_data = asyncio.run(
+        extractor.get_history_data_async(client, points, 'hourly', '2025-01-01', '2025-01-02', ['var1']))
+
+    assert [data['latitude'] for data in weather_data] == [0.5, 1.5, 2.5]
+    assert client.get_json.await_count == 2
+
+
+def test_get_grid_points():
+    coords = {
+        "min_lat": 0.0,
+        "min_lon": 0.0,
+        "max_lat": 1.0,
+        "max_lon": 2.0
+    }
+
+    assert get_grid_points(coords) == [(0.5, 1.0)]
+    assert get_grid_points(coords, spacing=1.0) == [(0.5, 0.5), (0.5, 1.5)]
+
+
+@patch('src.extractors.open_meteo.requests.get')
+def test_batch_get_history_data_cached(mock_get, tmp_path):
+    mock_get.return_value.content = b'{"latitude": 0.5}'
+    cache = ResponseCache(tmp_path)
+
+    extractor = OpenMeteoBatchExtractor(MagicMock(), cache=cache)
+    first = extractor.get_history_data([(0.5, 0.5)], 'hourly', '2025-01-01', '2025-01-02', ['var1'])
+    second = extractor.get_history_data([(0.5, 0.5)], 'hourly', '2025-01-01', '2025-01-02', ['var1'])
+
+    mock_get.assert_called_once()
+    assert first == second == [{"latitude": 0.5}]
+    assert cache.stats() == {'hits': 1, 'misses': 1}
@@ -1,5 +1,6 @@
 import pytest
-from unittest.mock import MagicMock, patch
+import asyncio
+from unittest.mock import MagicMock, AsyncMock, patch
 from datetime import datetime
 
 from src.extractors.open_meteo import OpenMeteoPipeline
@@ -77,15 +78,127 @@ def test_validate_config_params_correct_config(config):
 @patch('src.utils.common_utils.date_string_format')
 @patch('src.extractors.sentinel_hub.CredentialManager.get_pg_credentials'
     , return_value={'hostname': 'localhost', 'username': 'xxx', 'password': 'yyy'})
-@patch('src.db.pg_database.PostgreSaver.save')
-def test_open_meteo_pipeline(mock_pg_save, mock_get_pg_credentials,  mock_date_string_format, mock_get_date_range
+@patch('src.db.pg_database.PostgreSaver.get_weather_timestamps', return_value={})
+@patch('src.db.pg_database.PostgreSaver.bulk_save', return_value=(2, 0))
+def test_open_meteo_pipeline(mock_pg_bulk_save, mock_get_weather_timestamps, mock_get_pg_credentials,  mock_date_string_format, mock_get_date_range
                              , config, weather_data):
     mock_date_string_format.side_effect = ['2025-01-01', '2025-01-02']
 
-    with patch('src.extractors.open_meteo.OpenMeteoExtractor.get_history_data', return_value=weather_data):
+    with patch('src.extractors.open_meteo.OpenMeteoBatchExtractor.get_history_data', return_value=[weather_data]):
         pipeline = OpenMeteoPipeline(config)
         pipeline.run()
 
-    mock_pg_save.assert_called()
+    mock_pg_bulk_save.assert_called_once()
 
-    assert mock_pg_save.call_count == 2
+    args, kwargs = mock_pg_bulk_save.call_args
+    rows = args[2]
+    assert len(rows) == 2
+    assert rows[1]['temperature_2m'] == 18.0
+    assert 'rain' not in rows[1]
+
+
+@patch('src.extractors.sentinel_hub.CredentialManager.get_pg_credentials'
+    , return_value={'hostname': 'localhost', 'username': 'xxx', 'password': 'yyy'})
+@patch('src.db.pg_database.PostgreSaver.get_weather_timestamps', return_value={})
+@patch('src.db.pg_database.PostgreSaver.bulk_save', return_value=(2, 0))
+def test_open_meteo_pipeline_async(mock_pg_bulk_save, mock_get_weather_timestamps, mock_get_pg_credentials, config, weather_data):
+    client = MagicMock()
+    client.get_json = AsyncMock(return_value=weather_data)
+
+    pipeline = OpenMeteoPipeline(config)
+    asyncio.run(pipeline.run_async(client=client))
+
+    client.get_json.assert_awaited_once()
+    mock_pg_bulk_save.assert_called_once()
+    assert len(mock_pg_bulk_save.call_args[0][2]) == 2
+
+
+@patch('src.extractors.sentinel_hub.CredentialManager.get_pg_credentials'
+    , return_value={'hostname': 'localhost', 'username': 'xxx', 'password': 'yyy'})
+@patch('src.db.pg_database.PostgreSaver.get_weather_timestamps', return_value={})
+@patch('src.db.pg_database.PostgreSaver.bulk_save', return_value=(2, 0))
+def test_open_meteo_pipeline_multiple_locations(mock_pg_bulk_save, mock_get_weather_timestamps, mock_get_pg_credentials, config, weather_data):
+    location = config.pop('location')
+    config['locations'] = [
+        location,
+        {'name': 'Town', 'coordinates': {'min_lon': 2.0, 'min_lat': 2.0, 'max_lon': 3.0, 'max_lat': 3.0}},
+        {'name': 'Broken', 'coordinates': {'min_lon': 4.0, 'min_lat': 4.0, 'max_lon': 5.0, 'max_lat': 5.0}},
+    ]
+
+    def get_history_data(points, frequency, start_date, end_date, variables):
+        if (4.5, 4.5) in points:
+            raise RuntimeError('API down')
+        return [weather_data] * len(points)
+
+    config['weather_batch_size'] = 2
+    pipeline = OpenMeteoPipeline(config)
+    pipeline.extractor.get_history_data = MagicMock(side_effect=get_history_data)
+    pipeline.run(max_workers=2)
+
+    assert pipeline.extractor.get_history_data.call_count == 2
+    assert mock_pg_bulk_save.call_count == 2
+    saved_locations = sorted((call.args[2][0]['location_name'], call.args[2][0]['latitude'])
+                             for call in mock_pg_bulk_save.call_args_list)
+    assert saved_locations == [('City', 0.5), ('Town', 2.5)]
+
+
+def test_validate_config_params_locations(config):
+    location = config.pop('location')
+    config['locations'] = [location, {'name': 'Town', 'coordinates': {'min_lon': 2.0}}]
+
+    with pytest.raises(KeyError) as excinfo:
+        OpenMeteoPipeline(config)
+
+    assert 'Missing coordinate key' in str(excinfo.value)
+
+
+def test_validate_config_params_weather_schema(config):
+    config['weather_schema'] = {'temperature_2m': 'temp_2m'}
+
+    with pytest.raises(ValueError) as excinfo:
+        OpenMeteoPipeline(config)
+
+    assert 'temp_2m' in str(excinfo.value)
+
+
+@patch('src.extractors.sentinel_hub.CredentialManager.get_pg_credentials'
+    , return_value={'hostname': 'localhost', 'username': 'xxx', 'password': 'yyy'})
+@patch('src.extractors.open_meteo.datetime')
+@patch('src.db.pg_database.PostgreSaver.get_weather_timestamps')
+@patch('src.db.pg_database.PostgreSaver.bulk_save', return_value=(2, 0))
+def test_open_meteo_pipeline_requests_only_gaps(mock_pg_bulk_save, mock_get_weather_timestamps, mock_datetime,
+                                                mock_get_pg_credentials, config, weather_data):
+    mock_datetime.today.return_value = datetime(2025, 1, 6, 12, 0)
+    mock_datetime.combine = datetime.combine
+    config['weather_frequency'] = 'hourly'
+    stored_days = [datetime(2025, 1, day, hour) for day in (1, 2, 4) for hour in range(24)]
+    mock_get_weather_timestamps.return_value = {(0.5, 0.5): set(stored_days)}
+
+    pipeline = OpenMeteoPipeline(config)
+    pipeline.extractor.get_history_data = MagicMock(return_value=[weather_data])
+    pipeline.run(n_days=4)
+
+    args = mock_get_weather_timestamps.call_args[0]
+    assert args[2:] == (datetime(2025, 1, 1), datetime(2025, 1, 6))
+
+    requested = sorted((call.kwargs['start_date'], call.kwargs['end_date'])
+                       for call in pipeline.extractor.get_history_data.call_args_list)
+    assert requested == [('2025-01-03', '2025-01-03'), ('2025-01-05', '2025-01-05')]
+
+
+@patch('src.extractors.sentinel_hub.CredentialManager.get_pg_credentials'
+    , return_value={'hostname': 'localhost', 'username': 'xxx', 'password': 'yyy'})
+@patch('src.db.pg_database.PostgreSaver.get_weather_timestamps', return_value={})
+@patch('src.db.pg_database.PostgreSaver.bulk_save', return_value=(2, 0))
+def test_open_meteo_pipeline_outbox(mock_pg_bulk_save, mock_get_weather_timestamps, mock_get_pg_credentials, config,
+                                    weather_data, tmp_path):
+    config['outbox'] = {'path': tmp_path / 'outbox.sqlite', 'flush_interval': 60}
+
+    with patch('src.extractors.open_meteo.OpenMeteoBatchExtractor.get_history_data', return_value=[weather_data]):
+        pipeline = OpenMeteoPipeline(config)
+        pipeline.run()
+
+    mock_pg_bulk_save.assert_called_once()
+    rows = mock_pg_bulk_save.call_args[0][2]
+    assert [row['timestamp'] for row in rows] == [datetime(2025, 1, 1, 0, 0), datetime(2025, 1, 1, 0, 1)]
+    assert pipeline.outbox.pending() == 0
@@ -0,0 +1,23 @@
+from src.extractors.sentinel_catalog import cloud_cover_filter, feature_acquisition, collapse_acquisitions
+
+
+def test_cloud_cover_filter():
+    assert cloud_cover_filter(30) == {"filter": "eo:cloud_cover <= 30", "filter-lang": "cql2-text"}
+
+
+def test_feature_acquisition():
+    feature = {'properties': {'datetime': '2025-01-01T10:00:00Z', 'platform': 'sentinel-2a'}}
+    assert feature_acquisition(feature) == ('2025-01-01T10:00:00Z', 'sentinel-2a')
+
+    feature['properties']['sat:relative_orbit'] = 22
+    assert feature_acquisition(feature) == ('2025-01-01T10:00:00Z', 'sentinel-2a/22')
+
+
+def test_collapse_acquisitions_per_day_and_orbit():
+    dates = collapse_acquisitions([
+        ('2025-01-01T10:00:05Z', 'sentinel-2a'),
+        ('2025-01-01T10:00:00Z', 'sentinel-2a'),
+        ('2025-01-01T10:30:00Z', 'sentinel-2b'),
+        ('2025-01-02T10:00:00Z', 'sentinel-2a'),
+    ])
+    assert dates == ['2025-01-01T10:00:00Z', '2025-01-01T10:30:00Z', '2025-01-02T10:00:00Z']
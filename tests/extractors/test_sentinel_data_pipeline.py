@@ -1,6 +1,22 @@
+import asyncio
+import io
+import pytest
 from unittest.mock import patch, MagicMock
 import datetime
+import numpy as np
+import tifffile
+from sqlalchemy.exc import OperationalError
 from src.extractors.sentinel_hub import SentinelDataPipeline
+from src.db.pg_data_models import SatelliteImageMetadata
+
+
+def saved_rows(mock_bulk_save):
+    rows = []
+    for call in mock_bulk_save.call_args_list:
+        assert call.args[1] is SatelliteImageMetadata
+        rows.extend(call.args[2])
+    return rows
+
 
 
 @patch('src.extractors.sentinel_hub.CredentialManager.get_sentinelhub_credentials'
@@ -16,11 +32,13 @@ from src.extractors.sentinel_hub import SentinelDataPipeline
 @patch('src.extractors.sentinel_hub.SentinelImageExtractor.get_available_dates'
     , return_value=['2025-01-01T00:00:00.000000Z', '2025-01-01T00:00:00.000000Z'])
 @patch('src.extractors.sentinel_hub.SentinelImageExtractor.download_sentinel_image', return_value=b'image-bytes')
-@patch('src.extractors.sentinel_hub.save_to_minio')
-@patch('src.db.pg_database.PostgreSaver.save')
+@patch('src.extractors.sentinel_hub.MinioStorage.upload', return_value=True)
+@patch('src.db.pg_database.PostgreSaver.get_ingested_image_dates', return_value=set())
+@patch('src.db.pg_database.PostgreSaver.bulk_save', return_value=(1, 0))
 def test_data_pipeline(
-        mock_pg_save,
-        mock_save_to_minio,
+        mock_pg_bulk_save,
+        mock_get_ingested_image_dates,
+        mock_minio_upload,
         mock_download_sentinel_image,
         mock_get_available_dates,
         mock_get_iso_datetime_format,
@@ -52,8 +70,495 @@ def test_data_pipeline(
 
     mock_get_available_dates.assert_called()
     mock_download_sentinel_image.assert_called()
-    mock_save_to_minio.assert_called()
-    mock_pg_save.assert_called()
+    mock_minio_upload.assert_called()
+    mock_pg_bulk_save.assert_called()
 
     assert mock_download_sentinel_image.call_count == 2
-    assert mock_pg_save.call_count == 2
+    assert len(saved_rows(mock_pg_bulk_save)) == 2
+
+
+@patch('src.extractors.sentinel_hub.CredentialManager.get_sentinelhub_credentials'
+    , return_value={'client_id': 'xxx', 'client_secret': 'yyy'})
+@patch('src.extractors.sentinel_hub.SentinelHubAuthenticator.authenticate'
+    , return_value=({"access_token": "abc", "expires_at": 9999999999}, MagicMock()))
+@patch('src.extractors.sentinel_hub.CredentialManager.get_minio_credentials'
+    , return_value={'endpoint': 'localhost:9000', 'access_key': 'xxx', 'secret_key': 'yyy'})
+@patch('src.extractors.sentinel_hub.CredentialManager.get_pg_credentials'
+    , return_value={'hostname': 'localhost', 'username': 'xxx', 'password': 'yyy'})
+@patch('src.extractors.sentinel_hub.SentinelImageExtractor.get_available_dates'
+    , return_value=['2025-01-01T00:00:00.000000Z', '2025-01-02T00:00:00.000000Z', '2025-01-03T00:00:00.000000Z'])
+@patch('src.extractors.sentinel_hub.SentinelImageExtractor.download_sentinel_image')
+@patch('src.extractors.sentinel_hub.MinioStorage.upload', return_value=True)
+@patch('src.db.pg_database.PostgreSaver.get_ingested_image_dates', return_value=set())
+@patch('src.db.pg_database.PostgreSaver.bulk_save', return_value=(1, 0))
+def test_data_pipeline_concurrent_isolates_errors(
+        mock_pg_bulk_save,
+        mock_get_ingested_image_dates,
+        mock_minio_upload,
+        mock_download_sentinel_image,
+        mock_get_available_dates,
+        mock_get_pg_credentials,
+        mock_get_minio_credentials,
+        mock_authenticate,
+        mock_get_sentinelhub_credentials
+):
+    cfg = {
+        'location': {
+            'name': 'xxx',
+            'coordinates': {
+                'min_lon': 0.0,
+                'min_lat': 0.0,
+                'max_lon': 1.0,
+                'max_lat': 1.0
+            }
+        },
+        'sentinel_type': 'sentinel',
+        'stages': {'metadata_batch_size': 10, 'flush_interval': 10}
+    }
+
+    def download(date):
+        if date.startswith('2025-01-02'):
+            raise RuntimeError('download failed')
+        return b'image-bytes'
+
+    mock_download_sentinel_image.side_effect = download
+
+    pipeline = SentinelDataPipeline(cfg)
+    pipeline.run(n_days=3, max_workers=3)
+
+    assert mock_download_sentinel_image.call_count == 3
+    assert mock_minio_upload.call_count == 2
+    # metadata of both images is written in one batch
+    mock_pg_bulk_save.assert_called_once()
+    assert pipeline.stage_stats['download']['items'] == 3
+    assert pipeline.stage_stats['download']['emitted'] == 2
+    assert pipeline.stage_stats['metadata']['items'] == 2
+    saved_paths = sorted(row['image_path'] for row in saved_rows(mock_pg_bulk_save))
+    assert saved_paths == ['202501010000000000_xxx.tiff', '202501030000000000_xxx.tiff']
+
+
+@patch('src.extractors.sentinel_hub.CredentialManager.get_sentinelhub_credentials'
+    , return_value={'client_id': 'xxx', 'client_secret': 'yyy'})
+@patch('src.extractors.sentinel_hub.SentinelHubAuthenticator.authenticate'
+    , return_value=({"access_token": "abc", "expires_at": 9999999999}, MagicMock()))
+@patch('src.extractors.sentinel_hub.CredentialManager.get_minio_credentials'
+    , return_value={'endpoint': 'localhost:9000', 'access_key': 'xxx', 'secret_key': 'yyy'})
+@patch('src.extractors.sentinel_hub.CredentialManager.get_pg_credentials'
+    , return_value={'hostname': 'localhost', 'username': 'xxx', 'password': 'yyy'})
+@patch('src.extractors.sentinel_hub.SentinelImageExtractor.get_available_dates_async'
+    , return_value=['2025-01-01T00:00:00.000000Z', '2025-01-02T00:00:00.000000Z'])
+@patch('src.extractors.sentinel_hub.SentinelImageExtractor.download_sentinel_image_async')
+@patch('src.extractors.sentinel_hub.MinioStorage.upload', return_value=True)
+@patch('src.db.pg_database.PostgreSaver.get_ingested_image_dates', return_value=set())
+@patch('src.db.pg_database.PostgreSaver.bulk_save', return_value=(1, 0))
+def test_data_pipeline_async(
+        mock_pg_bulk_save,
+        mock_get_ingested_image_dates,
+        mock_minio_upload,
+        mock_download_sentinel_image_async,
+        mock_get_available_dates_async,
+        mock_get_pg_credentials,
+        mock_get_minio_credentials,
+        mock_authenticate,
+        mock_get_sentinelhub_credentials
+):
+    cfg = {
+        'location': {
+            'name': 'xxx',
+            'coordinates': {
+                'min_lon': 0.0,
+                'min_lat': 0.0,
+                'max_lon': 1.0,
+                'max_lat': 1.0
+            }
+        },
+        'sentinel_type': 'sentinel'
+    }
+
+    async def download(client, date):
+        if date.startswith('2025-01-02'):
+            raise RuntimeError('download failed')
+        return b'image-bytes'
+
+    mock_download_sentinel_image_async.side_effect = download
+
+    pipeline = SentinelDataPipeline(cfg)
+    asyncio.run(pipeline.run_async(n_days=2, client=MagicMock()))
+
+    assert mock_download_sentinel_image_async.call_count == 2
+    mock_minio_upload.assert_called_once()
+    assert len(saved_rows(mock_pg_bulk_save)) == 1
+
+
+@patch('src.extractors.sentinel_hub.CredentialManager.get_sentinelhub_credentials'
+    , return_value={'client_id': 'xxx', 'client_secret': 'yyy'})
+@patch('src.extractors.sentinel_hub.SentinelHubAuthenticator.authenticate'
+    , return_value=({"access_token": "abc", "expires_at": 9999999999}, MagicMock()))
+@patch('src.extractors.sentinel_hub.CredentialManager.get_minio_credentials'
+    , return_value={'endpoint': 'localhost:9000', 'access_key': 'xxx', 'secret_key': 'yyy'})
+@patch('src.extractors.sentinel_hub.CredentialManager.get_pg_credentials'
+    , return_value={'hostname': 'localhost', 'username': 'xxx', 'password': 'yyy'})
+@patch('src.extractors.sentinel_hub.SentinelImageExtractor.get_available_dates'
+    , return_value=['2025-01-01T00:00:00.000000Z'])
+@patch('src.extractors.sentinel_hub.SentinelImageExtractor.stream_sentinel_image')
+@patch('src.extractors.sentinel_hub.MinioStorage.upload_stream', return_value=True)
+@patch('src.db.pg_database.PostgreSaver.get_ingested_image_dates', return_value=set())
+@patch('src.db.pg_database.PostgreSaver.bulk_save', return_value=(1, 0))
+def test_data_pipeline_streaming(
+        mock_pg_bulk_save,
+        mock_get_ingested_image_dates,
+        mock_minio_upload_stream,
+        mock_stream_sentinel_image,
+        mock_get_available_dates,
+        mock_get_pg_credentials,
+        mock_get_minio_credentials,
+        mock_authenticate,
+        mock_get_sentinelhub_credentials
+):
+    cfg = {
+        'location': {
+            'name': 'xxx',
+            'coordinates': {
+                'min_lon': 0.0,
+                'min_lat': 0.0,
+                'max_lon': 1.0,
+                'max_lat': 1.0
+            }
+        },
+        'sentinel_type': 'sentinel',
+        'stream_images': True
+    }
+    stream = MagicMock()
+    mock_stream_sentinel_image.return_value.__enter__.return_value = stream
+
+    pipeline = SentinelDataPipeline(cfg)
+    pipeline.run(n_days=1)
+
+    mock_minio_upload_stream.assert_called_once_with(
+        'satellite-images', '202501010000000000_xxx.tiff', stream, 'image/tiff')
+    assert len(saved_rows(mock_pg_bulk_save)) == 1
+
+
+@pytest.mark.parametrize('force, downloads', [(False, 1), (True, 2)])
+@patch('src.extractors.sentinel_hub.CredentialManager.get_sentinelhub_credentials'
+    , return_value={'client_id': 'xxx', 'client_secret': 'yyy'})
+@patch('src.extractors.sentinel_hub.SentinelHubAuthenticator.authenticate'
+    , return_value=({"access_token": "abc", "expires_at": 9999999999}, MagicMock()))
+@patch('src.extractors.sentinel_hub.CredentialManager.get_minio_credentials'
+    , return_value={'endpoint': 'localhost:9000', 'access_key': 'xxx', 'secret_key': 'yyy'})
+@patch('src.extractors.sentinel_hub.CredentialManager.get_pg_credentials'
+    , return_value={'hostname': 'localhost', 'username': 'xxx', 'password': 'yyy'})
+@patch('src.extractors.sentinel_hub.SentinelImageExtractor.get_available_dates'
+    , return_value=['2025-01-01T10:00:00.024Z', '2025-01-02T10:00:00.024Z'])
+@patch('src.extractors.sentinel_hub.SentinelImageExtractor.download_sentinel_image', return_value=b'image-bytes')
+@patch('src.extractors.sentinel_hub.MinioStorage.upload', return_value=True)
+@patch('src.db.pg_database.PostgreSaver.get_ingested_image_dates'
+    , return_value={datetime.datetime(2025, 1, 1, 10, 0, 0, 24000)})
+@patch('src.db.pg_database.PostgreSaver.bulk_save', return_value=(1, 0))
+def test_data_pipeline_skips_ingested(
+        mock_pg_bulk_save,
+        mock_get_ingested_image_dates,
+        mock_minio_upload,
+        mock_download_sentinel_image,
+        mock_get_available_dates,
+        mock_get_pg_credentials,
+        mock_get_minio_credentials,
+        mock_authenticate,
+        mock_get_sentinelhub_credentials,
+        force,
+        downloads
+):
+    cfg = {
+        'location': {
+            'name': 'xxx',
+            'coordinates': {
+                'min_lon': 0.0,
+                'min_lat': 0.0,
+                'max_lon': 1.0,
+                'max_lat': 1.0
+            }
+        },
+        'sentinel_type': 'sentinel'
+    }
+
+    pipeline = SentinelDataPipeline(cfg)
+    pipeline.run(n_days=2, force=force)
+
+    assert mock_download_sentinel_image.call_count == downloads
+    assert len(saved_rows(mock_pg_bulk_save)) == downloads
+    if not force:
+        mock_download_sentinel_image.assert_called_once_with('2025-01-02T10:00:00.024Z')
+        args = mock_get_ingested_image_dates.call_args[0]
+        assert args[2:] == (datetime.datetime(2025, 1, 1, 10, 0, 0, 24000),
+                            datetime.datetime(2025, 1, 2, 10, 0, 0, 24000),
+                            'bands')
+
+
+@patch('src.extractors.sentinel_hub.CredentialManager.get_sentinelhub_credentials'
+    , return_value={'client_id': 'xxx', 'client_secret': 'yyy'})
+@patch('src.extractors.sentinel_hub.SentinelHubAuthenticator.authenticate'
+    , return_value=({"access_token": "abc", "expires_at": 9999999999}, MagicMock()))
+@patch('src.extractors.sentinel_hub.CredentialManager.get_minio_credentials'
+    , return_value={'endpoint': 'localhost:9000', 'access_key': 'xxx', 'secret_key': 'yyy'})
+@patch('src.extractors.sentinel_hub.CredentialManager.get_pg_credentials'
+    , return_value={'hostname': 'localhost', 'username': 'xxx', 'password': 'yyy'})
+@patch('src.extractors.sentinel_hub.SentinelImageExtractor.get_available_dates'
+    , return_value=['2025-01-01T00:00:00.000000Z'])
+@patch('src.extractors.sentinel_hub.SentinelImageExtractor.download_sentinel_image', return_value=b'image-bytes')
+@patch('src.extractors.sentinel_hub.MinioStorage.upload', return_value=True)
+@patch('src.db.pg_database.PostgreSaver.get_ingested_image_dates', return_value=set())
+@patch('src.db.pg_database.PostgreSaver.bulk_save', return_value=(1, 0))
+def test_data_pipeline_multiple_locations(
+        mock_pg_bulk_save,
+        mock_get_ingested_image_dates,
+        mock_minio_upload,
+        mock_download_sentinel_image,
+        mock_get_available_dates,
+        mock_get_pg_credentials,
+        mock_get_minio_credentials,
+        mock_authenticate,
+        mock_get_sentinelhub_credentials
+):
+    cfg = {
+        'locations': [
+            {'name': 'xxx', 'coordinates': {'min_lon': 0.0, 'min_lat': 0.0, 'max_lon': 1.0, 'max_lat': 1.0}},
+            {'name': 'yyy', 'coordinates': {'min_lon': 2.0, 'min_lat': 2.0, 'max_lon': 3.0, 'max_lat': 3.0}},
+        ],
+        'sentinel_type': 'sentinel'
+    }
+
+    pipeline = SentinelDataPipeline(cfg)
+    pipeline.run(n_days=1, max_workers=4)
+
+    mock_authenticate.assert_called_once()
+    assert mock_get_available_dates.call_count == 2
+    assert mock_download_sentinel_image.call_count == 2
+
+    saved = sorted((row['location_name'], row['min_lat'], row['image_path'])
+                   for row in saved_rows(mock_pg_bulk_save))
+    assert saved == [('xxx', 0.0, '202501010000000000_xxx.tiff'), ('yyy', 2.0, '202501010000000000_yyy.tiff')]
+
+
+@patch('src.extractors.sentinel_hub.CredentialManager.get_sentinelhub_credentials'
+    , return_value={'client_id': 'xxx', 'client_secret': 'yyy'})
+@patch('src.extractors.sentinel_hub.SentinelHubAuthenticator.authenticate'
+    , return_value=({"access_token": "abc", "expires_at": 9999999999}, MagicMock()))
+@patch('src.extractors.sentinel_hub.CredentialManager.get_minio_credentials'
+    , return_value={'endpoint': 'localhost:9000', 'access_key': 'xxx', 'secret_key': 'yyy'})
+@patch('src.extractors.sentinel_hub.CredentialManager.get_pg_credentials'
+    , return_value={'hostname': 'localhost', 'username': 'xxx', 'password': 'yyy'})
+@patch('src.extractors.sentinel_hub.SentinelImageExtractor.get_available_dates'
+    , return_value=['2025-01-01T00:00:00.000000Z'])
+@patch('src.extractors.sentinel_hub.SentinelImageExtractor.download_sentinel_image')
+@patch('src.extractors.sentinel_hub.MinioStorage.upload', return_value=True)
+@patch('src.db.pg_database.PostgreSaver.get_ingested_image_dates', return_value=set())
+@patch('src.db.pg_database.PostgreSaver.bulk_save', return_value=(1, 0))
+def test_data_pipeline_index_product(
+        mock_pg_bulk_save,
+        mock_get_ingested_image_dates,
+        mock_minio_upload,
+        mock_download_sentinel_image,
+        mock_get_available_dates,
+        mock_get_pg_credentials,
+        mock_get_minio_credentials,
+        mock_authenticate,
+        mock_get_sentinelhub_credentials
+):
+    cfg = {
+        'location': {
+            'name': 'xxx',
+            'coordinates': {
+                'min_lon': 0.0,
+                'min_lat': 0.0,
+                'max_lon': 1.0,
+                'max_lat': 1.0
+            }
+        },
+        'sentinel_type': 'sentinel',
+        'output_profile': 'ndvi'
+    }
+    buffer = io.BytesIO()
+    tifffile.imwrite(buffer, np.full((64, 64), 0.5, dtype=np.float32))
+    mock_download_sentinel_image.return_value = buffer.getvalue()
+
+    pipeline = SentinelDataPipeline(cfg)
+    pipeline.run(n_days=1)
+
+    assert mock_get_ingested_image_dates.call_args[0][-1] == 'ndvi'
+    bucket, object_name, image, content_type = mock_minio_upload.call_args[0]
+    assert object_name == '202501010000000000_xxx_ndvi.tiff'
+    assert len(image) < len(buffer.getvalue())
+
+    metadata, = saved_rows(mock_pg_bulk_save)
+    assert metadata['product'] == 'ndvi'
+    assert metadata['image_path'] == object_name
+
+
+def test_download_images_streamed_keeps_successful_dates():
+    cfg = {
+        'location': {'name': 'xxx', 'coordinates': {'min_lon': 0.0, 'min_lat': 0.0, 'max_lon': 1.0, 'max_lat': 1.0}},
+        'sentinel_type': 'sentinel',
+        'stream_images': True,
+        'multi_date': {'max_dates': 3}
+    }
+    pipeline = SentinelDataPipeline(cfg)
+    service = MagicMock()
+    service.profile.product = 'bands'
+    dates = ['2025-01-01T00:00:00.000000Z', '2025-01-02T00:00:00.000000Z', '2025-01-03T00:00:00.000000Z']
+
+    assert pipeline._group_dates(service, dates) == [[date] for date in dates]
+
+    with patch.object(pipeline, '_download_and_save', side_effect=['a.tiff', RuntimeError('failed'), 'c.tiff']):
+        saved = pipeline._download_images(service, MagicMock(), dates)
+
+    assert [(date, file_name) for _, date, file_name, _ in saved] == [(dates[0], 'a.tiff'), (dates[2], 'c.tiff')]
+
+
+def test_download_and_save_async_streams_in_thread():
+    cfg = {
+        'location': {'name': 'xxx', 'coordinates': {'min_lon': 0.0, 'min_lat': 0.0, 'max_lon': 1.0, 'max_lat': 1.0}},
+        'sentinel_type': 'sentinel',
+        'stream_images': True
+    }
+    pipeline = SentinelDataPipeline(cfg)
+    service = MagicMock()
+    date = '2025-01-01T00:00:00.000000Z'
+
+    with patch.object(pipeline, '_download_and_save', return_value='a.tiff') as download_and_save:
+        assert asyncio.run(pipeline._download_and_save_async(MagicMock(), service, MagicMock(), date)) == 'a.tiff'
+
+    assert download_and_save.call_args.args[2] == date
+    service.download_sentinel_image_async.assert_not_called()
+
+
+@patch('src.extractors.sentinel_hub.CredentialManager.get_sentinelhub_credentials'
+    , return_value={'client_id': 'xxx', 'client_secret': 'yyy'})
+@patch('src.extractors.sentinel_hub.SentinelHubAuthenticator.authenticate'
+    , return_value=({"access_token": "abc", "expires_at": 9999999999}, MagicMock()))
+@patch('src.extractors.sentinel_hub.CredentialManager.get_minio_credentials'
+    , return_value={'endpoint': 'localhost:9000', 'access_key': 'xxx', 'secret_key': 'yyy'})
+@patch('src.extractors.sentinel_hub.CredentialManager.get_pg_credentials'
+    , return_value={'hostname': 'localhost', 'username': 'xxx', 'password': 'yyy'})
+@patch('src.extractors.sentinel_hub.SentinelImageExtractor.get_available_dates'
+    , return_value=['2025-01-01T00:00:00.000000Z', '2025-01-02T00:00:00.000000Z', '2025-01-03T00:00:00.000000Z'])
+@patch('src.extractors.sentinel_hub.SentinelImageExtractor.download_sentinel_image', return_value=b'image-bytes')
+@patch('src.extractors.sentinel_hub.SentinelImageExtractor.download_sentinel_images')
+@patch('src.extractors.sentinel_hub.MinioStorage.upload', return_value=True)
+@patch('src.db.pg_database.PostgreSaver.get_ingested_image_dates', return_value=set())
+@patch('src.db.pg_database.PostgreSaver.bulk_save', return_value=(1, 0))
+def test_data_pipeline_multi_date(
+        mock_pg_bulk_save,
+        mock_get_ingested_image_dates,
+        mock_minio_upload,
+        mock_download_sentinel_images,
+        mock_download_sentinel_image,
+        mock_get_available_dates,
+        mock_get_pg_credentials,
+        mock_get_minio_credentials,
+        mock_authenticate,
+        mock_get_sentinelhub_credentials
+):
+    cfg = {
+        'location': {
+            'name': 'xxx',
+            'coordinates': {
+                'min_lon': 0.0,
+                'min_lat': 0.0,
+                'max_lon': 1.0,
+                'max_lat': 1.0
+            }
+        },
+        'sentinel_type': 'sentinel',
+        'multi_date': {'max_dates': 2}
+    }
+    # second date is missing in multi-date response
+    mock_download_sentinel_images.return_value = {'2025-01-01T00:00:00.000000Z': b'image-1'}
+
+    pipeline = SentinelDataPipeline(cfg)
+    pipeline.run(n_days=1)
+
+    mock_download_sentinel_images.assert_called_once_with(
+        ['2025-01-01T00:00:00.000000Z', '2025-01-02T00:00:00.000000Z'])
+    mock_download_sentinel_image.assert_called_once_with('2025-01-03T00:00:00.000000Z')
+    assert mock_minio_upload.call_count == 2
+    assert sorted(row['image_path'] for row in saved_rows(mock_pg_bulk_save)) == [
+        '202501010000000000_xxx.tiff', '202501030000000000_xxx.tiff']
+
+
+def test_group_dates_only_contiguous_within_span():
+    cfg = {
+        'location': {'name': 'xxx', 'coordinates': {'min_lon': 0.0, 'min_lat': 0.0, 'max_lon': 1.0, 'max_lat': 1.0}},
+        'sentinel_type': 'sentinel',
+        'multi_date': {'max_dates': 3, 'max_span_days': 5}
+    }
+    pipeline = SentinelDataPipeline(cfg)
+    service = MagicMock()
+    service.profile.product = 'bands'
+    available = [f'2025-01-{day:02d}T10:00:00.000000Z' for day in (1, 2, 3, 4, 5, 6, 20, 21)]
+    # 2025-01-03 is already ingested
+    dates = [date for date in available if '01-03' not in date]
+
+    groups = pipeline._group_dates(service, dates, available)
+
+    assert [[date[8:10] for date in group] for group in groups] == [
+        ['01', '02'], ['04', '05', '06'], ['20', '21']]
+
+    cfg['multi_date'] = {'max_dates': 10, 'max_span_days': 3}
+    groups = pipeline._group_dates(service, available, available)
+    assert [[date[8:10] for date in group] for group in groups] == [
+        ['01', '02', '03', '04'], ['05', '06'], ['20', '21']]
+
+
+@patch('src.extractors.sentinel_hub.CredentialManager.get_sentinelhub_credentials'
+    , return_value={'client_id': 'xxx', 'client_secret': 'yyy'})
+@patch('src.extractors.sentinel_hub.SentinelHubAuthenticator.authenticate'
+    , return_value=({"access_token": "abc", "expires_at": 9999999999}, MagicMock()))
+@patch('src.extractors.sentinel_hub.CredentialManager.get_minio_credentials'
+    , return_value={'endpoint': 'localhost:9000', 'access_key': 'xxx', 'secret_key': 'yyy'})
+@patch('src.extractors.sentinel_hub.CredentialManager.get_pg_credentials'
+    , return_value={'hostname': 'localhost', 'username': 'xxx', 'password': 'yyy'})
+@patch('src.extractors.sentinel_hub.SentinelImageExtractor.get_available_dates'
+    , return_value=['2025-01-01T00:00:00.000000Z'])
+@patch('src.extractors.sentinel_hub.SentinelImageExtractor.download_sentinel_image', return_value=b'image-bytes')
+@patch('src.extractors.sentinel_hub.MinioStorage.upload', return_value=True)
+@patch('src.db.pg_database.PostgreSaver.get_ingested_image_dates', return_value=set())
+@patch('src.db.pg_database.PostgreSaver.bulk_save')
+def test_data_pipeline_outbox_replays_failed_metadata(
+        mock_pg_bulk_save,
+        mock_get_ingested_image_dates,
+        mock_minio_upload,
+        mock_download_sentinel_image,
+        mock_get_available_dates,
+        mock_get_pg_credentials,
+        mock_get_minio_credentials,
+        mock_authenticate,
+        mock_get_sentinelhub_credentials,
+        tmp_path
+):
+    cfg = {
+        'location': {
+            'name': 'xxx',
+            'coordinates': {
+                'min_lon': 0.0,
+                'min_lat': 0.0,
+                'max_lon': 1.0,
+                'max_lat': 1.0
+            }
+        },
+        'sentinel_type': 'sentinel',
+        'outbox': {'path': tmp_path / 'outbox.sqlite', 'flush_interval': 60}
+    }
+    mock_pg_bulk_save.side_effect = [OperationalError('INSERT', {}, Exception('connection refused')), (1, 0)]
+
+    pipeline = SentinelDataPipeline(cfg)
+    pipeline.run(n_days=1)
+
+    mock_minio_upload.assert_called_once()
+    assert pipeline.outbox.pending() == 1
+
+    # next run writes metadata of image uploaded by the previous one
+    mock_get_available_dates.return_value = []
+    SentinelDataPipeline(cfg).run(n_days=1)
+
+    assert pipeline.outbox.pending() == 0
+    assert [row['image_path'] for row in saved_rows(mock_pg_bulk_save)] == ['202501010000000000_xxx.tiff'] * 2
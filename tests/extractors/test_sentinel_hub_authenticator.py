@@ -1,7 +1,9 @@
 from unittest.mock import MagicMock, patch
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+import time
 import pytz
-from src.extractors.sentinel_hub import SentinelHubAuthenticator
+from src.extractors.sentinel_hub import SentinelHubAuthenticator, SentinelHubTokenProvider
 
 
 @patch('src.extractors.sentinel_hub.OAuth2Session.fetch_token')
@@ -26,3 +28,76 @@ def test_expired_token_check(tmp_path):
     auth = SentinelHubAuthenticator(credentials, token_path, logger)
     auth.token = {"expires_at": (datetime.now(pytz.utc) - timedelta(minutes=10)).timestamp()}
     assert auth.expired_token_check() is True
+
+
+def test_save_token_replaces_file(tmp_path):
+    credentials = {"client_id": "client", "client_secret": "secret"}
+    token_path = tmp_path / "token.json"
+
+    auth = SentinelHubAuthenticator(credentials, token_path, MagicMock())
+    auth.save_token({"access_token": "abc", "expires_at": 1})
+    auth.save_token({"access_token": "def", "expires_at": 2})
+
+    assert auth.load_token()['access_token'] == 'def'
+    assert [p.name for p in tmp_path.iterdir()] == ['token.json']
+
+
+def test_token_provider_caches_token():
+    auth = MagicMock()
+    auth.authenticate.return_value = ({"access_token": "abc", "expires_at": time.time() + 3600}, MagicMock())
+
+    provider = SentinelHubTokenProvider(auth, MagicMock())
+
+    assert provider.access_token == 'abc'
+    assert provider.access_token == 'abc'
+    auth.authenticate.assert_called_once()
+    auth.fetch_token.assert_not_called()
+
+
+def test_token_provider_refreshes_before_expiry():
+    auth = MagicMock()
+    auth.authenticate.return_value = ({"access_token": "old", "expires_at": time.time() + 120}, MagicMock())
+    auth.fetch_token.return_value = {"access_token": "new", "expires_at": time.time() + 3600}
+
+    provider = SentinelHubTokenProvider(auth, MagicMock(), refresh_margin=timedelta(minutes=5))
+
+    assert provider.access_token == 'new'
+    auth.fetch_token.assert_called_once()
+
+
+def test_token_provider_single_refresh_for_concurrent_callers():
+    auth = MagicMock()
+    auth.authenticate.return_value = ({"access_token": "old", "expires_at": time.time()}, MagicMock())
+
+    def slow_fetch():
+        time.sleep(0.05)
+        return {"access_token": "new", "expires_at": time.time() + 3600}
+
+    auth.fetch_token.side_effect = slow_fetch
+    provider = SentinelHubTokenProvider(auth, MagicMock())
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        tokens = list(executor.map(lambda _: provider.access_token, range(16)))
+
+    assert set(tokens) == {'new'}
+    auth.fetch_token.assert_called_once()
+
+
+def test_token_provider_background_refresh():
+    auth = MagicMock()
+    auth.authenticate.return_value = ({"access_token": "old", "expires_at": time.time() + 3600}, MagicMock())
+    auth.fetch_token.return_value = {"access_token": "new", "expires_at": time.time() + 7200}
+
+    provider = SentinelHubTokenProvider(auth, MagicMock())
+    provider.get_token()
+    # pretend the token is about to expire, background thread should refresh it right away
+    provider._token = {"access_token": "old", "expires_at": time.time()}
+
+    with provider:
+        for _ in range(100):
+            if auth.fetch_token.called:
+                break
+            time.sleep(0.01)
+
+    assert provider._thread is None
+    assert provider.access_token == 'new'
@@ -1,6 +1,14 @@
-from unittest.mock import patch, MagicMock
+import asyncio
+import io
+from unittest.mock import patch, MagicMock, AsyncMock
+
+import numpy as np
+import tifffile
 
 from src.extractors.sentinel_hub import SentinelImageExtractor
+from src.extractors.sentinel_scheduler import SentinelHubScheduler
+from src.utils.async_http import AsyncResponse
+from src.utils.response_cache import ResponseCache
 
 
 @patch('src.extractors.sentinel_hub.requests.post')
@@ -43,6 +51,40 @@ def test_get_available_dates(mock_post):
     assert kwargs['json']['bbox'] == [0.0, 0.0, 1.0, 1.0]
 
 
+@patch('src.extractors.sentinel_hub.requests.post')
+def test_get_available_dates_cloud_filter_and_dedupe(mock_post):
+    mock_post.return_value.json.return_value = {
+        "features": [
+            {"properties": {"datetime": '2024-01-01T10:00:03Z', "platform": "sentinel-2a"}},
+            {"properties": {"datetime": '2024-01-01T10:00:00Z', "platform": "sentinel-2a"}},
+            {"properties": {"datetime": '2024-01-03T10:00:00Z', "platform": "sentinel-2b"}},
+        ],
+        "context": {"next": None}
+    }
+    cfg = {
+        "location": {
+            "name": "test",
+            "coordinates": {
+                "min_lat": 0.0,
+                "min_lon": 0.0,
+                "max_lat": 1.0,
+                "max_lon": 1.0
+            }
+        },
+        "sentinel_type": "sentinel-2",
+        "max_cloud_cover": 30
+    }
+
+    extractor = SentinelImageExtractor(cfg, MagicMock(), {"access_token": "abc"}, MagicMock())
+    dates = extractor.get_available_dates('2024-01-01T00:00:00Z', '2024-01-04T00:00:00Z')
+
+    assert dates == ['2024-01-01T10:00:00Z', '2024-01-03T10:00:00Z']
+    request = mock_post.call_args.kwargs['json']
+    assert request['filter'] == 'eo:cloud_cover <= 30'
+    assert request['filter-lang'] == 'cql2-text'
+    assert 'properties.eo:cloud_cover' in request['fields']['include']
+
+
 def test_download_image():
     cfg = {
         "location": {
@@ -74,3 +116,184 @@ def test_download_image():
     assert kwargs['headers']['Authorization'] == 'Bearer abc'
     assert kwargs['headers']['Accept'] == 'image/tiff'
     assert kwargs['json']['input']['bounds']['bbox'] == [0.0, 0.0, 1.0, 1.0]
+
+
+def test_get_available_dates_async():
+    cfg = {
+        "location": {
+            "name": "test",
+            "coordinates": {
+                "min_lat": 0.0,
+                "min_lon": 0.0,
+                "max_lat": 1.0,
+                "max_lon": 1.0
+            }
+        },
+       "sentinel_type": "sentinel-2"
+    }
+    client = MagicMock()
+    client.post_json = AsyncMock(side_effect=[
+        {"features": [{"properties": {"datetime": "2024-01-01T00:00:00Z"}}], "context": {"next": 5}},
+        {"features": [{"properties": {"datetime": "2024-01-02T00:00:00Z"}}], "context": {}},
+    ])
+    token = {"access_token": "abc"}
+    logger = MagicMock()
+
+    extractor = SentinelImageExtractor(cfg, MagicMock(), token, logger)
+    dates = asyncio.run(extractor.get_available_dates_async(client, '2024-01-01T00:00:00Z', '2024-01-02T00:00:00Z'))
+
+    assert dates == ['2024-01-01T00:00:00Z', '2024-01-02T00:00:00Z']
+    assert client.post_json.await_count == 2
+    args, kwargs = client.post_json.call_args
+    assert args[0] == 'https://sh.dataspace.copernicus.eu/api/v1/catalog/1.0.0/search'
+    assert kwargs['json']['next'] == 5
+
+
+def test_download_image_async():
+    cfg = {
+        "location": {
+            "name": "test",
+            "coordinates": {
+                "min_lat": 0.0,
+                "min_lon": 0.0,
+                "max_lat": 1.0,
+                "max_lon": 1.0
+            }
+        },
+       "sentinel_type": "sentinel-2"
+    }
+    client = MagicMock()
+    client.request_with_headers = AsyncMock(
+        return_value=AsyncResponse(200, {'X-ProcessingUnits-Spent': '2.5'}, b'image-bytes'))
+    token = {"access_token": "abc"}
+    logger = MagicMock()
+    scheduler = SentinelHubScheduler(logger=logger)
+
+    extractor = SentinelImageExtractor(cfg, MagicMock(), token, logger, scheduler=scheduler)
+    response = asyncio.run(extractor.download_sentinel_image_async(client, '2024-01-01T00:00:00Z'))
+
+    args, kwargs = client.request_with_headers.call_args
+    assert response == b'image-bytes'
+    assert extractor.stats.processing_units == 2.5
+    assert scheduler.processing_units == 2.5
+    assert args == ('POST', 'https://sh.dataspace.copernicus.eu/api/v1/process')
+    assert kwargs['headers']['Authorization'] == 'Bearer abc'
+    assert kwargs['json']['input']['data'][0]['dataFilter']['timeRange']['from'] == '2024-01-01T00:00:00Z'
+
+
+def test_stream_image():
+    cfg = {
+        "location": {
+            "name": "test",
+            "coordinates": {
+                "min_lat": 0.0,
+                "min_lon": 0.0,
+                "max_lat": 1.0,
+                "max_lon": 1.0
+            }
+        },
+       "sentinel_type": "sentinel-2"
+    }
+    oauth = MagicMock()
+    token = {"access_token": "abc"}
+    logger = MagicMock()
+    response = oauth.post.return_value
+
+    extractor = SentinelImageExtractor(cfg, oauth, token, logger)
+    with extractor.stream_sentinel_image('2024-01-01T00:00:00Z') as stream:
+        assert stream.stream is response.raw
+        response.close.assert_not_called()
+
+    args, kwargs = oauth.post.call_args
+    assert kwargs['stream'] is True
+    assert response.raw.decode_content is True
+    response.close.assert_called_once()
+
+
+@patch('src.extractors.sentinel_hub.requests.post')
+def test_get_available_dates_cached(mock_post, tmp_path):
+    iso_datetime = '2024-01-01T00:00:00Z'
+    mock_post.return_value.json.return_value = {
+        "features": [{"properties": {"datetime": iso_datetime}}],
+        "context": {"next": None}
+    }
+
+    cfg = {
+        "location": {
+            "name": "test",
+            "coordinates": {
+                "min_lat": 0.0,
+                "min_lon": 0.0,
+                "max_lat": 1.0,
+                "max_lon": 1.0
+            }
+        },
+       "sentinel_type": "sentinel-2"
+    }
+    cache = ResponseCache(tmp_path)
+
+    extractor = SentinelImageExtractor(cfg, MagicMock(), {"access_token": "abc"}, MagicMock(), cache)
+    assert extractor.get_available_dates(iso_datetime, iso_datetime) == [iso_datetime]
+    assert extractor.get_available_dates(iso_datetime, iso_datetime) == [iso_datetime]
+
+    mock_post.assert_called_once()
+    assert cache.stats() == {'hits': 1, 'misses': 1}
+
+
+def test_mosaic_image():
+    cfg = {
+        "location": {
+            "name": "test",
+            "coordinates": {
+                "min_lat": 50.0,
+                "min_lon": 14.0,
+                "max_lat": 50.02,
+                "max_lon": 14.05
+            }
+        },
+       "sentinel_type": "sentinel-2"
+    }
+    oauth = MagicMock()
+
+    def post(url, json, headers):
+        output = json['output']
+        buffer = io.BytesIO()
+        tifffile.imwrite(buffer, np.ones((output['height'], output['width'], 4), dtype=np.uint8))
+        return MagicMock(content=buffer.getvalue())
+
+    oauth.post.side_effect = post
+
+    extractor = SentinelImageExtractor(cfg, oauth, {"access_token": "abc"}, MagicMock())
+    with extractor.mosaic_sentinel_image('2024-01-01T00:00:00Z', resolution=10, tile_size=256) as mosaic:
+        image = tifffile.imread(mosaic)
+
+    assert oauth.post.call_count == 2
+    assert image.shape == (223, 358, 4)
+    assert image.min() == 1
+
+
+def test_download_image_output_profile():
+    cfg = {
+        "location": {
+            "name": "test",
+            "coordinates": {
+                "min_lat": 0.0,
+                "min_lon": 0.0,
+                "max_lat": 1.0,
+                "max_lon": 1.0
+            }
+        },
+        "sentinel_type": "sentinel-2",
+        "output_profile": "uint8"
+    }
+    oauth = MagicMock()
+    oauth.post.return_value.content = b'image-bytes'
+    oauth.post.return_value.headers = {'X-ProcessingUnits-Spent': '0.25'}
+
+    extractor = SentinelImageExtractor(cfg, oauth, {"access_token": "abc"}, MagicMock())
+    extractor.download_sentinel_image('2024-01-01T00:00:00Z')
+
+    args, kwargs = oauth.post.call_args
+    assert 'sampleType: "UINT8"' in kwargs['json']['evalscript']
+    assert extractor.stats.downloaded_bytes == len(b'image-bytes')
+    assert extractor.stats.processing_units == 0.25
@@ -0,0 +1,80 @@
+import io
+import json
+import tarfile
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+import tifffile
+
+from src.extractors.sentinel_hub import SentinelImageExtractor
+from src.extractors.sentinel_multitemporal import split_multitemporal
+
+
+def make_tar(stack: np.ndarray, dates: list) -> bytes:
+    image = io.BytesIO()
+    tifffile.imwrite(image, stack, photometric='minisblack', planarconfig='contig')
+    members = {'default.tif': image.getvalue(), 'userdata.json': json.dumps({'dates': dates}).encode()}
+
+    output = io.BytesIO()
+    with tarfile.open(fileobj=output, mode='w') as tar:
+        for name, content in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+    return output.getvalue()
+
+
+def test_split_multitemporal():
+    stack = np.arange(8 * 8 * 4, dtype=np.uint16).reshape(8, 8, 4)
+    scenes = split_multitemporal(make_tar(stack, ['2025-01-01T10:00:00Z', '2025-01-03T10:00:00Z']), 2)
+
+    assert [date for date, _, _ in scenes] == ['2025-01-01T10:00:00Z', '2025-01-03T10:00:00Z']
+    assert np.array_equal(scenes[0][1], stack[..., :2])
+    assert np.array_equal(scenes[1][1], stack[..., 2:])
+
+
+def test_split_multitemporal_band_mismatch():
+    stack = np.zeros((8, 8, 3), dtype=np.uint16)
+    with pytest.raises(ValueError):
+        split_multitemporal(make_tar(stack, ['2025-01-01T10:00:00Z', '2025-01-03T10:00:00Z']), 2)
+
+
+def test_download_images_multi_date():
+    cfg = {
+        "location": {
+            "name": "test",
+            "coordinates": {
+                "min_lat": 0.0,
+                "min_lon": 0.0,
+                "max_lat": 1.0,
+                "max_lon": 1.0
+            }
+        },
+        "sentinel_type": "sentinel-2",
+        "output_profile": "uint16",
+        "max_cloud_cover": 30
+    }
+    stack = np.arange(16 * 16 * 8, dtype=np.uint16).reshape(16, 16, 8)
+    oauth = MagicMock()
+    oauth.post.return_value.content = make_tar(stack, ['2025-01-01T10:01:00Z', '2025-01-05T10:02:00Z'])
+    oauth.post.return_value.headers = {}
+    logger = MagicMock()
+
+    extractor = SentinelImageExtractor(cfg, oauth, {"access_token": "abc"}, logger)
+    dates = ['2025-01-05T10:00:00Z', '2025-01-01T10:00:00Z', '2025-01-03T10:00:00Z']
+    images = extractor.download_sentinel_images(dates)
+
+    oauth.post.assert_called_once()
+    args, kwargs = oauth.post.call_args
+    assert kwargs['headers']['Accept'] == 'application/tar'
+    assert 'mosaicking: "ORBIT"' in kwargs['json']['evalscript']
+    data_filter = kwargs['json']['input']['data'][0]['dataFilter']
+    assert data_filter['maxCloudCoverage'] == 30
+    time_range = data_filter['timeRange']
+    assert time_range['from'].startswith('2025-01-01') and time_range['to'].startswith('2025-01-05')
+
+    assert set(images) == {'2025-01-01T10:00:00Z', '2025-01-05T10:00:00Z'}
+    assert np.array_equal(tifffile.imread(io.BytesIO(images['2025-01-01T10:00:00Z'])), stack[..., :4])
+    assert np.array_equal(tifffile.imread(io.BytesIO(images['2025-01-05T10:00:00Z'])), stack[..., 4:])
+    logger.warning.assert_called_once()
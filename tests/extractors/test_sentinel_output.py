@@ -0,0 +1,94 @@
+import io
+
+import numpy as np
+import pytest
+import tifffile
+
+from src.extractors.sentinel_output import OutputProfile, OutputStats, CountingReader
+from src.extractors.sentinel_tiler import plan_tiles, MODEL_TIEPOINT_TAG
+
+
+def test_profile_from_config():
+    assert OutputProfile.from_config(None).sample_type == 'AUTO'
+    assert OutputProfile.from_config('uint16').scale == 10000
+
+    profile = OutputProfile.from_config({'name': 'uint16', 'bands': ['B04', 'B08']})
+    assert profile.sample_type == 'UINT16'
+    assert profile.bands == ['B04', 'B08']
+
+    with pytest.raises(ValueError):
+        OutputProfile.from_config('unknown')
+    with pytest.raises(ValueError):
+        OutputProfile.from_config({'name': 'custom', 'sample_type': 'INT64'})
+
+
+def test_evalscript():
+    script = OutputProfile('custom', bands=['B04', 'B08'], sample_type='UINT16', scale=10000).evalscript()
+
+    assert 'input: ["B04", "B08"]' in script
+    assert 'output: { bands: 2, sampleType: "UINT16" }' in script
+    assert 'return [10000 * sample.B04, 10000 * sample.B08]' in script
+
+
+def test_compress_keeps_data_and_georeference():
+    data = np.tile(np.arange(256, dtype=np.uint16), (256, 1))
+    data = np.stack([data] * 4, axis=-1)
+    buffer = io.BytesIO()
+    tifffile.imwrite(buffer, data, extratags=plan_tiles([14.0, 50.0, 14.01, 50.01], 10).geotiff_tags())
+    image = buffer.getvalue()
+
+    compressed = OutputProfile.from_config('uint16').compress(image)
+
+    assert len(compressed) < len(image)
+    with tifffile.TiffFile(io.BytesIO(compressed)) as tiff:
+        np.testing.assert_array_equal(tiff.asarray(), data)
+        assert tiff.pages[0].tags[MODEL_TIEPOINT_TAG].value[3:5] == (14.0, 50.01)
+
+    assert OutputProfile.from_config('default').compress(image) is image
+
+
+def test_output_stats():
+    first, second = OutputStats('uint8'), OutputStats('uint8')
+    first.add_download(100, {'X-ProcessingUnits-Spent': '0.5'})
+    first.add_stored(40)
+    second.add_download(200, {'X-ProcessingUnits-Spent': '1.5'})
+    second.add_stored(60)
+
+    merged = OutputStats.merge([first, second, OutputStats('default')])
+
+    assert set(merged) == {'uint8', 'default'}
+    assert merged['uint8'].as_dict() == {
+        'images': 2,
+        'downloaded_bytes': 300,
+        'stored_bytes': 100,
+        'processing_units': 2.0,
+        'stored_bytes_per_image': 50,
+        'processing_units_per_image': 1.0,
+    }
+
+
+def test_counting_reader():
+    reader = CountingReader(io.BytesIO(b'x' * 10))
+
+    assert reader.read(4) == b'xxxx'
+    assert reader.read() == b'x' * 6
+    assert reader.bytes_read == 10
+
+
+@pytest.mark.parametrize('profile, expected', [
+    ('ndvi', ['output: { bands: 1, sampleType: "FLOAT32" }', 'return [NaN]', '(sample.B08 - sample.B04)']),
+    ('ndvi_uint16', ['sampleType: "UINT16"', 'return [(index + 1) * 10000]']),
+    ('ndwi', ['(sample.B03 - sample.B08)']),
+    ('true_color', ['output: { bands: 3, sampleType: "AUTO" }', '2.5 * sample.B04']),
+    ('cloud_mask', ['input: ["SCL"]', '[3, 8, 9, 10].includes(sample.SCL)']),
+])
+def test_product_evalscripts(profile, expected):
+    script = OutputProfile.from_config(profile).evalscript()
+
+    for fragment in expected:
+        assert fragment in script
+
+
+def test_unknown_product():
+    with pytest.raises(ValueError):
+        OutputProfile('custom', product='evi')
@@ -0,0 +1,92 @@
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import aiohttp
+import pytest
+import requests
+
+from src.extractors.sentinel_scheduler import SentinelHubScheduler
+
+
+def make_response(status, headers=None):
+    response = MagicMock()
+    response.status_code = status
+    response.headers = headers or {}
+    return response
+
+
+@patch('src.extractors.sentinel_scheduler.time.sleep')
+def test_retries_throttled_request(mock_sleep):
+    scheduler = SentinelHubScheduler(initial_concurrency=4, logger=MagicMock())
+    responses = [make_response(429, {'Retry-After': '10'}), make_response(200, {'X-ProcessingUnits-Spent': '1.5'})]
+    send = MagicMock(side_effect=responses)
+
+    response = scheduler.request(send)
+
+    assert response is responses[1]
+    assert send.call_count == 2
+    assert scheduler.stats() == {
+        'requests': 2, 'retries': 1, 'throttled': 1, 'processing_units': 1.5, 'concurrency': 2
+    }
+
+
+@patch('src.extractors.sentinel_scheduler.time.sleep')
+def test_returns_last_response_after_max_retries(mock_sleep):
+    scheduler = SentinelHubScheduler(max_retries=2, logger=MagicMock())
+    send = MagicMock(return_value=make_response(503))
+
+    response = scheduler.request(send)
+
+    assert response.status_code == 503
+    assert send.call_count == 3
+    assert mock_sleep.call_count == 2
+
+
+@patch('src.extractors.sentinel_scheduler.time.sleep')
+def test_retries_connection_error(mock_sleep):
+    scheduler = SentinelHubScheduler(max_retries=1, logger=MagicMock())
+    send = MagicMock(side_effect=requests.ConnectionError('reset'))
+
+    with pytest.raises(requests.ConnectionError):
+        scheduler.request(send)
+    assert send.call_count == 2
+
+
+def test_additive_increase_up_to_max():
+    scheduler = SentinelHubScheduler(max_concurrency=4, initial_concurrency=1, logger=MagicMock())
+
+    for _ in range(20):
+        scheduler.request(lambda: make_response(200))
+
+    assert scheduler.concurrency == 4
+
+
+def test_exhausted_rate_limit_lowers_concurrency():
+    scheduler = SentinelHubScheduler(initial_concurrency=8, logger=MagicMock())
+
+    scheduler.request(lambda: make_response(200, {'X-RateLimit-Remaining': '0'}))
+
+    assert scheduler.concurrency == 4
+
+
+def test_retry_after_in_milliseconds():
+    scheduler = SentinelHubScheduler(logger=MagicMock())
+
+    assert scheduler.retry_delay({'Retry-After': '2500'}, 0) == 2.5
+    assert 0 <= scheduler.retry_delay({}, 3) <= 8
+
+
+def test_request_async_retries_throttled():
+    scheduler = SentinelHubScheduler(backoff_base=0, retry_after_unit=0, logger=MagicMock())
+    error = aiohttp.ClientResponseError(MagicMock(), (), status=429, headers={'Retry-After': '1'})
+    calls = []
+
+    async def send():
+        calls.append(1)
+        if len(calls) == 1:
+            raise error
+        return b'image'
+
+    assert asyncio.run(scheduler.request_async(send)) == b'image'
+    assert scheduler.retries == 1
+    assert scheduler.throttled == 1
@@ -0,0 +1,134 @@
+from unittest.mock import patch, MagicMock
+import datetime
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from src.db.pg_data_models import SatelliteIndexStats
+from src.extractors.sentinel_hub import SentinelImageExtractor, SentinelDataPipeline
+from src.extractors.sentinel_statistics import statistical_request, parse_statistics, STATISTICS_URL
+
+
+@pytest.fixture
+def cfg():
+    return {
+        'location': {
+            'name': 'xxx',
+            'coordinates': {
+                'min_lon': 14.0,
+                'min_lat': 50.0,
+                'max_lon': 14.1,
+                'max_lat': 50.1
+            }
+        },
+        'sentinel_type': 'sentinel-2-l2a'
+    }
+
+
+def stats_item(day, mean, sample_count=100, no_data_count=20):
+    return {
+        'interval': {'from': f'2025-06-{day:02d}T00:00:00Z', 'to': f'2025-06-{day + 1:02d}T00:00:00Z'},
+        'outputs': {'ndvi': {'bands': {'B0': {'stats': {
+            'min': 0.1, 'max': 0.9, 'mean': mean, 'stDev': 0.2,
+            'sampleCount': sample_count, 'noDataCount': no_data_count,
+            'percentiles': {'10.0': 0.2, '25.0': 0.4, '50.0': 0.5, '75.0': 0.6, '90.0': 0.8},
+        }}}}},
+    }
+
+
+@pytest.fixture
+def response():
+    return {
+        'data': [
+            stats_item(1, 0.5),
+            stats_item(2, 'NaN', no_data_count=100),
+            {'interval': {'from': '2025-06-03T00:00:00Z'}, 'error': {'type': 'EXECUTION_ERROR'}},
+            stats_item(4, 0.6),
+        ],
+        'status': 'OK'
+    }
+
+
+def test_statistical_request():
+    request = statistical_request([14.0, 50.0, 14.1, 50.1], 'sentinel-2-l2a', '2025-06-01T00:00:00Z',
+                                  '2025-09-01T00:00:00Z', index='ndwi', resolution=20)
+
+    aggregation = request['aggregation']
+    assert aggregation['timeRange'] == {'from': '2025-06-01T00:00:00Z', 'to': '2025-09-01T00:00:00Z'}
+    assert aggregation['aggregationInterval'] == {'of': 'P1D'}
+    assert aggregation['resy'] == pytest.approx(20 / 111320)
+    assert 'id: "ndwi"' in aggregation['evalscript']
+    assert request['calculations']['default']['statistics']['default']['percentiles']['k'] == [10, 25, 50, 75, 90]
+
+
+def test_parse_statistics(response):
+    rows = parse_statistics(response, 'ndvi')
+
+    assert [row['date'] for row in rows] == [datetime.datetime(2025, 6, 1), datetime.datetime(2025, 6, 4)]
+    assert rows[0]['mean'] == 0.5
+    assert rows[0]['median'] == 0.5
+    assert rows[0]['p90'] == 0.8
+    assert rows[0]['valid_pixels'] == 80
+    assert rows[0]['valid_fraction'] == 0.8
+
+
+@patch('src.extractors.sentinel_hub.requests.post')
+def test_get_statistics(mock_post, cfg, response):
+    mock_post.return_value.json.return_value = response
+
+    extractor = SentinelImageExtractor(cfg, MagicMock(), {'access_token': 'abc'}, MagicMock())
+    rows = extractor.get_statistics('2025-06-01T00:00:00Z', '2025-09-01T00:00:00Z')
+
+    mock_post.assert_called_once()
+    args, kwargs = mock_post.call_args
+    assert args[0] == STATISTICS_URL
+    assert kwargs['headers']['Authorization'] == 'Bearer abc'
+    assert kwargs['json']['input']['bounds']['bbox'] == [14.0, 50.0, 14.1, 50.1]
+    assert len(rows) == 2
+
+
+@patch('src.extractors.sentinel_hub.CredentialManager.get_sentinelhub_credentials'
+    , return_value={'client_id': 'xxx', 'client_secret': 'yyy'})
+@patch('src.extractors.sentinel_hub.SentinelHubAuthenticator.authenticate'
+    , return_value=({"access_token": "abc", "expires_at": 9999999999}, MagicMock()))
+@patch('src.extractors.sentinel_hub.CredentialManager.get_pg_credentials'
+    , return_value={'hostname': 'localhost', 'username': 'xxx', 'password': 'yyy'})
+@patch('src.extractors.sentinel_hub.SentinelImageExtractor.get_statistics')
+@patch('src.db.pg_database.PostgreSaver.bulk_save')
+def test_run_statistics(mock_bulk_save, mock_get_statistics, mock_get_pg_credentials, mock_authenticate,
+                        mock_get_sentinelhub_credentials, cfg, response):
+    mock_get_statistics.return_value = parse_statistics(response, 'ndvi')
+
+    pipeline = SentinelDataPipeline({**cfg, 'statistics': {'index': 'ndvi', 'resolution': 20}})
+    pipeline.run_statistics(n_days=90)
+
+    mock_get_statistics.assert_called_once()
+    assert mock_get_statistics.call_args.kwargs == {'index': 'ndvi', 'resolution': 20}
+
+    db_name, model, rows = mock_bulk_save.call_args[0]
+    assert model is SatelliteIndexStats
+    assert len(rows) == 2
+    assert rows[0]['location_name'] == 'xxx'
+    assert rows[0]['index_name'] == 'ndvi'
+    assert rows[0]['min_lat'] == 50.0
+
+
+@patch('src.extractors.sentinel_hub.CredentialManager.get_sentinelhub_credentials'
+    , return_value={'client_id': 'xxx', 'client_secret': 'yyy'})
+@patch('src.extractors.sentinel_hub.SentinelHubAuthenticator.authenticate'
+    , return_value=({"access_token": "abc", "expires_at": 9999999999}, MagicMock()))
+@patch('src.extractors.sentinel_hub.CredentialManager.get_pg_credentials'
+    , return_value={'hostname': 'localhost', 'username': 'xxx', 'password': 'yyy'})
+@patch('src.extractors.sentinel_hub.SentinelImageExtractor.get_statistics')
+@patch('src.db.pg_database.PostgreSaver.bulk_save',
+       side_effect=OperationalError('INSERT', {}, Exception('connection refused')))
+def test_run_statistics_db_error_is_logged(mock_bulk_save, mock_get_statistics, mock_get_pg_credentials,
+                                           mock_authenticate, mock_get_sentinelhub_credentials, cfg, response):
+    mock_get_statistics.return_value = parse_statistics(response, 'ndvi')
+
+    pipeline = SentinelDataPipeline(cfg)
+    pipeline.logger = MagicMock()
+    pipeline.run_statistics(n_days=90)
+
+    mock_bulk_save.assert_called_once()
+    pipeline.logger.error.assert_called_once()
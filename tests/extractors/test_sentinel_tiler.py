@@ -0,0 +1,56 @@
+import io
+
+import numpy as np
+import pytest
+import tifffile
+
+from src.extractors.sentinel_tiler import plan_tiles, write_mosaic, MODEL_TIEPOINT_TAG
+
+
+def test_plan_tiles_small_area_single_tile():
+    grid = plan_tiles([14.0, 50.0, 14.001, 50.001], resolution=10)
+
+    assert len(grid) == 1
+    assert grid.tile_size % 16 == 0
+    assert grid.tile_size >= max(grid.width, grid.height)
+
+
+def test_plan_tiles_large_area():
+    bbox = [14.0, 50.0, 14.5, 50.2]
+    grid = plan_tiles(bbox, resolution=10, tile_size=1024)
+    tiles = grid.tiles()
+
+    assert grid.height == 2227
+    assert (grid.n_rows, grid.n_cols) == (3, 4)
+    assert len(tiles) == 12
+    assert sum(tile.width for tile in tiles if tile.row == 0) == grid.width
+    assert sum(tile.height for tile in tiles if tile.col == 0) == grid.height
+    assert tiles[0].bbox[0] == bbox[0]
+    assert tiles[0].bbox[3] == bbox[3]
+    assert tiles[-1].bbox[1] <= bbox[1]
+    assert tiles[-1].bbox[2] >= bbox[2]
+    assert tiles[0].bbox[2] == pytest.approx(tiles[1].bbox[0])
+
+
+def test_write_mosaic():
+    grid = plan_tiles([14.0, 50.0, 14.05, 50.02], resolution=10, tile_size=128)
+    tiles = {}
+    for tile in grid.tiles():
+        buffer = io.BytesIO()
+        tifffile.imwrite(buffer, np.full((tile.height, tile.width, 4), tile.row * 10 + tile.col, dtype=np.uint8))
+        tiles[(tile.row, tile.col)] = buffer.getvalue()
+
+    output = io.BytesIO()
+    write_mosaic(grid, lambda tile: io.BytesIO(tiles[(tile.row, tile.col)]), output)
+
+    output.seek(0)
+    with tifffile.TiffFile(output) as tiff:
+        mosaic = tiff.asarray()
+        tiepoint = tiff.pages[0].tags[MODEL_TIEPOINT_TAG].value
+
+    assert mosaic.shape == (grid.height, grid.width, 4)
+    assert mosaic[0, 0, 0] == 0
+    assert mosaic[0, 128, 0] == 1
+    assert mosaic[128, 0, 0] == 10
+    assert mosaic[-1, -1, 0] == (grid.n_rows - 1) * 10 + grid.n_cols - 1
+    assert tiepoint[3:5] == (14.0, 50.02)
@@ -0,0 +1,72 @@
+from unittest.mock import MagicMock
+from datetime import datetime
+import numpy as np
+import pytest
+
+from src.extractors.weather_decoder import decode_weather, validate_schema, WEATHER_HOURLY_SCHEMA
+
+
+def test_decode_weather():
+    frequency_data = {
+        'time': ['2025-01-01T00:00', '2025-01-01T01:00', '2025-01-01T02:00'],
+        'temperature_2m': [1.5, None, 2.5],
+        'rain': [0.0, 0.1]
+    }
+
+    frame = decode_weather(frequency_data, ['temperature_2m', 'rain'])
+
+    assert len(frame) == 3
+    assert frame.timestamps.dtype == np.dtype('datetime64[s]')
+    assert frame.mask('temperature_2m').tolist() == [False, True, False]
+    assert frame.mask('rain').tolist() == [False, False, True]
+
+
+def test_decode_weather_unmapped_variable():
+    frequency_data = {
+        'time': ['2025-01-01T00:00'],
+        'temperature_2m': [1.5],
+        'wind_speed_10m': [3.0]
+    }
+    logger = MagicMock()
+
+    frame = decode_weather(frequency_data, ['temperature_2m', 'wind_speed_10m'], logger=logger)
+
+    assert list(frame.columns) == ['temperature_2m']
+    logger.warning.assert_called_once()
+
+
+def test_decode_weather_custom_schema():
+    frequency_data = {
+        'time': ['2025-01-01T00:00'],
+        'temperature_2m': [1.5]
+    }
+
+    frame = decode_weather(frequency_data, ['temperature_2m'], schema={'temperature_2m': 'temp'})
+
+    assert list(frame.columns) == ['temp']
+
+
+def test_to_rows():
+    frequency_data = {
+        'time': ['2025-01-01T00:00', '2025-01-01T01:00'],
+        'temperature_2m': [1.5, None]
+    }
+
+    frame = decode_weather(frequency_data, list(WEATHER_HOURLY_SCHEMA))
+    rows = frame.to_rows(location_name='loc', latitude=0.5, longitude=0.5)
+
+    assert rows[0]['timestamp'] == datetime(2025, 1, 1, 0, 0)
+    assert rows[0]['temperature_2m'] == 1.5
+    assert rows[0]['location_name'] == 'loc'
+    assert rows[1]['temperature_2m'] is None
+    assert rows[1]['soil_moisture_0_to_1cm'] is None
+    assert set(rows[0]) == {'location_name', 'latitude', 'longitude', 'timestamp', *WEATHER_HOURLY_SCHEMA.values()}
+
+
+def test_validate_schema():
+    validate_schema({**WEATHER_HOURLY_SCHEMA, 'temperature_80m': 'temperature_2m'})
+
+    with pytest.raises(ValueError, match='temprature_2m'):
+        validate_schema({'temperature_2m': 'temprature_2m'})
+    with pytest.raises(ValueError):
+        validate_schema({'temperature_2m': 'latitude'})
@@ -0,0 +1,46 @@
+from datetime import date, datetime
+
+from src.extractors.weather_planner import get_missing_ranges, plan_requests
+
+
+def hours(*days):
+    return {datetime(2025, 1, day, hour) for day in days for hour in range(24)}
+
+
+def test_get_missing_ranges():
+    timestamps = hours(2, 3, 6) | {datetime(2025, 1, 5, 0)}
+
+    ranges = get_missing_ranges(timestamps, date(2025, 1, 1), date(2025, 1, 7))
+
+    assert ranges == [
+        (date(2025, 1, 1), date(2025, 1, 1)),
+        (date(2025, 1, 4), date(2025, 1, 5)),
+        (date(2025, 1, 7), date(2025, 1, 7)),
+    ]
+
+
+def test_get_missing_ranges_complete():
+    assert get_missing_ranges(hours(1, 2), date(2025, 1, 1), date(2025, 1, 2)) == []
+
+
+def test_get_missing_ranges_daily():
+    timestamps = {datetime(2025, 1, 1), datetime(2025, 1, 3)}
+
+    ranges = get_missing_ranges(timestamps, date(2025, 1, 1), date(2025, 1, 3), expected_per_day=1)
+
+    assert ranges == [(date(2025, 1, 2), date(2025, 1, 2))]
+
+
+def test_plan_requests_groups_points():
+    points = [('a', 0.5, 0.5), ('b', 1.5, 1.5), ('c', 2.5, 2.5)]
+    timestamps = {
+        (0.5, 0.5): hours(1, 2),
+        (1.5, 1.5): hours(1),
+    }
+
+    plan = plan_requests(points, timestamps, date(2025, 1, 1), date(2025, 1, 2))
+
+    assert plan == {
+        (date(2025, 1, 2), date(2025, 1, 2)): [('b', 1.5, 1.5)],
+        (date(2025, 1, 1), date(2025, 1, 2)): [('c', 2.5, 2.5)],
+    }
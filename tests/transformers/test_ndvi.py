@@ -0,0 +1,119 @@
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+import tifffile
+
+from src.db.pg_data_models import SatelliteImageNdvi
+from src.transformers.ndvi import compute_ndvi, ndvi_stats, NdviAccumulator, NdviPipeline
+
+
+@pytest.fixture
+def image():
+    rng = np.random.default_rng(0)
+    data = rng.integers(1, 255, size=(300, 500, 4), dtype=np.uint8)
+    data[:10] = 0  # no data
+    return data
+
+
+def test_compute_ndvi():
+    red = np.array([10, 0, 30], dtype=np.uint8)
+    nir = np.array([30, 0, 10], dtype=np.uint8)
+
+    ndvi = compute_ndvi(red, nir)
+
+    assert ndvi.dtype == np.float32
+    assert ndvi[0] == pytest.approx(0.5)
+    assert np.isnan(ndvi[1])
+    assert ndvi[2] == pytest.approx(-0.5)
+
+
+def test_accumulator_matches_numpy():
+    rng = np.random.default_rng(1)
+    values = rng.uniform(-1, 1, 100000).astype(np.float32)
+    values[::10] = np.nan
+
+    accumulator = NdviAccumulator()
+    for chunk in np.array_split(values, 7):
+        accumulator.add(chunk)
+    stats = accumulator.result()
+
+    valid = values[~np.isnan(values)].astype(np.float64)
+    assert stats['valid_pixels'] == valid.size
+    assert stats['valid_fraction'] == pytest.approx(0.9)
+    assert stats['mean'] == pytest.approx(valid.mean())
+    assert stats['std'] == pytest.approx(valid.std())
+    assert stats['median'] == pytest.approx(np.median(valid), abs=1e-3)
+    assert stats['p90'] == pytest.approx(np.percentile(valid, 90), abs=1e-3)
+
+
+def test_accumulator_without_valid_pixels():
+    accumulator = NdviAccumulator()
+    accumulator.add(np.full(10, np.nan, dtype=np.float32))
+
+    stats = accumulator.result()
+
+    assert stats['valid_fraction'] == 0.0
+    assert stats['mean'] is None
+
+
+@pytest.mark.parametrize('write_kwargs', [{}, {'tile': (128, 128), 'compression': 'zlib'}])
+def test_ndvi_stats(tmp_path, image, write_kwargs):
+    path = tmp_path / 'image.tiff'
+    tifffile.imwrite(path, image, **write_kwargs)
+
+    stats = ndvi_stats(path, chunk_pixels=10000)
+
+    ndvi = compute_ndvi(image[..., 0], image[..., 3])
+    valid = ndvi[~np.isnan(ndvi)]
+    assert stats['total_pixels'] == 300 * 500
+    assert stats['valid_pixels'] == valid.size
+    assert stats['mean'] == pytest.approx(valid.mean(), rel=1e-6)
+    assert stats['median'] == pytest.approx(np.median(valid), abs=1e-3)
+
+
+@patch('src.transformers.ndvi.PostgreSaver.bulk_save')
+@patch('src.transformers.ndvi.PostgreSaver.get_images_without_ndvi', return_value=[(1, 'a.tiff', None), (2, 'b.tiff', None)])
+@patch('src.transformers.ndvi.MinioStorage')
+@patch('src.transformers.ndvi.CredentialManager')
+def test_ndvi_pipeline(mock_cred_mgr, mock_storage, mock_get_images, mock_bulk_save, image):
+    def download(bucket, object_name, file_path):
+        if object_name == 'b.tiff':
+            return False
+        tifffile.imwrite(file_path, image)
+        return True
+
+    mock_storage.return_value.download.side_effect = download
+
+    NdviPipeline({'ndvi': {'batch_size': 10}}).run()
+
+    mock_bulk_save.assert_called_once()
+    db_name, model, rows = mock_bulk_save.call_args[0]
+    assert model is SatelliteImageNdvi
+    assert [row['image_id'] for row in rows] == [1]
+    assert rows[0]['valid_pixels'] == 290 * 500
+
+
+@patch('src.transformers.ndvi.PostgreSaver.bulk_save')
+@patch('src.transformers.ndvi.PostgreSaver.get_images_without_ndvi',
+       return_value=[(1, 'a.tiff', 'B08,B02,B04'), (2, 'rgb.tiff', 'B04,B03,B02')])
+@patch('src.transformers.ndvi.MinioStorage')
+@patch('src.transformers.ndvi.CredentialManager')
+def test_ndvi_pipeline_band_order(mock_cred_mgr, mock_storage, mock_get_images, mock_bulk_save, image):
+    data = image[..., [3, 2, 0]]
+    mock_storage.return_value.download.side_effect = \
+        lambda bucket, object_name, file_path: tifffile.imwrite(file_path, data) or True
+
+    NdviPipeline({}).run()
+
+    rows = mock_bulk_save.call_args[0][2]
+    assert [row['image_id'] for row in rows] == [1]
+    # image without B08 is not downloaded
+    assert mock_storage.return_value.download.call_count == 1
+    assert rows[0]['mean'] == pytest.approx(ndvi_stats_of(image), rel=1e-6)
+
+
+def ndvi_stats_of(image):
+    red, nir = image[..., 0].astype(np.float64), image[..., 3].astype(np.float64)
+    valid = (red + nir) > 0
+    return ((nir - red)[valid] / (nir + red)[valid]).mean()
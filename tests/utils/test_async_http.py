@@ -0,0 +1,80 @@
+import asyncio
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from src.utils.async_http import AsyncHttpClient
+
+
+def run_with_server(handler, coro_factory):
+    async def main():
+        app = web.Application()
+        app.router.add_route('*', '/{tail:.*}', handler)
+        server = TestServer(app)
+        await server.start_server()
+        try:
+            return await coro_factory(server)
+        finally:
+            await server.close()
+
+    return asyncio.run(main())
+
+
+def test_get_json():
+    async def handler(request):
+        return web.json_response({'key': 'value'})
+
+    async def call(server):
+        async with AsyncHttpClient() as client:
+            return await client.get_json(str(server.make_url('/data')))
+
+    assert run_with_server(handler, call) == {'key': 'value'}
+
+
+def test_request_raises_for_status():
+    async def handler(request):
+        return web.Response(status=500)
+
+    async def call(server):
+        async with AsyncHttpClient() as client:
+            return await client.request('POST', str(server.make_url('/data')))
+
+    with pytest.raises(aiohttp.ClientResponseError):
+        run_with_server(handler, call)
+
+
+def test_request_with_headers():
+    async def handler(request):
+        return web.Response(body=b'image-bytes', headers={'X-ProcessingUnits-Spent': '1.5'})
+
+    async def call(server):
+        async with AsyncHttpClient() as client:
+            return await client.request_with_headers('POST', str(server.make_url('/data')))
+
+    response = run_with_server(handler, call)
+
+    assert response.status == 200
+    assert response.body == b'image-bytes'
+    assert response.headers['x-processingunits-spent'] == '1.5'
+
+
+def test_concurrency_limit():
+    state = {'in_flight': 0, 'max_in_flight': 0}
+
+    async def handler(request):
+        state['in_flight'] += 1
+        state['max_in_flight'] = max(state['max_in_flight'], state['in_flight'])
+        await asyncio.sleep(0.01)
+        state['in_flight'] -= 1
+        return web.Response(body=b'image-bytes')
+
+    async def call(server):
+        async with AsyncHttpClient(max_concurrency=2) as client:
+            url = str(server.make_url('/data'))
+            return await asyncio.gather(*(client.request('GET', url) for _ in range(6)))
+
+    results = run_with_server(handler, call)
+
+    assert results == [b'image-bytes'] * 6
+    assert state['max_in_flight'] == 2
@@ -0,0 +1,18 @@
+from datetime import datetime
+
+from src.utils.common_utils import get_locations, parse_iso_datetime
+
+
+def test_get_locations_single():
+    location = {'name': 'xxx', 'coordinates': {}}
+    assert get_locations({'location': location}) == [location]
+
+
+def test_get_locations_list():
+    locations = [{'name': 'xxx', 'coordinates': {}}, {'name': 'yyy', 'coordinates': {}}]
+    assert get_locations({'locations': locations}) == locations
+
+
+def test_parse_iso_datetime():
+    assert parse_iso_datetime('2025-01-01T10:00:00.024Z') == datetime(2025, 1, 1, 10, 0, 0, 24000)
+    assert parse_iso_datetime('2025-01-01T11:00:00+01:00') == datetime(2025, 1, 1, 10, 0, 0)
@@ -0,0 +1,102 @@
+from datetime import date, timedelta
+import asyncio
+import os
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from src.utils.response_cache import ResponseCache
+
+
+def test_make_key_normalizes_request():
+    key = ResponseCache.make_key('get', 'https://API.example.com/v1?b=2&a=1')
+
+    assert key == ResponseCache.make_key('GET', 'https://api.example.com/v1?a=1&b=2')
+    assert key != ResponseCache.make_key('GET', 'https://api.example.com/v1?a=1&b=3')
+    assert (ResponseCache.make_key('POST', 'https://api.example.com', {'a': 1, 'b': 2})
+            == ResponseCache.make_key('POST', 'https://api.example.com', {'b': 2, 'a': 1}))
+
+
+def test_get_set(tmp_path):
+    cache = ResponseCache(tmp_path)
+
+    assert cache.get('key') is None
+    cache.set('key', b'{"key": "value"}', ttl=60)
+    assert cache.get('key') == b'{"key": "value"}'
+    assert cache.stats() == {'hits': 1, 'misses': 1}
+
+
+def test_expired_entry(tmp_path):
+    cache = ResponseCache(tmp_path)
+    cache.set('key', b'data', ttl=60)
+
+    with patch('src.utils.response_cache.time.time', return_value=10 ** 12):
+        assert cache.get('key') is None
+
+    assert not (tmp_path / 'key').exists()
+
+
+def test_lru_eviction(tmp_path):
+    cache = ResponseCache(tmp_path, max_bytes=300)
+
+    cache.set('first', b'x' * 100, ttl=60)
+    cache.set('second', b'x' * 100, ttl=60)
+    os.utime(tmp_path / 'first', (1, 1))
+    os.utime(tmp_path / 'second', (2, 2))
+    cache.get('first')
+
+    cache.set('third', b'x' * 100, ttl=60)
+
+    assert (tmp_path / 'first').exists()
+    assert not (tmp_path / 'second').exists()
+    assert (tmp_path / 'third').exists()
+
+
+def test_set_scans_directory_only_over_limit(tmp_path):
+    cache = ResponseCache(tmp_path, max_bytes=10000)
+    cache.set('first', b'x' * 100, ttl=60)
+
+    with patch.object(ResponseCache, '_scan', wraps=cache._scan) as scan:
+        for i in range(50):
+            cache.set(f'key{i}', b'x' * 100, ttl=60)
+        cache.set('key0', b'x' * 50, ttl=60)
+        assert scan.call_count == 0
+
+        for i in range(50, 200):
+            cache.set(f'key{i}', b'x' * 100, ttl=60)
+        assert 0 < scan.call_count < 20
+
+    assert cache._size == sum(path.stat().st_size for path in tmp_path.iterdir())
+    assert cache._size <= 10000
+
+
+def test_get_or_fetch(tmp_path):
+    cache = ResponseCache(tmp_path)
+    fetch = MagicMock(return_value={'features': []})
+
+    for _ in range(2):
+        assert cache.get_or_fetch('POST', 'https://api/catalog', {'limit': 1}, '2020-01-01', fetch) == \
+            {'features': []}
+
+    fetch.assert_called_once()
+    assert cache.stats() == {'hits': 1, 'misses': 1}
+
+
+def test_get_or_fetch_async_shares_entries(tmp_path):
+    cache = ResponseCache(tmp_path)
+    fetch = AsyncMock(return_value=[1, 2])
+
+    assert asyncio.run(cache.get_or_fetch_async('GET', 'https://api/forecast', None, '2020-01-01', fetch)) == [1, 2]
+    assert cache.get_or_fetch('GET', 'https://api/forecast', None, '2020-01-01', MagicMock()) == [1, 2]
+    fetch.assert_awaited_once()
+
+
+def test_ttl_for(tmp_path):
+    cache = ResponseCache(tmp_path, ttl_past=100, ttl_recent=1)
+
+    assert cache.ttl_for((date.today() - timedelta(days=5)).isoformat()) == 100
+    assert cache.ttl_for(date.today().isoformat()) == 1
+    assert cache.ttl_for('2020-01-01T00:00:00.000000Z') == 100
+
+
+def test_from_config(tmp_path):
+    assert ResponseCache.from_config(None) is None
+    assert ResponseCache.from_config({'cache_dir': tmp_path, 'max_bytes': 10}).max_bytes == 10
@@ -0,0 +1,78 @@
+import threading
+import time
+
+from src.utils.stages import Stage, StagePipeline
+
+
+def test_pipeline_passes_items_through_stages():
+    results = []
+    stages = StagePipeline([
+        Stage('double', lambda item: [item, item], workers=2),
+        Stage('square', lambda item: [item * item], workers=3),
+        Stage('collect', lambda item: results.append(item)),
+    ])
+    with stages:
+        for item in range(5):
+            stages.put(item)
+
+    assert sorted(results) == sorted([i * i for i in range(5)] * 2)
+    stats = stages.stats()
+    assert stats['double']['items'] == 5
+    assert stats['double']['emitted'] == 10
+    assert stats['collect']['items'] == 10
+    assert stats['collect']['queue_depth'] == 0
+
+
+def test_batch_stage_flushes_full_and_last_batch():
+    batches = []
+    stages = StagePipeline([Stage('write', batches.append, batch_size=4, flush_interval=10)])
+    with stages:
+        for item in range(10):
+            stages.put(item)
+
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+    assert sorted(sum(batches, [])) == list(range(10))
+
+
+def test_batch_stage_flushes_after_interval():
+    flushed = threading.Event()
+    stages = StagePipeline([Stage('write', lambda batch: flushed.set(), batch_size=100, flush_interval=0.01)])
+    with stages:
+        stages.put(1)
+        assert flushed.wait(1)
+
+
+def test_bounded_queue_blocks_producer():
+    release = threading.Event()
+    stage = Stage('slow', lambda item: release.wait(), queue_size=2)
+    stages = StagePipeline([stage])
+    stages.start()
+
+    producer = threading.Thread(target=lambda: [stages.put(item) for item in range(5)])
+    producer.start()
+    time.sleep(0.05)
+    # one item is processed, two wait in queue, producer is blocked on the rest
+    assert producer.is_alive()
+    assert stage.queue.qsize() == 2
+
+    release.set()
+    producer.join()
+    stages.join()
+    assert stage.stats()['items'] == 5
+    assert stage.stats()['max_queue_depth'] == 2
+
+
+def test_failed_item_does_not_stop_stage():
+    def handler(item):
+        if item == 1:
+            raise ValueError('bad item')
+        return [item]
+
+    results = []
+    stages = StagePipeline([Stage('check', handler), Stage('collect', results.append)])
+    with stages:
+        for item in range(3):
+            stages.put(item)
+
+    assert sorted(results) == [0, 2]
+    assert stages.stats()['check']['failed'] == 1